@@ -2,17 +2,44 @@
 import os
 import sys
 import json
-import time
 import logging
 import logging.config
 import threading
-import sqlite3
-from typing import Optional, Dict, Any, List, Union
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import itertools
+import socket
+from typing import Optional, Dict, Any, List, Set, Union, TYPE_CHECKING
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-from usb_manager import monitor_usb_devices
-from serial_manager import SerialManager
-from config import LOG_SETTINGS, APP_SETTINGS
+from startup import StartupTimer
+from log_query import LogQueryService
+from backup_manager import BackupManager
+from log_retention import LogRetentionManager
+from scheduler import PeriodicScheduler
+from service_timers import ServiceTimerEngine
+from command_journal import CommandJournal, JOURNAL_EVENTS
+from command_dispatch import CommandDispatcher, record_service_event
+from latency_probe import LatencyProbe
+from connection_registry import ConnectionRegistry
+from telemetry import TelemetryStore
+from batch_ops import validate_batch, apply_changes, SERVICE, COMMAND
+import change_feed
+from config_reload import ConfigWatcher
+from serial_events import (
+    EventBus, SerialEvent, parse_message, BLOCK,
+    SERVICE_STARTED, SERVICE_STOPPED, SERVICE_COMPLETED, PONG, HEARTBEAT, COIN_INSERTED
+)
+from config import (
+    LOG_SETTINGS, APP_SETTINGS, BACKUP_SETTINGS, RETENTION_SETTINGS,
+    JOURNAL_SETTINGS, EVENT_BUS_SETTINGS, PROBE_SETTINGS,
+    BROKER_SETTINGS, TELEMETRY_SETTINGS, CHANGE_FEED_SETTINGS, CONFIG_RELOAD_SETTINGS,
+    CATALOG_CACHE_FILE
+)
+
+# pyserial and pyudev are imported in the background once the server is listening
+if TYPE_CHECKING:
+    from serial_manager import SerialManager
+
+startup = StartupTimer()
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -21,16 +48,35 @@ from backend.database import (
     update_service, get_setting, update_setting
 )
 
-# Configure logging
-logging.config.dictConfig(LOG_SETTINGS)
 logger = logging.getLogger(__name__)
 
-# Create logs directory if it doesn't exist
-os.makedirs(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs"), exist_ok=True)
+# Set to use a separate serial broker process (serial_broker.py) instead of
+# opening the port here; several workers may then share one HTTP port.
+USE_SERIAL_BROKER = bool(os.environ.get('ESQUIMA_SERIAL_BROKER'))
+WORKER_ID = os.environ.get('ESQUIMA_WORKER_ID', '')
+# The worker that writes shared files and runs database housekeeping
+PRIMARY_WORKER = WORKER_ID in ('', '0')
+# Base URLs of other kiosks to pull service and setting changes from
+SYNC_PEERS = os.environ.get('ESQUIMA_SYNC_PEERS', '').split(',')
 
 # Global variables
-serial_manager: Optional[SerialManager] = None
+connections = ConnectionRegistry()  # holds the current SerialManager
+catalog_cache: Optional[List[Dict[str, Any]]] = None
 messages: List[str] = []
+log_query = LogQueryService()
+backup_manager = BackupManager()
+log_retention = LogRetentionManager()
+scheduler = PeriodicScheduler()
+service_timers = ServiceTimerEngine()
+event_bus = EventBus()
+stream_ids = itertools.count(1)
+# Admission and journal for the port; a RemoteDispatcher when the broker owns it
+dispatcher: Any = CommandDispatcher()
+telemetry = TelemetryStore()
+# Probes the port; a RemoteProbe reading the broker's results when the broker owns it
+latency_probe: Any = LatencyProbe(on_sample=lambda port, rtt: telemetry.record('latency_ms', rtt))
+peer_sync = change_feed.PeerSync(SYNC_PEERS, on_applied=lambda written: refresh_services())
+config_watcher = ConfigWatcher()
 
 class ESPControlHandler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
@@ -44,6 +90,8 @@ class ESPControlHandler(BaseHTTPRequestHandler):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         query = parse_qs(parsed_path.query)
+        # One manager for the whole request, even if the device is swapped meanwhile
+        serial_manager = connections.current()
         
         try:
             # Get services
@@ -53,7 +101,12 @@ class ESPControlHandler(BaseHTTPRequestHandler):
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
                 
-                services = get_services()
+                if not startup.done('database') and catalog_cache is not None:
+                    # Serve the last known catalog until the database is ready
+                    services = catalog_cache
+                else:
+                    services = get_services()
+                    refresh_catalog_cache(services)
                 self.wfile.write(json.dumps(services).encode())
             
             # Get logs
@@ -67,6 +120,57 @@ class ESPControlHandler(BaseHTTPRequestHandler):
                 logs = get_logs(limit)
                 self.wfile.write(json.dumps(logs).encode())
             
+            # Query application log files
+            elif path == '/api/logs/app':
+                levels = query.get('level', [''])[0]
+                try:
+                    result = log_query.query(
+                        limit=int(query.get('limit', ['100'])[0]),
+                        levels=levels.split(',') if levels else None,
+                        logger_name=query.get('logger', [None])[0],
+                        since=query.get('since', [None])[0],
+                        until=query.get('until', [None])[0],
+                        cursor=query.get('cursor', [None])[0]
+                    )
+                except ValueError as e:
+                    self.send_response(400)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    self.wfile.write(json.dumps({'error': str(e)}).encode())
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(json.dumps(result).encode())
+            
+            # Query archived database logs
+            elif path == '/api/logs/archive':
+                service_id = query.get('service_id', [None])[0]
+                logs = log_retention.query_archive(
+                    since=query.get('since', [None])[0],
+                    until=query.get('until', [None])[0],
+                    service_id=int(service_id) if service_id else None,
+                    limit=int(query.get('limit', ['100'])[0])
+                )
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps(logs).encode())
+            
+            # Get log retention status
+            elif path == '/api/logs/retention':
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps(log_retention.status()).encode())
+            
             # Get settings
             elif path == '/api/settings':
                 self.send_response(200)
@@ -88,12 +192,185 @@ class ESPControlHandler(BaseHTTPRequestHandler):
                 self.end_headers()
                 
                 status = {
+                    'initializing': not startup.done('serial'),
                     'connected': serial_manager.connected if serial_manager else False,
                     'last_message': serial_manager.get_last_message() if serial_manager else None,
-                    'port': serial_manager.port if serial_manager else None
+                    'port': serial_manager.port if serial_manager else None,
+                    'link': latency_probe.stats(serial_manager.port) if serial_manager else {}
                 }
                 self.wfile.write(json.dumps(status).encode())
             
+            # Get backup status
+            elif path == '/api/backups':
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps(backup_manager.status()).encode())
+            
+            # Get startup phase timings
+            elif path == '/api/startup':
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps(startup.report()).encode())
+            
+            # Get job and startup metrics
+            elif path == '/api/metrics':
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                metrics = {
+                    'startup': startup.report(),
+                    'jobs': scheduler.stats(),
+                    'events': event_bus.stats(),
+                    'admission': dispatcher.status()['admission'],
+                    'latency': latency_probe.stats(),
+                    'telemetry': telemetry.stats(),
+                    'connections': connections.stats(),
+                    'sync': peer_sync.status(),
+                    'config': config_watcher.status()
+                }
+                self.wfile.write(json.dumps(metrics).encode())
+            
+            # Heartbeat, bay usage and latency history
+            elif path == '/api/telemetry':
+                series = query.get('series', [None])[0]
+                if not series:
+                    result = telemetry.stats()
+                else:
+                    since = query.get('since', [None])[0]
+                    until = query.get('until', [None])[0]
+                    try:
+                        result = telemetry.query(
+                            series,
+                            tier=query.get('tier', ['minute'])[0],
+                            since=float(since) if since else None,
+                            until=float(until) if until else None
+                        )
+                    except KeyError:
+                        self.send_response(404)
+                        self.send_header('Content-Type', 'application/json')
+                        self.send_header('Access-Control-Allow-Origin', '*')
+                        self.end_headers()
+                        self.wfile.write(json.dumps({'error': f'Unknown series: {series}'}).encode())
+                        return
+                    except ValueError as e:
+                        self.send_response(400)
+                        self.send_header('Content-Type', 'application/json')
+                        self.send_header('Access-Control-Allow-Origin', '*')
+                        self.end_headers()
+                        self.wfile.write(json.dumps({'error': str(e)}).encode())
+                        return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps(result).encode())
+            
+            # Service and setting changes after a version, for peer kiosks
+            elif path == '/api/changes':
+                try:
+                    since = int(query.get('since', ['0'])[0])
+                    limit = min(int(query.get('limit', [CHANGE_FEED_SETTINGS['page_size']])[0]),
+                                CHANGE_FEED_SETTINGS['page_size'])
+                except ValueError:
+                    self.send_response(400)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    self.wfile.write(json.dumps({'error': 'since and limit must be integers'}).encode())
+                    return
+
+                if not startup.done('database'):
+                    self.send_response(503)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Retry-After', '1')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    self.wfile.write(json.dumps({'error': 'Database is not ready'}).encode())
+                    return
+
+                changes = change_feed.changes_since(since, max(limit, 1))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps(changes).encode())
+            
+            # Get remaining time of every bay
+            elif path == '/api/esp/timers':
+                timers = service_timers.snapshot()
+                etag = f'"{timers["version"]}"'
+                if self.headers.get('If-None-Match') == etag:
+                    # Clients count down locally from ends_at until state changes
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('ETag', etag)
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps(timers).encode())
+            
+            # Get unacknowledged service commands
+            elif path == '/api/esp/journal':
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                journal = dispatcher.status()['journal']
+                self.wfile.write(json.dumps(journal).encode())
+            
+            # Stream parsed ESP events (Server-Sent Events)
+            elif path == '/api/esp/events':
+                kinds = query.get('kind', [''])[0]
+                name = f'stream-{next(stream_ids)}'
+                subscription = event_bus.subscribe(
+                    name, kinds=kinds.split(',') if kinds else None
+                )
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                try:
+                    while True:
+                        event = subscription.get(timeout=EVENT_BUS_SETTINGS['stream_keepalive'])
+                        if event is None:
+                            self.wfile.write(b': keepalive\n\n')
+                        else:
+                            self.wfile.write(f'data: {json.dumps(event.to_dict())}\n\n'.encode())
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    event_bus.unsubscribe(name)
+            
+            # List recorded serial sessions
+            elif path == '/api/esp/captures':
+                from serial_capture import list_captures
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps(list_captures()).encode())
+            
             # Get ESP messages
             elif path == '/api/esp/messages':
                 self.send_response(200)
@@ -123,6 +400,8 @@ class ESPControlHandler(BaseHTTPRequestHandler):
     def do_POST(self):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
+        # One manager for the whole request, even if the device is swapped meanwhile
+        serial_manager = connections.current()
         
         content_length = int(self.headers.get('Content-Length', 0))
         post_data = self.rfile.read(content_length).decode('utf-8')
@@ -132,24 +411,54 @@ class ESPControlHandler(BaseHTTPRequestHandler):
             
             # Send command to ESP8266
             if path == '/api/esp/command':
-                if not serial_manager:
-                    self.send_response(500)
+                command = data.get('command', '')
+                if not command:
+                    self.send_response(400)
                     self.send_header('Content-Type', 'application/json')
                     self.send_header('Access-Control-Allow-Origin', '*')
                     self.end_headers()
-                    self.wfile.write(json.dumps({'error': 'Serial manager not initialized'}).encode())
+                    self.wfile.write(json.dumps({'error': 'Command is required'}).encode())
                     return
 
-                command = data.get('command', '')
-                if not command:
+                # Admission control keeps the backlog within what the serial link can
+                # drain. Service commands are journaled first so they survive
+                # disconnects and restarts; retries with the same idempotency key are no-ops.
+                result = queue_batch_commands(serial_manager, [
+                    {'op': COMMAND, 'command': command, 'idempotency_key': data.get('idempotency_key')}
+                ])[0]
+                if 'retry_after' in result:
+                    self.send_response(429)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Retry-After', str(result['retry_after']))
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    self.wfile.write(json.dumps({'error': result['error']}).encode())
+                    return
+
+                if result.get('invalid'):
                     self.send_response(400)
                     self.send_header('Content-Type', 'application/json')
                     self.send_header('Access-Control-Allow-Origin', '*')
                     self.end_headers()
-                    self.wfile.write(json.dumps({'error': 'Command is required'}).encode())
+                    self.wfile.write(json.dumps({'error': result['error']}).encode())
                     return
-                
-                success = serial_manager.send_command(command)
+
+                if 'idempotency_key' in result:
+                    self.send_response(200 if not result['queued'] else 202)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    
+                    response = {
+                        'success': True,
+                        'idempotency_key': result['idempotency_key'],
+                        'duplicate': result['duplicate'],
+                        'queued': result['queued']
+                    }
+                    self.wfile.write(json.dumps(response).encode())
+                    return
+
+                success = result['success']
                 self.send_response(200 if success else 500)
                 self.send_header('Content-Type', 'application/json')
                 self.send_header('Access-Control-Allow-Origin', '*')
@@ -157,7 +466,7 @@ class ESPControlHandler(BaseHTTPRequestHandler):
                 
                 response: Dict[str, Union[bool, str]] = {'success': success}
                 if not success:
-                    response['error'] = 'Failed to send command'
+                    response['error'] = result['error']
                 
                 self.wfile.write(json.dumps(response).encode())
             
@@ -213,9 +522,76 @@ class ESPControlHandler(BaseHTTPRequestHandler):
                 response = {'success': success}
                 self.wfile.write(json.dumps(response).encode())
             
+            # Apply service updates, setting changes and commands together
+            elif path == '/api/batch':
+                items = data.get('items')
+                error, item_errors = validate_batch(items)
+                if error:
+                    self.send_response(400)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    response = {'error': error}
+                    if item_errors:
+                        response['results'] = [
+                            {'index': index, 'success': not item_error, 'error': item_error}
+                            for index, item_error in enumerate(item_errors)
+                        ]
+                    self.wfile.write(json.dumps(response).encode())
+                    return
+
+                # Database items commit or roll back as one; commands only go
+                # out once the changes they may depend on are stored
+                results = apply_changes(items)
+                committed = all(result['success'] for result in results.values())
+                if committed:
+                    if any(item['op'] == SERVICE for item in items):
+                        refresh_services()
+                    results.update(queue_batch_commands(serial_manager, items))
+                else:
+                    for index, item in enumerate(items):
+                        if item['op'] == COMMAND:
+                            results[index] = {'index': index, 'op': COMMAND, 'success': False,
+                                              'error': 'Not sent, database changes were rolled back'}
+
+                self.send_response(200 if committed else 409)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+
+                response = {
+                    'success': all(result['success'] for result in results.values()),
+                    'committed': committed,
+                    'results': [results[index] for index in range(len(items))]
+                }
+                self.wfile.write(json.dumps(response).encode())
+
+            # Start a database backup
+            elif path == '/api/backups/create':
+                if backup_manager.status()['running']:
+                    self.send_response(409)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    self.wfile.write(json.dumps({'error': 'A backup is already running'}).encode())
+                    return
+
+                def run_backup() -> None:
+                    try:
+                        backup_manager.create_backup()
+                    except Exception:
+                        pass  # Recorded in backup_manager.last_result
+
+                threading.Thread(target=run_backup, daemon=True).start()
+                self.send_response(202)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps({'success': True}).encode())
+            
             # Connect to ESP8266
             elif path == '/api/esp/connect':
-                global serial_manager
                 if not serial_manager:
                     self.send_response(500)
                     self.send_header('Content-Type', 'application/json')
@@ -225,11 +601,11 @@ class ESPControlHandler(BaseHTTPRequestHandler):
                     return
 
                 port = data.get('port')
-                baudrate = data.get('baudrate', 9600)
+                baudrate = data.get('baudrate')  # None: detect it
                 
                 if port:
                     try:
-                        serial_manager = SerialManager(port=port, baudrate=baudrate)
+                        serial_manager = open_serial_manager(port, baudrate)
                     except Exception as e:
                         self.send_response(500)
                         self.send_header('Content-Type', 'application/json')
@@ -237,8 +613,9 @@ class ESPControlHandler(BaseHTTPRequestHandler):
                         self.end_headers()
                         self.wfile.write(json.dumps({'error': f'Failed to initialize serial manager: {e}'}).encode())
                         return
-                
-                success = serial_manager.connect()
+                    success = connections.swap(serial_manager, connect=True)
+                else:
+                    success = connections.reconnect(serial_manager)
                 self.send_response(200 if success else 500)
                 self.send_header('Content-Type', 'application/json')
                 self.send_header('Access-Control-Allow-Origin', '*')
@@ -250,6 +627,27 @@ class ESPControlHandler(BaseHTTPRequestHandler):
                 
                 self.wfile.write(json.dumps(response).encode())
             
+            # Start or stop recording serial traffic
+            elif path in ('/api/esp/capture/start', '/api/esp/capture/stop'):
+                if not serial_manager:
+                    self.send_response(500)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    self.wfile.write(json.dumps({'error': 'Serial manager not initialized'}).encode())
+                    return
+
+                if path.endswith('/start'):
+                    response = {'success': True, 'path': serial_manager.start_capture()}
+                else:
+                    response = {'success': True, 'capture': serial_manager.stop_capture()}
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps(response).encode())
+            
             # Disconnect from ESP8266
             elif path == '/api/esp/disconnect':
                 if not serial_manager:
@@ -286,68 +684,307 @@ class ESPControlHandler(BaseHTTPRequestHandler):
 
 def message_callback(message: str) -> None:
     """Callback function for handling incoming serial messages"""
+    event_bus.publish(parse_message(message))
+
+def buffer_message(event: SerialEvent) -> None:
+    """Keep the raw text of recent messages for /api/esp/messages"""
     global messages
-    messages.append(message)
+    messages.append(event.raw)
     # Keep only the last 100 messages
     if len(messages) > 100:
         messages = messages[-100:]
 
+# Event kinds counted in telemetry, by series name
+TELEMETRY_EVENTS = {HEARTBEAT: 'heartbeat', SERVICE_STARTED: 'bay_starts', COIN_INSERTED: 'coins'}
+
+def record_telemetry(event: SerialEvent) -> None:
+    telemetry.record(TELEMETRY_EVENTS[event.kind], 1, event.timestamp)
+
+def sample_telemetry() -> None:
+    """Record how many bays are running"""
+    bays = service_timers.snapshot()['bays']
+    telemetry.record('active_bays', sum(1 for bay in bays if bay['active']))
+
+def setup_event_subscribers() -> None:
+    """Fan parsed serial events out to the components that consume them"""
+    event_bus.subscribe('messages', buffer_message)
+    event_bus.subscribe('timers', service_timers.on_event, policy=BLOCK)
+    if not USE_SERIAL_BROKER:
+        # With a broker these run there, once per device rather than once per worker
+        event_bus.subscribe('journal', dispatcher.on_event, policy=BLOCK,
+                            kinds=JOURNAL_EVENTS)
+        event_bus.subscribe('db', record_service_event, policy=BLOCK,
+                            kinds=(SERVICE_STARTED, SERVICE_STOPPED, SERVICE_COMPLETED))
+        event_bus.subscribe('probe', latency_probe.on_event, policy=BLOCK, kinds=(PONG,))
+    event_bus.subscribe('telemetry', record_telemetry, kinds=TELEMETRY_EVENTS.keys())
+
+def open_serial_manager(port: str, baudrate: Optional[int] = None) -> "SerialManager":
+    """Serial manager for `port`; connect() opens it, detecting the baud
+    rate unless one is given.
+
+    With a broker the shared client just asks the broker to switch ports.
+    """
+    if USE_SERIAL_BROKER:
+        client = connections.current()
+        client.select(port, baudrate)
+        return client
+    from serial_manager import SerialManager
+    manager = SerialManager(port=port, baudrate=baudrate)
+    manager.set_callback(message_callback)
+    manager.set_connect_callback(on_connect)
+    return manager
+
 def handle_usb_event(action: str, device_node: str) -> None:
     """Handle USB device events"""
-    global serial_manager
-    if not serial_manager:
+    if not connections.current():
         return
 
     if action == 'add':
         # Try to connect to the new device
         try:
-            serial_manager = SerialManager(port=device_node, baudrate=115200)
-            if serial_manager.connect():
+            if connections.swap(open_serial_manager(device_node), connect=True):
                 logger.info(f"Connected to new device: {device_node}")
         except Exception as e:
             logger.error(f"Failed to connect to device {device_node}: {e}")
     elif action == 'remove':
         # Disconnect if the removed device was our current port
-        if serial_manager.port == device_node:
-            serial_manager.disconnect()
+        if connections.disconnect_if(lambda manager: manager.port == device_node):
             logger.info(f"Disconnected from removed device: {device_node}")
 
+def apply_config(changed: Set[str]) -> None:
+    """Config reload listener: push changed settings into the running objects"""
+    serial_manager = connections.current()
+    if serial_manager and changed & {'SERIAL_SETTINGS', 'APP_SETTINGS'}:
+        serial_manager.apply_settings()
+    if 'ADMISSION_SETTINGS' in changed:
+        dispatcher.apply_settings()
+    if 'APP_SETTINGS' in changed:
+        scheduler.set_interval('health_check', APP_SETTINGS['health_check_interval'])
+        scheduler.set_interval('status_poll', APP_SETTINGS['status_poll_interval'])
+        scheduler.set_interval('cache_refresh', APP_SETTINGS['cache_refresh_interval'])
+    if 'PROBE_SETTINGS' in changed:
+        latency_probe.apply_settings()
+        scheduler.set_interval('latency_probe', PROBE_SETTINGS['interval'])
+    # The USB filter is read on every lookup; a newly allowed board may already be plugged in
+    if 'USB_SETTINGS' in changed and not USE_SERIAL_BROKER and startup.done('usb_discovery'):
+        if serial_manager and not serial_manager.connected:
+            from usb_manager import find_serial_devices
+            devices = find_serial_devices()
+            if devices and connections.swap(open_serial_manager(devices[0]), connect=True):
+                logger.info(f"Connected to {devices[0]} after USB filter change")
+
 def health_check() -> None:
     """Periodic health check of the serial connection"""
-    global serial_manager
+    serial_manager = connections.current()
     if not serial_manager:
         return
 
     if not serial_manager.connected:
         logger.warning("Serial connection lost, attempting to reconnect...")
-        serial_manager.connect()
+        connections.reconnect(serial_manager)
+    elif latency_probe.is_unhealthy(serial_manager.port):
+        # The port is open but the firmware stopped answering
+        logger.warning(f"No probe replies from {serial_manager.port}, reconnecting...")
+        latency_probe.reset(serial_manager.port)
+        connections.reconnect(serial_manager, force=True)
+
+def on_connect(manager: "SerialManager") -> None:
+    """Connect callback, also run after the manager's own reconnects"""
+    # Probe health is judged afresh for every connection
+    latency_probe.reset(manager.port)
+    replay_journal(manager)
+
+def replay_journal(manager: "SerialManager") -> None:
+    """Resend service commands the ESP8266 never confirmed"""
+    for command in dispatcher.replay(manager):
+        service_timers.on_command(command, replay=True)
+
+def replay_pending() -> None:
+    """Retry unconfirmed commands while the link is up"""
+    serial_manager = connections.current()
+    if serial_manager and serial_manager.connected:
+        replay_journal(serial_manager)
+
+def poll_status() -> None:
+    """Ask the ESP8266 for its service states"""
+    serial_manager = connections.current()
+    if serial_manager and serial_manager.connected:
+        serial_manager.send_command('GET_STATUS')
+
+def refresh_services() -> None:
+    """Pick up service changes in the catalog snapshot and bay timers"""
+    services = get_services()
+    refresh_catalog_cache(services)
+    service_timers.load_durations(services)
+    dispatcher.set_services(services)
+
+def refresh_caches() -> None:
+    """Refresh the catalog snapshot and the log file index"""
+    if startup.done('database'):
+        refresh_services()
+    log_query.refresh()
+
+def queue_batch_commands(serial_manager: Optional["SerialManager"],
+                         items: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Admit, journal and send the command items of a batch.
+
+    Same rules as /api/esp/command, but journaled commands share one fsync.
+    """
+    results = dispatcher.submit(serial_manager, items)
+    for result in results.values():
+        if result.pop('sent', False):
+            service_timers.on_command(items[result['index']]['command'])
+    return results
+
+def load_catalog_cache() -> None:
+    """Load the services snapshot written by the previous run"""
+    global catalog_cache
+    try:
+        with open(CATALOG_CACHE_FILE) as f:
+            catalog_cache = json.load(f)
+    except (OSError, ValueError):
+        catalog_cache = None
+
+def refresh_catalog_cache(services: List[Dict[str, Any]]) -> None:
+    """Keep the on-disk services snapshot in step with the database"""
+    global catalog_cache
+    if services == catalog_cache:
+        return
+    catalog_cache = services
+    if not PRIMARY_WORKER:
+        return  # Workers sharing a broker would all write the same file
+    try:
+        os.makedirs(os.path.dirname(CATALOG_CACHE_FILE), exist_ok=True)
+        partial = f"{CATALOG_CACHE_FILE}.partial"
+        with open(partial, 'w') as f:
+            json.dump(services, f)
+        os.replace(partial, CATALOG_CACHE_FILE)
+    except OSError as e:
+        logger.error(f"Error writing catalog cache: {e}")
+
+def initialize_backend() -> None:
+    """Startup work that runs after the HTTP listener is accepting requests"""
+    global dispatcher, latency_probe
+
+    if not USE_SERIAL_BROKER:
+        # With a broker the journal lives in the broker, shared by all workers
+        with startup.phase('journal'):
+            dispatcher.journal = CommandJournal(JOURNAL_SETTINGS['path'])
+
+    try:
+        with startup.phase('database'):
+            setup_database()
+            change_feed.ensure_change_log()
+            services = get_services()
+            refresh_catalog_cache(services)
+            service_timers.load_durations(services)
+            dispatcher.set_services(services)
+    except Exception as e:
+        logger.error(f"Database initialization failed: {e}")
+
+    with startup.phase('telemetry'):
+        telemetry.load()
+
+    setup_event_subscribers()
+
+    if USE_SERIAL_BROKER:
+        # The broker owns the port and USB monitoring, it connects on its own
+        with startup.phase('serial'):
+            from serial_broker import BrokerClient, RemoteDispatcher, RemoteProbe
+            client = BrokerClient(BROKER_SETTINGS['socket_path'])
+            client.set_callback(message_callback)
+            # The broker times the probes; its samples still feed this worker's telemetry
+            client.set_sample_callback(latency_probe.on_sample)
+            connections.swap(client)
+            dispatcher = RemoteDispatcher(client)
+            latency_probe = RemoteProbe(client)
+    else:
+        with startup.phase('serial'):
+            connections.swap(open_serial_manager(''))
+
+        with startup.phase('usb_discovery'):
+            from usb_manager import find_serial_devices, monitor_usb_devices
+            devices = find_serial_devices()
+
+        # Start USB monitoring in a separate thread
+        usb_thread = threading.Thread(target=monitor_usb_devices, args=(handle_usb_event,))
+        usb_thread.daemon = True
+        usb_thread.start()
+
+        if devices:
+            with startup.phase('serial_connect'):
+                if connections.swap(open_serial_manager(devices[0]), connect=True):
+                    logger.info(f"Connected to {devices[0]}")
+
+    # Periodic housekeeping, all driven by one scheduler thread
+    if not USE_SERIAL_BROKER:
+        # With a broker these run there, once per device rather than once per worker
+        # Threaded: a reconnect may sweep baud rates for several seconds
+        scheduler.add_job('health_check', health_check, APP_SETTINGS['health_check_interval'], threaded=True)
+        scheduler.add_job('status_poll', poll_status, APP_SETTINGS['status_poll_interval'])
+        scheduler.add_job('latency_probe', lambda: latency_probe.probe(connections.current()),
+                          PROBE_SETTINGS['interval'])
+        scheduler.add_job('journal_replay', replay_pending, JOURNAL_SETTINGS['resend_after'])
+        scheduler.add_job('journal_compact', dispatcher.compact, JOURNAL_SETTINGS['compact_interval'])
+    scheduler.add_job('cache_refresh', refresh_caches, APP_SETTINGS['cache_refresh_interval'])
+    scheduler.add_job('config_reload', config_watcher.check, CONFIG_RELOAD_SETTINGS['poll_interval'])
+    scheduler.add_job('telemetry_sample', sample_telemetry, TELEMETRY_SETTINGS['sample_interval'])
+    if PRIMARY_WORKER:
+        # Every worker records the same broadcast events, one of them keeps telemetry.bin
+        scheduler.add_job('telemetry_snapshot', telemetry.save, TELEMETRY_SETTINGS['snapshot_interval'],
+                          threaded=True)
+        # Database housekeeping runs in one worker only, timed from its last run before a restart
+        scheduler.add_job('backup', backup_manager.create_backup,
+                          BACKUP_SETTINGS['interval'], threaded=True, persistent=True)
+        scheduler.add_job('log_retention', log_retention.run,
+                          RETENTION_SETTINGS['interval'], threaded=True, persistent=True)
+        scheduler.add_job('change_log_prune', change_feed.prune,
+                          CHANGE_FEED_SETTINGS['prune_interval'], threaded=True, persistent=True)
+        if peer_sync.peers:
+            scheduler.add_job('peer_sync', peer_sync.sync_all,
+                              CHANGE_FEED_SETTINGS['sync_interval'], threaded=True)
+    scheduler.start()
+
+    logger.info(f"Backend ready after {startup.report()['uptime']:.3f}s")
+
+class KioskHTTPServer(ThreadingHTTPServer):
+    # Threaded so event streams and slow requests don't hold up other clients
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        if USE_SERIAL_BROKER and hasattr(socket, 'SO_REUSEPORT'):
+            # Worker processes behind one broker share the port, the kernel balances them
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
 
 def run_server(port: int = 8000) -> None:
     """Run the HTTP server"""
-    server = HTTPServer(('', port), ESPControlHandler)
+    with startup.phase('listen'):
+        server = KioskHTTPServer(('', port), ESPControlHandler)
     logger.info(f"Server running on port {port}")
+
+    # Finish startup in the background so requests are answered immediately
+    init_thread = threading.Thread(target=initialize_backend)
+    init_thread.daemon = True
+    init_thread.start()
+
     server.serve_forever()
 
 def main() -> None:
     """Main function"""
-    global serial_manager
-    
-    # Initialize serial manager
-    serial_manager = SerialManager(port='', baudrate=115200)
-    serial_manager.set_callback(message_callback)
-    
-    # Start USB monitoring in a separate thread
-    usb_thread = threading.Thread(target=monitor_usb_devices, args=(handle_usb_event,))
-    usb_thread.daemon = True
-    usb_thread.start()
-    
-    # Start health check in a separate thread
-    health_thread = threading.Thread(target=lambda: [time.sleep(30), health_check()])
-    health_thread.daemon = True
-    health_thread.start()
-    
+    with startup.phase('logging'):
+        logging.config.dictConfig(LOG_SETTINGS)
+
+    # Overrides from the watched config file apply before anything reads them
+    with startup.phase('config'):
+        config_watcher.add_listener(apply_config)
+        config_watcher.check()
+
+    with startup.phase('catalog_cache'):
+        load_catalog_cache()
+
     # Run the server
-    run_server()
+    run_server(int(os.environ.get('ESQUIMA_PORT', 8000)))
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import os
+import gzip
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable
+
+from config import BACKUP_SETTINGS, DB_FILE
+
+logger = logging.getLogger("backup")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    """Raised when a backup cannot be created or fails verification"""
+
+
+class _BackupRestarted(Exception):
+    """Internal signal that a stepped backup keeps starting over"""
+
+
+class BackupManager:
+    def __init__(self, db_path: str = str(DB_FILE),
+                 backup_dir: str = BACKUP_SETTINGS["directory"]) -> None:
+        self.db_path = db_path
+        self.backup_dir = Path(backup_dir)
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def create_backup(self) -> Path:
+        """Copy the live database in small steps, verify it and store it gzipped"""
+        if not self._lock.acquire(blocking=False):
+            raise BackupError("A backup is already running")
+        started = time.monotonic()
+        try:
+            self.backup_dir.mkdir(parents=True, exist_ok=True)
+            name = f"esquima_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db.gz"
+            final_path = self.backup_dir / name
+            snapshot_path = self.backup_dir / f".{name}.snapshot"
+            partial_path = self.backup_dir / f".{name}.partial"
+
+            self._check_free_space()
+            try:
+                self._snapshot(snapshot_path)
+                digest = self._compress(snapshot_path, partial_path)
+                # Drop the raw copy before anything else touches the disk
+                snapshot_path.unlink()
+                os.replace(partial_path, final_path)
+                final_path.with_name(name + ".sha256").write_text(f"{digest}  {name}\n")
+            finally:
+                for path in (snapshot_path, partial_path):
+                    if path.exists():
+                        path.unlink()
+
+            if not self.verify_backup(final_path):
+                raise BackupError(f"Backup failed verification: {final_path}")
+
+            self.last_result = {
+                "file": str(final_path),
+                "size": final_path.stat().st_size,
+                "duration": round(time.monotonic() - started, 3),
+                "timestamp": datetime.now().isoformat(),
+                "success": True,
+            }
+            logger.info(f"Backup created successfully: {final_path}")
+            self.apply_retention()
+            return final_path
+        except Exception as e:
+            self.last_result = {
+                "error": str(e),
+                "timestamp": datetime.now().isoformat(),
+                "success": False,
+            }
+            logger.error(f"Backup failed: {e}")
+            raise
+        finally:
+            self._lock.release()
+
+    def _check_free_space(self) -> None:
+        """Refuse to start unless the raw snapshot and its compressed copy both fit"""
+        db_size = os.path.getsize(self.db_path)
+        # The snapshot is at most the database size; gzip output rarely exceeds it
+        needed = 2 * db_size + BACKUP_SETTINGS["min_free_mb"] * 1024 * 1024
+        free = shutil.disk_usage(self.backup_dir).free
+        if free < needed:
+            raise BackupError(
+                f"Not enough disk space for a backup: {free // 1048576} MB free, {needed // 1048576} MB needed"
+            )
+
+    def _snapshot(self, target: Path) -> None:
+        """Online backup, yielding the source between page batches"""
+        src = sqlite3.connect(self.db_path)
+        dst = sqlite3.connect(str(target))
+        try:
+            try:
+                src.backup(
+                    dst,
+                    pages=BACKUP_SETTINGS["pages_per_step"],
+                    progress=self._progress_tracker(),
+                    sleep=BACKUP_SETTINGS["step_sleep"],
+                )
+            except _BackupRestarted:
+                # Every write from another connection restarts a stepped backup.
+                # Under sustained writes copy the rest in one read transaction,
+                # which WAL mode lets run alongside writers.
+                logger.warning("Backup kept restarting under write load, copying in one pass")
+                src.backup(dst, pages=-1)
+            result = dst.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                raise BackupError(f"Integrity check failed: {result}")
+        finally:
+            dst.close()
+            src.close()
+
+    @staticmethod
+    def _progress_tracker() -> Callable[[int, int, int], None]:
+        """Progress callback that gives up after too many restarts"""
+        state = {"remaining": None, "restarts": 0}
+
+        def progress(status: int, remaining: int, total: int) -> None:
+            previous = state["remaining"]
+            if previous is not None and remaining > previous:
+                state["restarts"] += 1
+                if state["restarts"] > BACKUP_SETTINGS["max_restarts"]:
+                    raise _BackupRestarted()
+            state["remaining"] = remaining
+            logger.debug(f"Backup progress: {total - remaining}/{total} pages")
+
+        return progress
+
+    @staticmethod
+    def _compress(source: Path, target: Path) -> str:
+        """Stream-compress `source` into `target`, returning the sha256 of the raw data"""
+        digest = hashlib.sha256()
+        with open(source, "rb") as fin, gzip.open(
+            target, "wb", compresslevel=BACKUP_SETTINGS["compress_level"]
+        ) as fout:
+            while True:
+                chunk = fin.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                fout.write(chunk)
+        return digest.hexdigest()
+
+    def verify_backup(self, path: Path) -> bool:
+        """Check a compressed backup against its recorded checksum"""
+        checksum_file = path.with_name(path.name + ".sha256")
+        try:
+            expected = checksum_file.read_text().split()[0]
+            digest = hashlib.sha256()
+            with gzip.open(path, "rb") as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+            return digest.hexdigest() == expected
+        except (OSError, IndexError, EOFError) as e:
+            logger.error(f"Error verifying backup {path}: {e}")
+            return False
+
+    def restore_backup(self, path: Path, target: str) -> None:
+        """Decompress a verified backup to `target`"""
+        if not self.verify_backup(path):
+            raise BackupError(f"Refusing to restore unverified backup: {path}")
+        partial = f"{target}.partial"
+        with gzip.open(path, "rb") as fin, open(partial, "wb") as fout:
+            shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+        os.replace(partial, target)
+        logger.info(f"Restored {path} to {target}")
+
+    def list_backups(self) -> List[Path]:
+        """Backups newest first"""
+        if not self.backup_dir.exists():
+            return []
+        return sorted(self.backup_dir.glob("esquima_*.db.gz"), reverse=True)
+
+    def apply_retention(self) -> None:
+        """Keep the newest backups, then drop anything past the age limit"""
+        cutoff = datetime.now() - timedelta(days=BACKUP_SETTINGS["max_age_days"])
+        for backup_file in self.list_backups()[BACKUP_SETTINGS["keep_last"]:]:
+            try:
+                if datetime.fromtimestamp(backup_file.stat().st_mtime) < cutoff:
+                    backup_file.unlink()
+                    checksum_file = backup_file.with_name(backup_file.name + ".sha256")
+                    if checksum_file.exists():
+                        checksum_file.unlink()
+                    logger.info(f"Removed old backup: {backup_file}")
+            except OSError as e:
+                logger.error(f"Error removing old backup {backup_file}: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._lock.locked(),
+            "last_result": self.last_result,
+            "backups": [
+                {"file": p.name, "size": p.stat().st_size} for p in self.list_backups()
+            ],
+        }
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import sqlite3
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+from config import BATCH_SETTINGS, DB_FILE
+
+logger = logging.getLogger(__name__)
+
+# Item kinds, given as "op" ("type" is already a service field)
+SERVICE = "service"
+SETTING = "setting"
+COMMAND = "command"
+DB_OPS = (SERVICE, SETTING)
+
+SERVICE_FIELDS = ("id", "name", "price", "duration", "type")
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _item_error(item: Any) -> Optional[str]:
+    """Same checks as the single-item endpoints; None when the item is usable"""
+    if not isinstance(item, dict):
+        return "Item must be an object"
+    op = item.get("op")
+    if op == SERVICE:
+        if not all(item.get(field) for field in SERVICE_FIELDS):
+            return "Missing required fields"
+    elif op == SETTING:
+        if not all([item.get("key"), item.get("value") is not None]):
+            return "Missing required fields"
+    elif op == COMMAND:
+        if not item.get("command"):
+            return "Command is required"
+    else:
+        return f"Unknown op: {op}"
+    return None
+
+
+def validate_batch(items: Any) -> Tuple[Optional[str], List[Optional[str]]]:
+    """Check a batch before anything is applied.
+
+    Returns (error, per-item errors); error is set when the batch must be
+    refused, and the per-item errors line up with `items`.
+    """
+    if not isinstance(items, list) or not items:
+        return "items must be a non-empty list", []
+    if len(items) > BATCH_SETTINGS["max_items"]:
+        return f"At most {BATCH_SETTINGS['max_items']} items per batch", []
+    errors = [_item_error(item) for item in items]
+    return ("Invalid items" if any(errors) else None), errors
+
+
+def apply_changes(items: List[Dict[str, Any]], db_path: str = str(DB_FILE)) -> Dict[int, Dict[str, Any]]:
+    """Apply every service and setting item in one transaction.
+
+    Returns {index: result} for the database items. If any of them fails
+    the transaction is rolled back, the failing item carries its error and
+    the others report that they were rolled back.
+    """
+    results: Dict[int, Dict[str, Any]] = {}
+    failed: Optional[int] = None
+    error = ""
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:  # one commit for the whole batch, rollback on any exception
+            for index, item in enumerate(items):
+                failed = index
+                if item["op"] == SERVICE:
+                    cursor = conn.execute(
+                        "UPDATE services SET name = ?, description = ?, price = ?, duration = ?, type = ? WHERE id = ?",
+                        (item["name"], item.get("description"), item["price"],
+                         item["duration"], item["type"], item["id"])
+                    )
+                    if cursor.rowcount == 0:
+                        error = f"Unknown service: {item['id']}"
+                        raise _Rollback()
+                elif item["op"] == SETTING:
+                    value = item["value"]
+                    # Convert boolean to string, like /api/settings/update
+                    if isinstance(value, bool):
+                        value = 'true' if value else 'false'
+                    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                                 (item["key"], value))
+                else:
+                    continue
+                results[index] = {"index": index, "op": item["op"], "success": True}
+            failed = None
+    except (sqlite3.Error, _Rollback) as e:
+        if isinstance(e, sqlite3.Error):
+            error = str(e)
+            logger.error(f"Batch transaction failed: {e}")
+        for index, item in enumerate(items):
+            if item["op"] in DB_OPS:
+                results[index] = {"index": index, "op": item["op"], "success": False,
+                                  "error": error if failed in (index, None) else "Rolled back"}
+    finally:
+        conn.close()
+    return results
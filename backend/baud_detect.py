@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import logging
+import threading
+import serial
+import serial.tools.list_ports
+from typing import Optional, Dict, Any, List
+
+from config import SERIAL_SETTINGS, BAUD_SETTINGS
+from serial_events import parse_message, UNKNOWN
+
+logger = logging.getLogger("serial")
+
+# Sent by probe(). PING is answered straight away by current firmware;
+# GET_STATUS is echoed and answered by firmware that predates PING too.
+# The leading newline ends any noise received while we were at another rate.
+PROBE_COMMANDS = b"\nPING:0\nGET_STATUS\n"
+
+
+class BaudRateCache:
+    """Last working baud rate per device, kept in a small JSON file"""
+
+    def __init__(self, path: str = BAUD_SETTINGS["cache_file"]) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.rates: Dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            self.rates = {}
+
+    def _get(self, key: str) -> Optional[int]:
+        entry = self.rates.get(key)
+        return entry["baudrate"] if entry else None
+
+    def get(self, key: str) -> Optional[int]:
+        with self._lock:
+            return self._get(key)
+
+    def put(self, key: str, baudrate: int) -> None:
+        with self._lock:
+            if self._get(key) == baudrate:
+                return
+            self.rates[key] = {"baudrate": baudrate, "updated": round(time.time(), 3)}
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                partial = f"{self.path}.partial"
+                with open(partial, "w") as f:
+                    json.dump(self.rates, f)
+                os.replace(partial, self.path)
+            except OSError as e:
+                logger.error(f"Error writing baud rate cache: {e}")
+
+
+baud_cache = BaudRateCache()
+
+
+def device_key(port: str) -> str:
+    """Identify the adapter rather than its tty name, which changes across replugs"""
+    for info in serial.tools.list_ports.comports():
+        if info.device == port and info.vid is not None:
+            return f"{info.vid:04x}:{info.pid:04x}:{info.serial_number or info.location or port}"
+    return port
+
+
+def _read_valid_line(link: serial.Serial, expect: Optional[str], timeout: float) -> bool:
+    """Wait for a line that parses as firmware output (starting with `expect`, if given)"""
+    deadline = time.monotonic() + timeout
+    buffer = b""
+    while time.monotonic() < deadline:
+        # readline() would hand back partial lines whenever the short timeout hits
+        buffer += link.read(link.in_waiting or 1)
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            try:
+                line = raw.decode("ascii").strip()
+            except UnicodeDecodeError:
+                continue  # Wrong rate, bytes come out as noise
+            if not line or not line.isprintable():
+                continue
+            if expect is not None:
+                if line.startswith(expect):
+                    return True
+            elif parse_message(line).kind != UNKNOWN:
+                return True
+    return False
+
+
+def _open(port: str, baudrate: int) -> serial.Serial:
+    return serial.Serial(
+        port,
+        baudrate,
+        timeout=SERIAL_SETTINGS["timeout"],
+        write_timeout=SERIAL_SETTINGS["write_timeout"],
+        inter_byte_timeout=SERIAL_SETTINGS["inter_byte_timeout"]
+    )
+
+
+def probe(link: serial.Serial, baudrate: int) -> bool:
+    """True if the firmware answers in recognisable lines at `baudrate`.
+
+    The rate is changed on the open port; reopening it would toggle DTR/RTS,
+    which resets a NodeMCU.
+    """
+    try:
+        link.baudrate = baudrate
+        link.reset_input_buffer()
+        # The firmware only talks once it has heard from us
+        link.write(PROBE_COMMANDS)
+        return _read_valid_line(link, None, BAUD_SETTINGS["probe_timeout"])
+    except serial.SerialTimeoutException as e:
+        logger.debug(f"Probe of {link.port} at {baudrate} failed: {e}")
+        return False
+
+
+def negotiate(link: serial.Serial, current: int, target: int) -> int:
+    """Ask SET_BAUD-capable firmware to switch to `target`; returns the rate in use"""
+    try:
+        link.reset_input_buffer()
+        link.write(f"SET_BAUD:{target}\n".encode())
+        if not _read_valid_line(link, f"BAUD_OK:{target}", BAUD_SETTINGS["confirm_timeout"]):
+            logger.info(f"Firmware on {link.port} does not support SET_BAUD, staying at {current}")
+            return current
+    except serial.SerialTimeoutException as e:
+        logger.warning(f"Baud rate negotiation on {link.port} failed: {e}")
+        return current
+
+    # The PING sent by probe() confirms the new rate to the firmware
+    if probe(link, target):
+        logger.info(f"Negotiated {target} baud on {link.port}")
+        return target
+    logger.warning(f"No reply at {target} baud on {link.port}, waiting for firmware to fall back")
+    time.sleep(BAUD_SETTINGS["fallback_wait"])
+    link.baudrate = current
+    return current
+
+
+def candidate_rates(cached: Optional[int]) -> List[int]:
+    rates = [cached, BAUD_SETTINGS["negotiate_to"], SERIAL_SETTINGS["baudrate"]]
+    rates.extend(BAUD_SETTINGS["candidates"])
+    return list(dict.fromkeys(rate for rate in rates if rate))
+
+
+def open_detected(port: str, cache: BaudRateCache = baud_cache) -> Optional[serial.Serial]:
+    """Open `port` at the rate its firmware is using, negotiating a faster one if configured.
+
+    The port is opened once and every candidate rate is tried on it. When
+    the cached rate still answers nothing else is tried, so a reconnect to
+    known firmware costs a single probe. If no rate answers, the port is
+    left open at the configured SERIAL_SETTINGS baud rate, as it would be
+    without detection.
+    """
+    key = device_key(port)
+    cached = cache.get(key)
+    started = time.monotonic()
+    link = _open(port, cached or SERIAL_SETTINGS["baudrate"])
+    try:
+        link.timeout = 0.05  # short reads while probing
+        for baudrate in candidate_rates(cached):
+            if not probe(link, baudrate):
+                continue
+            logger.info(f"Detected {baudrate} baud on {port} in {time.monotonic() - started:.2f}s")
+            target = BAUD_SETTINGS["negotiate_to"]
+            if baudrate != cached and target and target != baudrate:
+                baudrate = negotiate(link, baudrate, target)
+            cache.put(key, baudrate)
+            link.timeout = SERIAL_SETTINGS["timeout"]
+            return link
+    except Exception:
+        link.close()
+        raise
+    logger.warning(f"No valid firmware output on {port} at any candidate baud rate, "
+                   f"using {SERIAL_SETTINGS['baudrate']}")
+    try:
+        link.baudrate = SERIAL_SETTINGS["baudrate"]
+        link.timeout = SERIAL_SETTINGS["timeout"]
+    except Exception:
+        link.close()
+        raise
+    return link
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Callable
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from config import CHANGE_FEED_SETTINGS, DB_FILE
+
+logger = logging.getLogger(__name__)
+
+# Synced tables: primary key and the columns carried in each change
+TABLES = {
+    "services": ("id", ("name", "description", "price", "duration", "type")),
+    "settings": ("key", ("value",)),
+}
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def _row_json(table: str, prefix: str) -> str:
+    key, columns = TABLES[table]
+    return "json_object(" + ", ".join(f"'{c}', {prefix}.{c}" for c in (key,) + columns) + ")"
+
+
+# Seconds since the epoch with sub-second precision, fixed for one statement
+NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+LOCAL_ID = "(SELECT value FROM sync_meta WHERE key = 'db_id')"
+# Set inside apply_changes' transaction so the triggers leave peer changes alone
+NOT_APPLYING = "NOT EXISTS (SELECT 1 FROM sync_meta WHERE key = 'applying')"
+
+
+def _log_sql(table: str, row: str, op: str, when: str = "1") -> str:
+    """Trigger statements stamping `row` (NEW or OLD) of `table` and logging the change.
+
+    A local change is stamped now, or just after the row's current stamp if
+    that is ahead (a peer with a fast clock), so it always wins locally and
+    on every peer.
+    """
+    key = f"{row}.{TABLES[table][0]}"
+    data = _row_json(table, row) if op == UPSERT else "NULL"
+    current = f"(SELECT changed_at + 0.001 FROM row_stamps WHERE tbl = '{table}' AND row_key = {key})"
+    return (f"INSERT INTO row_stamps (tbl, row_key, changed_at, origin) "
+            f"SELECT '{table}', {key}, MAX({NOW}, COALESCE({current}, 0)), {LOCAL_ID} WHERE {when} "
+            f"ON CONFLICT(tbl, row_key) DO UPDATE SET changed_at = excluded.changed_at, origin = excluded.origin; "
+            f"INSERT INTO change_log (tbl, row_key, op, data, changed_at, origin) "
+            f"SELECT '{table}', {key}, '{op}', {data}, changed_at, origin FROM row_stamps "
+            f"WHERE tbl = '{table}' AND row_key = {key} AND {when}")
+
+
+def ensure_change_log(db_path: str = str(DB_FILE)) -> str:
+    """Create the change log, row stamps and triggers; returns this database's id.
+
+    The first time round the existing rows are logged as upserts, so a peer
+    starting from version 0 receives the whole catalog. Rows that predate
+    the stamps get changed_at 0, so any real edit on a peer wins over them.
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl TEXT NOT NULL,
+            row_key NOT NULL,
+            op TEXT NOT NULL,
+            data TEXT,
+            changed_at REAL NOT NULL,
+            origin TEXT
+        )
+        ''')
+        if "origin" not in [column[1] for column in conn.execute("PRAGMA table_info(change_log)")]:
+            conn.execute("ALTER TABLE change_log ADD COLUMN origin TEXT")
+        conn.execute("CREATE TABLE IF NOT EXISTS sync_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Newest (changed_at, origin) per row, kept after a delete so it cannot be resurrected
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS row_stamps (
+            tbl TEXT NOT NULL,
+            row_key NOT NULL,
+            changed_at REAL NOT NULL,
+            origin TEXT NOT NULL,
+            PRIMARY KEY (tbl, row_key)
+        )
+        ''')
+        conn.execute("DELETE FROM sync_meta WHERE key = 'applying'")  # left by nothing but a bug
+
+        row = conn.execute("SELECT value FROM sync_meta WHERE key = 'db_id'").fetchone()
+        created = row is None
+        db_id = uuid.uuid4().hex if created else row[0]
+        if created:
+            conn.execute("INSERT INTO sync_meta (key, value) VALUES ('db_id', ?)", (db_id,))
+        for table, (key, _) in TABLES.items():
+            conn.execute(
+                f"INSERT OR IGNORE INTO row_stamps (tbl, row_key, changed_at, origin) "
+                f"SELECT '{table}', {key}, 0, ? FROM {table}", (db_id,)
+            )
+            if created:
+                conn.execute(
+                    f"INSERT INTO change_log (tbl, row_key, op, data, changed_at, origin) "
+                    f"SELECT '{table}', {key}, '{UPSERT}', {_row_json(table, table)}, 0, ? "
+                    f"FROM {table} ORDER BY {key}", (db_id,)
+                )
+
+        # Recreated every time so an upgrade picks up changed trigger bodies
+        for table, (key, columns) in TABLES.items():
+            changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in (key,) + columns)
+            for name in ("insert", "update", "delete"):
+                conn.execute(f"DROP TRIGGER IF EXISTS {table}_log_{name}")
+            conn.execute(f'''
+            CREATE TRIGGER {table}_log_insert AFTER INSERT ON {table}
+            WHEN {NOT_APPLYING}
+            BEGIN {_log_sql(table, "NEW", UPSERT)}; END
+            ''')
+            # Updates that change nothing are not logged
+            conn.execute(f'''
+            CREATE TRIGGER {table}_log_update AFTER UPDATE ON {table}
+            WHEN ({changed}) AND {NOT_APPLYING}
+            BEGIN
+                {_log_sql(table, "OLD", DELETE, f"OLD.{key} IS NOT NEW.{key}")};
+                {_log_sql(table, "NEW", UPSERT)};
+            END
+            ''')
+            conn.execute(f'''
+            CREATE TRIGGER {table}_log_delete AFTER DELETE ON {table}
+            WHEN {NOT_APPLYING}
+            BEGIN {_log_sql(table, "OLD", DELETE)}; END
+            ''')
+        conn.execute("COMMIT")
+        return db_id
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _change(row: Tuple) -> Dict[str, Any]:
+    version, table, key, op, data, changed_at, origin = row
+    return {"version": version, "table": table, "key": key, "op": op,
+            "data": json.loads(data) if data else None,
+            "changed_at": changed_at, "origin": origin}
+
+
+def changes_since(since: int, limit: int = CHANGE_FEED_SETTINGS["page_size"],
+                  db_path: str = str(DB_FILE)) -> Dict[str, Any]:
+    """Changes made on this kiosk after version `since`, oldest first.
+
+    A reader that fell behind the pruned log gets reset=True and the current
+    state of every row instead, deleted rows included, each with its stamp.
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN")  # one consistent read
+        db_id = conn.execute("SELECT value FROM sync_meta WHERE key = 'db_id'").fetchone()[0]
+        oldest, latest = conn.execute("SELECT MIN(version), MAX(version) FROM change_log").fetchone()
+        latest = latest or 0
+        if oldest is not None and since < oldest - 1:
+            changes = []
+            for table, (key, _) in TABLES.items():
+                rows = conn.execute(
+                    f"SELECT s.row_key, s.changed_at, s.origin, {table}.{key}, {_row_json(table, table)} "
+                    f"FROM row_stamps s LEFT JOIN {table} ON {table}.{key} = s.row_key "
+                    f"WHERE s.tbl = ? ORDER BY s.row_key", (table,)
+                )
+                for row_key, changed_at, origin, present, data in rows:
+                    changes.append({"version": latest, "table": table, "key": row_key,
+                                    "op": UPSERT if present is not None else DELETE,
+                                    "data": json.loads(data) if present is not None else None,
+                                    "changed_at": changed_at, "origin": origin})
+            return {"db_id": db_id, "version": latest, "latest": latest,
+                    "reset": True, "more": False, "changes": changes}
+
+        rows = conn.execute(
+            "SELECT version, tbl, row_key, op, data, changed_at, origin FROM change_log "
+            "WHERE version > ? ORDER BY version LIMIT ?",
+            (since, limit + 1)
+        ).fetchall()
+        more = len(rows) > limit
+        changes = [_change(row) for row in rows[:limit]]
+        return {"db_id": db_id, "version": changes[-1]["version"] if changes else max(since, 0),
+                "latest": latest, "reset": False, "more": more, "changes": changes}
+    finally:
+        conn.close()
+
+
+def _stamp(change: Dict[str, Any]) -> Tuple[float, str]:
+    # Changes from a peer without stamps lose to anything stamped
+    return float(change.get("changed_at") or 0), change.get("origin") or ""
+
+
+def apply_changes(changes: List[Dict[str, Any]], db_path: str = str(DB_FILE)) -> Dict[str, int]:
+    """Apply a page of changes from a peer in one transaction, last writer wins.
+
+    Each row keeps the (changed_at, origin) of its newest change. A peer's
+    change is applied only if its stamp is newer, so two kiosks with
+    different values settle on the same one instead of swapping them. Applied
+    changes are not logged here: every kiosk pulls each peer's own changes.
+    Returns the number of rows written per table.
+    """
+    latest: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+    for change in changes:
+        if change.get("table") in TABLES and change.get("op") in (UPSERT, DELETE):
+            row = (change["table"], change["key"])
+            if row not in latest or _stamp(change) >= _stamp(latest[row]):
+                latest[row] = change
+
+    written = {table: 0 for table in TABLES}
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT OR REPLACE INTO sync_meta (key, value) VALUES ('applying', '1')")
+        for (table, row_key), change in latest.items():
+            stamp = _stamp(change)
+            current = conn.execute(
+                "SELECT changed_at, origin FROM row_stamps WHERE tbl = ? AND row_key = ?", (table, row_key)
+            ).fetchone()
+            if current is not None and tuple(current) >= stamp:
+                continue  # Ours is as new or newer
+            key, columns = TABLES[table]
+            if change["op"] == DELETE:
+                cursor = conn.execute(f"DELETE FROM {table} WHERE {key} = ?", (row_key,))
+            else:
+                data = change.get("data") or {}
+                values = [row_key] + [data.get(c) for c in columns]
+                cursor = conn.execute(
+                    f"INSERT INTO {table} ({key}, {', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(values))}) "
+                    f"ON CONFLICT({key}) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns)} "
+                    f"WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in columns)}",
+                    values
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO row_stamps (tbl, row_key, changed_at, origin) VALUES (?, ?, ?, ?)",
+                (table, row_key) + stamp
+            )
+            written[table] += max(cursor.rowcount, 0)
+        conn.execute("DELETE FROM sync_meta WHERE key = 'applying'")
+        conn.execute("COMMIT")
+        return written
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def prune(keep: int = CHANGE_FEED_SETTINGS["max_entries"], db_path: str = str(DB_FILE)) -> int:
+    """Drop all but the newest `keep` log entries; returns how many went"""
+    conn = _connect(db_path)
+    try:
+        cursor = conn.execute(
+            "DELETE FROM change_log WHERE version <= (SELECT MAX(version) FROM change_log) - ?", (keep,)
+        )
+        if cursor.rowcount:
+            logger.info(f"Pruned {cursor.rowcount} change log entries")
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+class PeerSync:
+    """Pulls changes from other kiosks' /api/changes and applies them locally.
+
+    The last version seen from each peer is kept in a small JSON file, so a
+    restart resumes where it left off. If a peer's database id changes (it
+    was rebuilt), syncing from it starts again at version 0. Peers do not
+    pass on each other's changes, so every kiosk should list all the others.
+    """
+
+    def __init__(self, peers: List[str], db_path: str = str(DB_FILE),
+                 state_file: str = CHANGE_FEED_SETTINGS["state_file"],
+                 on_applied: Optional[Callable[[Dict[str, int]], None]] = None) -> None:
+        self.peers = [peer.rstrip("/") for peer in peers if peer.strip()]
+        self.db_path = db_path
+        self.state_file = state_file
+        self.on_applied = on_applied
+        self.state: Dict[str, Dict[str, Any]] = self._load()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        partial = f"{self.state_file}.partial"
+        with open(partial, "w") as f:
+            json.dump(self.state, f)
+        os.replace(partial, self.state_file)
+
+    def _fetch(self, peer: str, since: int) -> Dict[str, Any]:
+        query = urlencode({"since": since, "limit": CHANGE_FEED_SETTINGS["page_size"]})
+        with urlopen(f"{peer}/api/changes?{query}", timeout=CHANGE_FEED_SETTINGS["sync_timeout"]) as response:
+            return json.loads(response.read().decode())
+
+    def pull(self, peer: str) -> Dict[str, int]:
+        """Apply every change `peer` has made since the last pull"""
+        with self._lock:
+            state = self.state.setdefault(peer, {"db_id": None, "version": 0})
+            written = {table: 0 for table in TABLES}
+            while True:
+                since = state["version"]
+                page = self._fetch(peer, since)
+                if page["db_id"] != state["db_id"]:
+                    if state["db_id"] is not None:
+                        logger.warning(f"Sync peer {peer} has a new database, starting over")
+                    state.update(db_id=page["db_id"], version=0)
+                    if since:
+                        continue
+                for table, count in apply_changes(page["changes"], self.db_path).items():
+                    written[table] += count
+                state["version"] = page["version"]
+                if not page["more"]:
+                    break
+            state.update(last_sync=round(time.time(), 3), error=None)
+            self._save()
+        if any(written.values()):
+            logger.info(f"Applied changes from {peer}: {written}")
+            if self.on_applied:
+                self.on_applied(written)
+        return written
+
+    def sync_all(self) -> None:
+        for peer in self.peers:
+            try:
+                self.pull(peer)
+            except (URLError, OSError, ValueError, KeyError, sqlite3.Error) as e:
+                logger.warning(f"Sync from {peer} failed: {e}")
+                with self._lock:
+                    self.state.setdefault(peer, {"db_id": None, "version": 0})["error"] = str(e)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {peer: dict(self.state.get(peer, {})) for peer in self.peers}
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import math
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Set
+
+from config import ADMISSION_SETTINGS, SERIAL_SETTINGS, DB_FILE
+from batch_ops import COMMAND
+from command_journal import CommandJournal
+from rate_limiter import CommandAdmission
+from serial_events import SerialEvent
+
+logger = logging.getLogger(__name__)
+
+BUSY = 'Serial link is busy, retry later'
+
+
+class CommandDispatcher:
+    """Admission, journaling and sending of commands for one serial link.
+
+    It lives in whichever process owns the port: app_server when it opens
+    the port itself, the serial broker when HTTP workers share the port
+    through it. Either way there is one admission budget and one journal
+    per device, however many workers take requests.
+    """
+
+    def __init__(self, journal: Optional[CommandJournal] = None,
+                 baudrate: int = SERIAL_SETTINGS['baudrate']) -> None:
+        self.journal = journal
+        self.admission = CommandAdmission(baudrate)
+        # Bay ids in the service catalog, None until it has been read
+        self.service_ids: Optional[Set[int]] = None
+
+    def set_services(self, services: List[Dict[str, Any]]) -> None:
+        self.service_ids = {int(service['id']) for service in services}
+
+    def load_services(self, db_path: str = str(DB_FILE)) -> None:
+        """Read the bay ids from the services table, for a process without the catalog"""
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                self.service_ids = {row[0] for row in conn.execute("SELECT id FROM services")}
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading service ids: {e}")
+
+    def _unknown_service(self, command: str) -> bool:
+        """True for a journaled command naming a bay that is not in the catalog"""
+        if self.service_ids is None or not CommandJournal.is_journaled(command):
+            return False
+        return int(command.strip().partition(':')[2]) not in self.service_ids
+
+    def submit(self, manager: Any, items: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Admit, journal and send the command items of a batch; other items are skipped.
+
+        Journaled commands share one fsync. Results carry 'sent' when the
+        command went to the link, for the caller's bay timers.
+        """
+        results: Dict[int, Dict[str, Any]] = {}
+        admitted_items = []
+        if manager and manager.baudrate:
+            self.admission.set_baudrate(manager.baudrate)
+        backlog = manager.pending_writes() if manager else 0
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or item.get('op') != COMMAND or not item.get('command'):
+                continue
+            if self._unknown_service(item['command']):
+                # The firmware would refuse it, and the journal would replay it until max_age
+                results[index] = {'index': index, 'op': COMMAND, 'success': False, 'sent': False,
+                                  'invalid': True, 'error': f"Unknown service: {item['command'].strip().partition(':')[2]}"}
+                continue
+            if backlog >= ADMISSION_SETTINGS['max_queue_depth']:
+                admitted, retry_after = False, 1.0
+            else:
+                admitted, retry_after = self.admission.admit(item['command'])
+            if not admitted:
+                results[index] = {'index': index, 'op': COMMAND, 'success': False, 'sent': False,
+                                  'error': BUSY, 'retry_after': max(1, math.ceil(retry_after))}
+                continue
+            backlog += 1
+            admitted_items.append((index, item))
+
+        journaled = [(index, item) for index, item in admitted_items
+                     if self.journal and self.journal.is_journaled(item['command'])]
+        entries = {}
+        if journaled:
+            appended = self.journal.append_many(
+                [(item['command'], item.get('idempotency_key')) for _, item in journaled])
+            entries = {index: entry for (index, _), entry in zip(journaled, appended)}
+
+        for index, item in admitted_items:
+            command = item['command']
+            result: Dict[str, Any] = {'index': index, 'op': COMMAND, 'sent': False}
+            if index in entries:
+                entry, created = entries[index]
+                if created and manager and manager.connected:
+                    result['sent'] = manager.send_command(command)
+                    if result['sent']:
+                        self.journal.mark_sent(entry['idempotency_key'])
+                result.update(success=True, idempotency_key=entry['idempotency_key'],
+                              duplicate=not created, queued=created and not result['sent'])
+            elif not manager:
+                result.update(success=False, error='Serial manager not initialized')
+            else:
+                result['sent'] = result['success'] = manager.send_command(command)
+                if not result['success']:
+                    result['error'] = 'Failed to send command'
+            results[index] = result
+        return results
+
+    def replay(self, manager: Any) -> List[str]:
+        """Resend service commands the ESP8266 never confirmed; returns those sent"""
+        if not self.journal or not manager:
+            return []
+        entries = self.journal.replayable()
+        if entries:
+            logger.info(f"Replaying {len(entries)} unacknowledged commands")
+        # Already marked sent by replayable(); a failed send is retried after resend_after
+        return [entry.command for entry in entries if manager.send_command(entry.command)]
+
+    def on_event(self, event: SerialEvent) -> None:
+        if self.journal:
+            self.journal.on_event(event)
+
+    def compact(self) -> None:
+        if self.journal:
+            self.journal.compact()
+
+    def apply_settings(self) -> None:
+        """Re-read ADMISSION_SETTINGS after a config reload"""
+        self.admission.set_baudrate(self.admission.baudrate, force=True)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'admission': self.admission.stats(),
+            'journal': self.journal.status() if self.journal else {'pending': []},
+        }
+
+
+def record_service_event(event: SerialEvent, db_path: str = str(DB_FILE)) -> None:
+    """Write bay state changes reported by the ESP8266 to the logs table"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(
+            "INSERT INTO logs (timestamp, service_id, action, status) VALUES (?, ?, ?, ?)",
+            (datetime.now().isoformat(), event.service_id,
+             event.kind.replace('service_', ''), 'device')
+        )
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+from config import JOURNAL_SETTINGS
+from serial_events import SerialEvent, SERVICE_STARTED, SERVICE_STOPPED, COMMAND_ECHO, ERROR
+
+logger = logging.getLogger("journal")
+
+# Commands that take money's worth of action on a bay, and the firmware
+# event that confirms each one
+JOURNALED_COMMANDS = {
+    "START_SERVICE": SERVICE_STARTED,
+    "STOP_SERVICE": SERVICE_STOPPED,
+}
+ACK_EVENTS = {ack: command for command, ack in JOURNALED_COMMANDS.items()}
+# Event kinds on_event() needs to see
+JOURNAL_EVENTS = (SERVICE_STARTED, SERVICE_STOPPED, COMMAND_ECHO, ERROR)
+
+
+class JournalEntry:
+    def __init__(self, key: str, command: str, created: float) -> None:
+        self.key = key
+        self.command = command
+        self.created = created
+        self.attempts = 0
+        self.last_sent: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "idempotency_key": self.key,
+            "command": self.command,
+            "created": self.created,
+            "attempts": self.attempts,
+        }
+
+
+class CommandJournal:
+    """Append-only on-disk journal of outgoing service commands.
+
+    Records are JSON lines: "cmd" when a command is accepted, "ack" when the
+    firmware confirms it, "expire" when it is too old to replay and "done"
+    with status "rejected" when the firmware refused it. Appends
+    are flushed immediately but fsynced in batches by a background thread;
+    callers that need durability wait for the batch containing their record.
+    """
+
+    def __init__(self, path: str = JOURNAL_SETTINGS["path"]) -> None:
+        self.path = path
+        self.pending: "OrderedDict[str, JournalEntry]" = OrderedDict()
+        self.completed: "OrderedDict[str, str]" = OrderedDict()
+        self._records = 0
+        self._written = 0
+        self._synced = 0
+        self._cond = threading.Condition()
+        # Held around fsync and the compaction swap so fsync never sees a closed fd
+        self._file_lock = threading.Lock()
+        # Last journaled command the firmware echoed, until its ack or an error
+        self._echoed: Optional[str] = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._load()
+        self._file = open(path, "ab")
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-fsync", daemon=True)
+        self._flusher.start()
+
+    @staticmethod
+    def is_journaled(command: str) -> bool:
+        name, _, arg = command.strip().partition(":")
+        return name in JOURNALED_COMMANDS and arg.isdigit()
+
+    def _load(self) -> None:
+        """Rebuild pending commands and known keys from the journal file.
+
+        A crash can leave a torn final record. The file is cut back to the
+        last complete line so the next append starts on a line of its own.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        good_end = 0
+        with f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated record")
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring corrupt journal record in {self.path}")
+                    continue
+                good_end = f.tell()
+                self._records += 1
+                op, key = record.get("op"), record.get("key")
+                if op == "cmd":
+                    self.pending[key] = JournalEntry(key, record["command"], record["ts"])
+                elif op in ("ack", "expire", "done"):
+                    self.pending.pop(key, None)
+                    self._remember(key, record.get("status", op))
+            size = f.seek(0, os.SEEK_END)
+        if size > good_end:
+            logger.warning(f"Truncating {size - good_end} bytes of torn records from {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+                os.fsync(f.fileno())
+        if self.pending:
+            logger.info(f"Loaded {len(self.pending)} unacknowledged commands from journal")
+
+    def _remember(self, key: str, status: str) -> None:
+        self.completed[key] = status
+        self.completed.move_to_end(key)
+        while len(self.completed) > JOURNAL_SETTINGS["remembered_keys"]:
+            self.completed.popitem(last=False)
+
+    def _write(self, record: Dict[str, Any]) -> int:
+        """Append a record (lock held), returning its sequence number"""
+        self._file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+        self._file.flush()
+        self._records += 1
+        self._written += 1
+        self._cond.notify_all()
+        return self._written
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                while self._synced >= self._written:
+                    self._cond.wait()
+            # Let concurrent appends join this batch
+            time.sleep(JOURNAL_SETTINGS["fsync_interval"])
+            with self._cond:
+                target = self._written
+            # Never hold _file_lock while waiting for _cond: compact takes them the other way round
+            with self._file_lock:
+                try:
+                    os.fsync(self._file.fileno())
+                except OSError as e:
+                    logger.error(f"Journal fsync failed: {e}")
+            with self._cond:
+                self._synced = max(self._synced, target)
+                self._cond.notify_all()
+
+    def _wait_durable(self, seq: int) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._synced >= seq,
+                                       timeout=JOURNAL_SETTINGS["durable_timeout"])
+
+    def append(self, command: str, key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """Durably record a command; returns (entry, created). Known keys are not re-added."""
+        return self.append_many([(command, key)])[0]
+
+    def append_many(self, commands: List[Tuple[str, Optional[str]]]) -> List[Tuple[Dict[str, Any], bool]]:
+        """Record several (command, key) pairs behind a single fsync"""
+        results = []
+        seq = 0
+        with self._cond:
+            for command, key in commands:
+                key = key or uuid.uuid4().hex
+                if key in self.pending:
+                    results.append((self.pending[key].to_dict(), False))
+                elif key in self.completed:
+                    results.append(({"idempotency_key": key, "command": command,
+                                     "status": self.completed[key]}, False))
+                else:
+                    entry = JournalEntry(key, command.strip(), round(time.time(), 3))
+                    self.pending[key] = entry
+                    seq = self._write({"op": "cmd", "key": key, "command": entry.command,
+                                       "ts": entry.created})
+                    results.append((entry.to_dict(), True))
+        if seq and not self._wait_durable(seq):
+            logger.warning(f"Journal fsync for {len(commands)} commands did not complete in time")
+        return results
+
+    def mark_sent(self, key: str) -> None:
+        with self._cond:
+            entry = self.pending.get(key)
+            if entry is not None:
+                entry.attempts += 1
+                entry.last_sent = time.monotonic()
+
+    def on_event(self, event: SerialEvent) -> None:
+        """Settle the oldest pending command a firmware reply refers to.
+
+        The firmware echoes a command before acting on it. An ack confirms
+        it; an error between the echo and the ack means it was refused
+        (e.g. an unknown bay), so it is settled as rejected and not replayed.
+        """
+        if event.kind == COMMAND_ECHO:
+            self._echoed = event.raw if self.is_journaled(event.raw) else None
+            return
+        if event.kind == ERROR:
+            command, status = self._echoed, "rejected"
+            if command is None:
+                return
+        else:
+            command_name = ACK_EVENTS.get(event.kind)
+            if command_name is None or event.service_id is None:
+                return
+            command, status = f"{command_name}:{event.service_id}", "ack"
+        self._echoed = None
+        with self._cond:
+            for key, entry in self.pending.items():
+                if entry.command == command:
+                    del self.pending[key]
+                    self._remember(key, status)
+                    if status == "ack":
+                        self._write({"op": "ack", "key": key})
+                    else:
+                        self._write({"op": "done", "key": key, "status": status})
+                        logger.warning(f"Firmware rejected {command} ({key}), not replaying it")
+                    return
+
+    def replayable(self) -> List[JournalEntry]:
+        """Pending commands to resend after a (re)connect, oldest first.
+
+        Returned entries are marked as sent straight away, so two callers
+        racing (the connect callback and the scheduler) never both resend one.
+        """
+        now_wall = time.time()
+        now = time.monotonic()
+        entries = []
+        with self._cond:
+            for key, entry in list(self.pending.items()):
+                if now_wall - entry.created > JOURNAL_SETTINGS["max_age"]:
+                    # A customer is no longer waiting for this one
+                    del self.pending[key]
+                    self._remember(key, "expire")
+                    self._write({"op": "expire", "key": key})
+                    logger.warning(f"Expired unacknowledged command {entry.command} ({key})")
+                elif entry.last_sent is None or now - entry.last_sent >= JOURNAL_SETTINGS["resend_after"]:
+                    entry.attempts += 1
+                    entry.last_sent = now
+                    entries.append(entry)
+        return entries
+
+    def compact(self) -> None:
+        """Rewrite the journal with only pending commands and remembered keys"""
+        with self._cond:
+            live = len(self.pending) + len(self.completed)
+            if self._records <= live + JOURNAL_SETTINGS["compact_threshold"]:
+                return
+            partial = f"{self.path}.partial"
+            with open(partial, "wb") as f:
+                for key, status in self.completed.items():
+                    f.write(json.dumps({"op": "done", "key": key, "status": status},
+                                       separators=(",", ":")).encode() + b"\n")
+                for entry in self.pending.values():
+                    f.write(json.dumps({"op": "cmd", "key": entry.key, "command": entry.command,
+                                        "ts": entry.created}, separators=(",", ":")).encode() + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            with self._file_lock:
+                os.replace(partial, self.path)
+                self._file.close()
+                self._file = open(self.path, "ab")
+            logger.info(f"Compacted journal from {self._records} to {live} records")
+            self._records = live
+            self._synced = self._written
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "pending": [entry.to_dict() for entry in self.pending.values()],
+                "records": self._records,
+            }
@@ -5,6 +5,10 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent
 LOG_DIR = BASE_DIR / "logs"
 LOG_DIR.mkdir(exist_ok=True)
+# Overridable so a second instance (e.g. a sync peer under test) gets its own state
+DATA_DIR = Path(os.environ.get("ESQUIMA_DATA_DIR", BASE_DIR.parent / "data"))
+DB_FILE = DATA_DIR / "esquima.db"
+CATALOG_CACHE_FILE = str(DATA_DIR / "catalog_cache.json")
 
 # Serial settings
 SERIAL_SETTINGS = {
@@ -67,9 +71,141 @@ LOG_SETTINGS = {
     }
 }
 
+# Baud rate detection and negotiation settings
+BAUD_SETTINGS = {
+    "candidates": [9600, 115200, 57600, 38400, 19200],  # tried after the cached rate
+    "probe_timeout": 0.5,  # seconds to wait for a valid line at each rate
+    "negotiate_to": 115200,  # rate requested from SET_BAUD-capable firmware, None to keep
+    "confirm_timeout": 1.0,  # seconds to wait for BAUD_OK
+    "fallback_wait": 2.5,  # seconds for the firmware to revert after a failed switch
+    "cache_file": str(DATA_DIR / "baud_cache.json"),
+}
+
+# Serial session capture settings
+CAPTURE_SETTINGS = {
+    "directory": str(DATA_DIR / "captures"),
+    "capture_on_connect": False,  # record every serial session without being asked
+    "flush_interval": 1.0,  # seconds between flushes to disk
+    "max_bytes": 52428800,  # 50MB, capture stops at this size
+}
+
+# Log file query settings
+LOG_QUERY_SETTINGS = {
+    "index_stride": 65536,  # bytes between sparse index entries
+    "max_limit": 1000,  # records per page
+}
+
+# Database backup settings
+BACKUP_SETTINGS = {
+    "directory": str(BASE_DIR.parent / "backups"),
+    "pages_per_step": 256,  # pages copied per backup step
+    "step_sleep": 0.05,  # seconds yielded to writers between steps
+    "max_restarts": 3,  # stepped restarts before finishing in one pass
+    "compress_level": 6,
+    "min_free_mb": 50,  # disk left free after the snapshot and its compressed copy
+    "keep_last": 7,  # always keep this many newest backups
+    "max_age_days": 30,  # remove older backups beyond keep_last
+    "interval": 86400,  # seconds between scheduled backups
+}
+
+# Log table retention settings
+RETENTION_SETTINGS = {
+    "archive_directory": str(DATA_DIR / "archive"),
+    "max_age_days": 90,  # rows older than this move to monthly archives
+    "batch_size": 500,  # rows archived and deleted per transaction
+    "batch_pause": 0.05,  # seconds between batches
+    "interval": 86400,  # seconds between scheduled runs
+}
+
+# Outgoing service command journal settings
+JOURNAL_SETTINGS = {
+    "path": str(DATA_DIR / "command_journal.log"),
+    "fsync_interval": 0.02,  # seconds to gather appends into one fsync
+    "durable_timeout": 2.0,  # seconds a caller waits for its record to be synced
+    "resend_after": 5.0,  # seconds before an unacknowledged command is replayed
+    "max_age": 900,  # seconds after which unacknowledged commands are dropped
+    "remembered_keys": 1000,  # completed idempotency keys kept for deduplication
+    "compact_threshold": 500,  # obsolete records tolerated before compaction
+    "compact_interval": 300,  # seconds between compaction checks
+}
+
+# Serial event bus settings
+EVENT_BUS_SETTINGS = {
+    "queue_size": 256,  # events buffered per subscriber
+    "block_timeout": 0.05,  # seconds a BLOCK subscriber may stall the reader
+    "stream_keepalive": 15,  # seconds between keepalives on /api/esp/events
+}
+
+# /api/esp/command admission control settings
+ADMISSION_SETTINGS = {
+    "service_share": 0.7,  # fraction of link bytes/s for START/STOP_SERVICE
+    "diagnostic_share": 0.3,  # fraction of link bytes/s for everything else
+    "burst_seconds": 2.0,  # bucket capacity, in seconds of each budget's rate
+    "max_defer": 0.5,  # seconds a request may wait for tokens before a 429
+    "max_queue_depth": 50,  # pending writes beyond which all commands get a 429
+}
+
+# Serial round-trip latency probe settings
+PROBE_SETTINGS = {
+    "interval": 5,  # seconds between PING probes
+    "timeout": 2.0,  # seconds before an unanswered probe counts as lost
+    "window": 720,  # probes kept per device for histograms and loss rate
+    "unhealthy_after": 3,  # consecutive losses that trigger a reconnect, once a probe was answered
+}
+
+# Telemetry history settings
+TELEMETRY_SETTINGS = {
+    "raw_capacity": 3600,  # newest samples kept per series
+    "minute_capacity": 4320,  # 1-minute buckets, 3 days
+    "hour_capacity": 720,  # 1-hour buckets, 30 days
+    "sample_interval": 60,  # seconds between active bay samples
+    "snapshot_file": str(DATA_DIR / "telemetry.bin"),
+    "snapshot_interval": 300,  # seconds between snapshots to disk
+}
+
+# Periodic job scheduler settings
+SCHEDULER_SETTINGS = {
+    "jitter_ratio": 0.05,  # random delay added to each run, as a fraction of the interval
+    "startup_delay": 120,  # seconds after startup before an overdue persistent job runs
+    "state_file": str(DATA_DIR / "scheduler_state.json"),  # last runs of persistent jobs
+}
+
+# Serial broker process settings
+BROKER_SETTINGS = {
+    "socket_path": str(DATA_DIR / "serial_broker.sock"),
+    "max_frame": 65536,  # bytes, larger frames close the connection
+    "request_timeout": 3.0,  # seconds a client waits for a reply
+    "send_timeout": 1.0,  # seconds the broker waits on a stalled client
+    "status_interval": 1.0,  # seconds between link state checks
+    "reconnect_delay": 2.0,  # seconds between client attempts to reach the broker
+}
+
+# Change feed and peer sync settings
+CHANGE_FEED_SETTINGS = {
+    "page_size": 500,  # changes per /api/changes response
+    "max_entries": 20000,  # change log rows kept; older peers fall back to a full copy
+    "sync_interval": 30,  # seconds between pulls from each peer
+    "sync_timeout": 5.0,  # seconds per HTTP request to a peer
+    "prune_interval": 3600,  # seconds between change log trims
+    "state_file": str(DATA_DIR / "sync_state.json"),
+}
+
+# Batch endpoint settings
+BATCH_SETTINGS = {
+    "max_items": 200,  # service updates, setting changes and commands per request
+}
+
+# Live configuration reload settings
+CONFIG_RELOAD_SETTINGS = {
+    "path": str(DATA_DIR / "config.json"),  # overrides for the settings below, see docs
+    "poll_interval": 5,  # seconds between checks for a changed file
+}
+
 # Application settings
 APP_SETTINGS = {
     "reconnect_attempts": 3,
     "reconnect_delay": 5,  # seconds
     "health_check_interval": 30,  # seconds
+    "status_poll_interval": 60,  # seconds between GET_STATUS polls
+    "cache_refresh_interval": 300,  # seconds between catalog/log index refreshes
 } 
\ No newline at end of file
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+import os
+import re
+import copy
+import json
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Set, Callable, Tuple
+
+import config
+from config import CONFIG_RELOAD_SETTINGS, LOG_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Settings dicts that can change while running
+RELOADABLE = ("SERIAL_SETTINGS", "USB_SETTINGS", "APP_SETTINGS", "ADMISSION_SETTINGS", "PROBE_SETTINGS")
+# Keys that only take effect on a restart, refused so a reload never half-applies
+RESTART_ONLY = {"USB_SETTINGS": {"subsystem"}}
+# Logger name -> level, "root" for the root logger
+LOG_LEVELS = "log_levels"
+
+# Numbers that must lie in (low, high]; a zero here would stall or divide by zero
+RANGES = {
+    ("SERIAL_SETTINGS", "baudrate"): (0, float("inf")),
+    ("ADMISSION_SETTINGS", "service_share"): (0, 1),
+    ("ADMISSION_SETTINGS", "diagnostic_share"): (0, 1),
+    ("ADMISSION_SETTINGS", "burst_seconds"): (0, float("inf")),
+    ("PROBE_SETTINGS", "window"): (0, float("inf")),
+    ("PROBE_SETTINGS", "unhealthy_after"): (0, float("inf")),
+}
+
+VENDOR_ID = re.compile(r"^[0-9a-f]{4}:[0-9a-f]{4}$")
+_UNSEEN = (-1, -1)
+
+
+def _check_value(section: str, key: str, value: Any, default: Any) -> Optional[str]:
+    """Error message for an override that does not fit its default, None if it does"""
+    where = f"{section}.{key}"
+    if isinstance(default, bool):
+        if not isinstance(value, bool):
+            return f"{where} must be true or false"
+    elif isinstance(default, (int, float)):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return f"{where} must be a number"
+        if isinstance(default, int) and not isinstance(value, int):
+            return f"{where} must be a whole number"
+        if value < 0 or (value == 0 and key.endswith(("timeout", "interval", "delay"))):
+            return f"{where} is out of range"
+        low, high = RANGES.get((section, key), (None, None))
+        if low is not None and not low < value <= high:
+            return f"{where} must be above {low}" + (f" and at most {high}" if high != float("inf") else "")
+    elif isinstance(default, dict):
+        if not isinstance(value, dict) or not all(isinstance(v, str) for v in value.values()):
+            return f"{where} must map names to strings"
+        if key == "vendor_ids" and not all(VENDOR_ID.match(v) for v in value.values()):
+            return f"{where} entries must look like 1a86:7523"
+    elif not isinstance(value, type(default)):
+        return f"{where} must be a {type(default).__name__}"
+    return None
+
+
+class ConfigWatcher:
+    """Applies overrides from a JSON file to the settings dicts in config.py.
+
+    The file lists only what differs from config.py, e.g.
+    {"SERIAL_SETTINGS": {"timeout": 2}, "log_levels": {"serial": "INFO"}}.
+    A file that fails validation is ignored as a whole and the running
+    values stay put; dropping a key from it restores the config.py value.
+    Dicts are updated in place, so modules reading them see the change on
+    their next lookup, and listeners get the names of changed sections.
+    """
+
+    def __init__(self, path: str = CONFIG_RELOAD_SETTINGS["path"]) -> None:
+        self.path = path
+        self.defaults = {name: copy.deepcopy(getattr(config, name)) for name in RELOADABLE}
+        self.default_levels = {
+            ("root" if name == "" else name): settings["level"]
+            for name, settings in LOG_SETTINGS["loggers"].items()
+        }
+        self.extra_loggers: Set[str] = set()  # set from the file only, reset to NOTSET when dropped
+        self.listeners: List[Callable[[Set[str]], None]] = []
+        self.reloads = 0
+        self.error: Optional[str] = None
+        self._stamp: Optional[Tuple[int, int]] = _UNSEEN  # so the first check always loads
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[Set[str]], None]) -> None:
+        self.listeners.append(listener)
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                overrides = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if not isinstance(overrides, dict):
+            raise ValueError("Config file must hold a JSON object")
+        return overrides
+
+    def validate(self, overrides: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Full target values for every section; raises ValueError on the first problem"""
+        unknown = set(overrides) - set(RELOADABLE) - {LOG_LEVELS}
+        if unknown:
+            raise ValueError(f"Not reloadable: {', '.join(sorted(unknown))}")
+        targets: Dict[str, Dict[str, Any]] = {}
+        for section in RELOADABLE:
+            values = overrides.get(section, {})
+            if not isinstance(values, dict):
+                raise ValueError(f"{section} must be an object")
+            target = copy.deepcopy(self.defaults[section])
+            for key, value in values.items():
+                if key not in target:
+                    raise ValueError(f"Unknown setting {section}.{key}")
+                if key in RESTART_ONLY.get(section, ()):
+                    raise ValueError(f"{section}.{key} needs a restart")
+                error = _check_value(section, key, value, target[key])
+                if error:
+                    raise ValueError(error)
+                target[key] = value
+            targets[section] = target
+
+        # The two budgets split one link's bandwidth
+        admission = targets["ADMISSION_SETTINGS"]
+        if admission["service_share"] + admission["diagnostic_share"] > 1 + 1e-9:
+            raise ValueError("ADMISSION_SETTINGS.service_share and diagnostic_share must add up to at most 1")
+
+        levels = overrides.get(LOG_LEVELS, {})
+        if not isinstance(levels, dict):
+            raise ValueError(f"{LOG_LEVELS} must be an object")
+        for name, level in levels.items():
+            if not isinstance(level, str) or not isinstance(logging.getLevelName(level.upper()), int):
+                raise ValueError(f"Unknown log level for {name}: {level}")
+        target_levels = {name: "NOTSET" for name in self.extra_loggers}
+        target_levels.update(self.default_levels)
+        target_levels.update({name: level.upper() for name, level in levels.items()})
+        targets[LOG_LEVELS] = target_levels
+        return targets
+
+    def _apply(self, targets: Dict[str, Dict[str, Any]]) -> Set[str]:
+        changed = set()
+        for section in RELOADABLE:
+            live = getattr(config, section)
+            for key, value in targets[section].items():
+                if live.get(key) != value:
+                    live[key] = value
+                    changed.add(section)
+        for name, level in targets[LOG_LEVELS].items():
+            live_logger = logging.getLogger(None if name == "root" else name)
+            if live_logger.level != logging.getLevelName(level):
+                live_logger.setLevel(level)
+                changed.add(LOG_LEVELS)
+        return changed
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last check; returns whether anything was applied"""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+                stamp: Optional[Tuple[int, int]] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                stamp = None
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            try:
+                overrides = self._read()
+                targets = self.validate(overrides)
+            except (OSError, ValueError) as e:
+                self.error = str(e)
+                logger.error(f"Ignoring config file {self.path}: {e}")
+                return False
+            self.error = None
+            self.reloads += 1
+            changed = self._apply(targets)
+            self.extra_loggers = set(targets[LOG_LEVELS]) - set(self.default_levels)
+        if changed:
+            logger.info(f"Reloaded {', '.join(sorted(changed))} from {self.path}")
+            for listener in self.listeners:
+                try:
+                    listener(changed)
+                except Exception as e:
+                    logger.error(f"Applying reloaded config failed: {e}")
+        return bool(changed)
+
+    def status(self) -> Dict[str, Any]:
+        return {"path": self.path, "reloads": self.reloads, "error": self.error}
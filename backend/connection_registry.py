@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import time
+import logging
+import threading
+from typing import Optional, Dict, Any, Callable
+
+logger = logging.getLogger("serial")
+
+
+class ConnectionRegistry:
+    """Holds the serial manager the app is using.
+
+    Readers take a snapshot with current() and use that one object for the
+    rest of the request, so a concurrent swap can never hand them a
+    half-set-up manager. Swaps and reconnects are serialised, and a
+    replaced manager is stopped (threads joined, port closed) before the
+    swap returns.
+    """
+
+    def __init__(self) -> None:
+        self._current: Any = None
+        self._lock = threading.RLock()
+        self.generation = 0
+        self.swaps = 0
+        self.last_shutdown: Optional[float] = None
+
+    def current(self) -> Any:
+        # A single reference read, no lock needed
+        return self._current
+
+    def swap(self, manager: Any, connect: bool = False) -> bool:
+        """Install a fully configured `manager`, stopping the one it replaces.
+
+        With connect=True the new manager is connected once the old one has
+        released the port; returns whether that succeeded.
+        """
+        with self._lock:
+            old = self._current
+            if old is not None and old is not manager:
+                started = time.monotonic()
+                old.stop()
+                self.last_shutdown = time.monotonic() - started
+                self.swaps += 1
+            self._current = manager
+            self.generation += 1
+            return manager.connect() if connect else True
+
+    def reconnect(self, manager: Any, force: bool = False) -> bool:
+        """Reconnect `manager` if it is still current; force closes it first"""
+        with self._lock:
+            if manager is not self._current:
+                return False  # Replaced meanwhile, the new one is someone else's job
+            if force:
+                manager.disconnect()
+            return manager.connect()
+
+    def disconnect_if(self, predicate: Callable[[Any], bool]) -> bool:
+        """Disconnect the current manager if `predicate` holds for it"""
+        with self._lock:
+            manager = self._current
+            if manager is None or not predicate(manager):
+                return False
+            manager.disconnect()
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "swaps": self.swaps,
+            "last_shutdown": round(self.last_shutdown, 3) if self.last_shutdown is not None else None,
+        }
@@ -28,6 +28,7 @@
 
 // Enhanced Constants
 #define BAUD_RATE 9600
+#define BAUD_CONFIRM_TIMEOUT 2000  // ms to hear from the host after SET_BAUD
 #define MAX_SERVICES 6    // Reduced to match available relays
 #define DEBOUNCE_TIME 100 // milliseconds
 #define RECONNECT_INTERVAL 5000 // 5 seconds between reconnection attempts
@@ -96,6 +97,7 @@ unsigned long lastPowerCheck = 0;
 unsigned long lastSystemCheck = 0;
 bool isConnected = false;
 unsigned long lastCoinPoll = 0;
+unsigned long baudConfirmDeadline = 0;  // non-zero while a SET_BAUD switch is unconfirmed
 uint8_t currentErrorLogIndex = 0;
 
 // Forward declarations
@@ -121,6 +123,8 @@ void checkUPSStatus();
 bool validateServiceState(int serviceId);
 void sendHeartbeat();
 void checkSerialPorts();
+void checkBaudFallback();
+bool isSupportedBaud(long rate);
 void broadcastMessage(String message);
 
 // Message structure
@@ -367,6 +371,7 @@ void updateService(int serviceId) {
 void loop() {
     // Check all serial ports
     checkSerialPorts();
+    checkBaudFallback();
     
     // Check for coin insertion (polling since GPIO16 doesn't support interrupts)
     checkCoinInput();
@@ -439,23 +444,28 @@ void setupSerial() {
 
 void checkSerialPorts() {
     // Check main serial port
+    // Mark the port connected before handling so replies to its first command are sent
     if (Serial.available()) {
         String command = Serial.readStringUntil('\n');
         command.trim();
-        handleCommand(command);
         serialPorts[0].lastActivity = millis();
         serialPorts[0].isActive = true;
         serialPorts[0].isConnected = true;
+        if (baudConfirmDeadline && command.startsWith("PING:")) {
+            // The host reached us at the new rate
+            baudConfirmDeadline = 0;
+        }
+        handleCommand(command);
     }
     
     // Check additional serial port
     if (auxSerial.available()) {
         String command = auxSerial.readStringUntil('\n');
         command.trim();
-        handleCommand(command);
         serialPorts[1].lastActivity = millis();
         serialPorts[1].isActive = true;
         serialPorts[1].isConnected = true;
+        handleCommand(command);
     }
     
     // Check for inactive ports
@@ -509,10 +519,43 @@ void handleCommand(String command) {
     }
     else if (command == "GET_STATUS") {
         for (int i = 0; i < MAX_SERVICES; i++) {
-            broadcastMessage("SERVICE_" + String(i + 1) + ":" + 
-                           (services[i].active ? "ACTIVE" : "INACTIVE"));
+            // Active bays report their seconds left so the host can correct its countdown
+            String state = "INACTIVE";
+            if (services[i].active) {
+                state = "ACTIVE:" + String(services[i].remainingMillis / 1000);
+            }
+            broadcastMessage("SERVICE_" + String(i + 1) + ":" + state);
         }
     }
+    else if (command.startsWith("PING:")) {
+        // Latency probe from the host, answered straight away
+        broadcastMessage("PONG:" + command.substring(5));
+    }
+    else if (command.startsWith("SET_BAUD:")) {
+        // Host asks for a faster USB link; the aux port stays at BAUD_RATE
+        long rate = command.substring(9).toInt();
+        if (!isSupportedBaud(rate)) {
+            broadcastMessage("INVALID_COMMAND");
+            return;
+        }
+        Serial.println("BAUD_OK:" + String(rate));
+        Serial.flush();
+        Serial.begin(rate);
+        baudConfirmDeadline = millis() + BAUD_CONFIRM_TIMEOUT;
+    }
+}
+
+bool isSupportedBaud(long rate) {
+    return rate == 9600 || rate == 19200 || rate == 38400 ||
+           rate == 57600 || rate == 115200 || rate == 230400;
+}
+
+void checkBaudFallback() {
+    // Go back to the default rate if the host never spoke at the new one
+    if (baudConfirmDeadline && (long)(millis() - baudConfirmDeadline) >= 0) {
+        baudConfirmDeadline = 0;
+        Serial.begin(BAUD_RATE);
+    }
 }
 
 void broadcastMessage(String message) {
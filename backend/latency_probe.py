@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import time
+import bisect
+import logging
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, Deque, Tuple, Callable
+
+from config import PROBE_SETTINGS
+from serial_events import SerialEvent, PONG
+
+logger = logging.getLogger("probe")
+
+# Histogram bucket upper bounds in milliseconds, the last bucket is open-ended
+BUCKETS_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+class DeviceLatency:
+    """Rolling window of probe outcomes for one serial device"""
+
+    def __init__(self, window: int) -> None:
+        # (sent_at on the monotonic clock, rtt_ms or None when lost)
+        self.samples: Deque[Tuple[float, Optional[float]]] = deque(maxlen=window)
+        self.consecutive_losses = 0
+        # Whether a probe was answered since the port was (re)connected;
+        # firmware without PING support never is, and is not judged by it
+        self.answered = False
+
+    def record(self, sent_at: float, rtt_ms: Optional[float]) -> None:
+        self.samples.append((sent_at, rtt_ms))
+        self.consecutive_losses = self.consecutive_losses + 1 if rtt_ms is None else 0
+        self.answered = self.answered or rtt_ms is not None
+
+    def stats(self) -> Dict[str, Any]:
+        rtts = sorted(rtt for _, rtt in self.samples if rtt is not None)
+        total = len(self.samples)
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for rtt in rtts:
+            counts[bisect.bisect_left(BUCKETS_MS, rtt)] += 1
+        labels = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+
+        def percentile(p: float) -> Optional[float]:
+            if not rtts:
+                return None
+            return round(rtts[min(len(rtts) - 1, int(p * len(rtts)))], 2)
+
+        return {
+            "probes": total,
+            "loss_rate": round((total - len(rtts)) / total, 3) if total else None,
+            "consecutive_losses": self.consecutive_losses,
+            "answered": self.answered,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(rtts[-1], 2) if rtts else None,
+            "histogram": dict(zip(labels, counts)),
+        }
+
+
+class LatencyProbe:
+    """Times PING:<seq> / PONG:<seq> round trips through SerialManager"""
+
+    def __init__(self, on_sample: Optional[Callable[[str, float], None]] = None) -> None:
+        self.devices: Dict[str, DeviceLatency] = {}
+        self.on_sample = on_sample  # called with (port, rtt_ms) for every reply
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _device(self, port: str) -> DeviceLatency:
+        device = self.devices.get(port)
+        if device is None:
+            device = self.devices[port] = DeviceLatency(PROBE_SETTINGS["window"])
+        return device
+
+    def _expire(self, now: float) -> None:
+        """Count probes that outlived the timeout as lost (lock held)"""
+        for seq, (port, sent_at) in list(self._pending.items()):
+            if now - sent_at > PROBE_SETTINGS["timeout"]:
+                del self._pending[seq]
+                self._device(port).record(sent_at, None)
+
+    def probe(self, manager: Any) -> None:
+        """Send one ping through `manager` if it is connected"""
+        if not manager or not manager.connected:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._seq += 1
+            seq = str(self._seq)
+            self._pending[seq] = (manager.port, now)
+        if not manager.send_command(f"PING:{seq}"):
+            with self._lock:
+                self._pending.pop(seq, None)
+
+    def on_event(self, event: SerialEvent) -> None:
+        if event.kind != PONG:
+            return
+        with self._lock:
+            pending = self._pending.pop(event.value or "", None)
+            if pending is None:
+                return  # Late reply, already counted as lost
+            port, sent_at = pending
+            rtt = (event.received - sent_at) * 1000
+            self._device(port).record(sent_at, rtt)
+        if self.on_sample:
+            self.on_sample(port, rtt)
+
+    def is_unhealthy(self, port: str) -> bool:
+        """True when the firmware answered probes on this connection but stopped"""
+        with self._lock:
+            self._expire(time.monotonic())
+            device = self.devices.get(port)
+            return (device is not None and device.answered and
+                    device.consecutive_losses >= PROBE_SETTINGS["unhealthy_after"])
+
+    def apply_settings(self) -> None:
+        """Resize every device's window after PROBE_SETTINGS were reloaded"""
+        with self._lock:
+            for device in self.devices.values():
+                if device.samples.maxlen != PROBE_SETTINGS["window"]:
+                    # Keeps the newest samples when the window shrinks
+                    device.samples = deque(device.samples, maxlen=PROBE_SETTINGS["window"])
+
+    def reset(self, port: str) -> None:
+        """Start afresh after (re)connecting the port"""
+        with self._lock:
+            device = self.devices.get(port)
+            if device is not None:
+                device.consecutive_losses = 0
+                device.answered = False
+
+    def stats(self, port: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            self._expire(time.monotonic())
+            if port is not None:
+                device = self.devices.get(port)
+                return device.stats() if device else {}
+            return {name: device.stats() for name, device in self.devices.items()}
+
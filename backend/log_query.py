@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import os
+import re
+import mmap
+import bisect
+import logging
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, Iterator, Iterable
+
+from config import LOG_SETTINGS, LOG_QUERY_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Matches the "standard" formatter: "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+# asctime ("2024-01-31 12:00:00,123") sorts lexicographically, so timestamps are
+# compared as raw bytes and never parsed into datetimes.
+RECORD_RE = re.compile(
+    rb"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) \[(\w+)\] (\S+?): ?(.*)$",
+    re.DOTALL,
+)
+TIMESTAMP_LEN = 23
+
+FileKey = Tuple[int, int]
+
+
+class _FileIndex:
+    """Sparse offset -> timestamp index for one log file, keyed by inode"""
+
+    def __init__(self) -> None:
+        self.offsets: List[int] = []
+        self.timestamps: List[bytes] = []
+        self.indexed_size: int = 0
+        self.next_probe: int = 0
+
+    def update(self, mm: mmap.mmap, size: int, stride: int) -> None:
+        """Extend the index over bytes appended since the last update"""
+        # Only index complete lines, the writer may be mid-line at EOF
+        limit = mm.rfind(b"\n", 0, size) + 1
+        probe = self.next_probe
+        while probe < limit:
+            line_start = 0
+            if probe > 0:
+                nl = mm.find(b"\n", probe - 1, limit)
+                if nl < 0:
+                    break
+                line_start = nl + 1
+            ts, record_start = _next_timestamp(mm, line_start, limit)
+            if ts is None:
+                break
+            if not self.offsets or record_start > self.offsets[-1]:
+                self.offsets.append(record_start)
+                self.timestamps.append(ts)
+            probe = max(record_start + 1, probe + stride)
+        self.next_probe = probe
+        self.indexed_size = size
+
+    def upper_bound(self, until: bytes) -> Optional[int]:
+        """Offset of the first indexed line newer than `until`, if any"""
+        pos = bisect.bisect_right(self.timestamps, until)
+        if pos < len(self.offsets):
+            return self.offsets[pos]
+        return None
+
+
+def _next_timestamp(mm: mmap.mmap, start: int, limit: int) -> Tuple[Optional[bytes], int]:
+    """Find the first record header at or after `start`"""
+    pos = start
+    while pos < limit:
+        end = mm.find(b"\n", pos, limit)
+        if end < 0:
+            end = limit
+        match = RECORD_RE.match(mm[pos:end])
+        if match:
+            return match.group(1), pos
+        pos = end + 1
+    return None, limit
+
+
+def _iter_lines_reverse(mm: mmap.mmap, end: int) -> Iterator[Tuple[int, bytes]]:
+    """Yield (offset, line) pairs from `end` back to the start of the file"""
+    pos = end
+    while pos > 0:
+        nl = mm.rfind(b"\n", 0, pos - 1)
+        line_start = nl + 1
+        yield line_start, mm[line_start:pos].rstrip(b"\r\n")
+        pos = line_start
+
+
+def _normalize_time(value: Optional[str], end_of_day: bool = False) -> Optional[bytes]:
+    """Parse an ISO-8601 or log-style timestamp into comparable asctime bytes.
+
+    With end_of_day, a date without a time stands for the last millisecond
+    of that day, so `until=2024-01-31` includes the whole day. Raises
+    ValueError on anything that is not a timestamp.
+    """
+    if not value:
+        return None
+    text = value.strip()
+    if text[-1:] in ("Z", "z"):
+        text = text[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(text.replace(",", "."))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value}")
+    if parsed.tzinfo is not None:
+        # asctime is local time
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    if end_of_day and "T" not in text and " " not in text and ":" not in text:
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999000)
+    return f"{parsed:%Y-%m-%d %H:%M:%S},{parsed.microsecond // 1000:03d}".encode()
+
+
+class LogQueryService:
+    def __init__(self, log_path: Optional[str] = None, backup_count: Optional[int] = None,
+                 index_stride: int = LOG_QUERY_SETTINGS["index_stride"]) -> None:
+        handler = LOG_SETTINGS["handlers"]["file"]
+        self.log_path = log_path or handler["filename"]
+        self.backup_count = handler["backupCount"] if backup_count is None else backup_count
+        self.index_stride = index_stride
+        self._indexes: Dict[FileKey, _FileIndex] = {}
+        self._lock = threading.Lock()
+
+    def _log_files(self) -> List[Tuple[FileKey, str, int]]:
+        """Current file and rotated backups, newest first"""
+        paths = [self.log_path] + [f"{self.log_path}.{i}" for i in range(1, self.backup_count + 1)]
+        files = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append(((st.st_dev, st.st_ino), path, st.st_size))
+        return files
+
+    def _index_for(self, key: FileKey, mm: mmap.mmap, size: int) -> _FileIndex:
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None or size < index.indexed_size:
+                # New inode, or the same inode was truncated
+                index = _FileIndex()
+                self._indexes[key] = index
+            if size > index.indexed_size:
+                index.update(mm, size, self.index_stride)
+            return index
+
+    def _prune(self, live: Iterable[FileKey]) -> None:
+        """Drop indexes of files that rotated out of the backup set"""
+        live = set(live)
+        with self._lock:
+            for key in list(self._indexes):
+                if key not in live:
+                    del self._indexes[key]
+
+    def refresh(self) -> None:
+        """Bring the index up to date with appended and rotated files"""
+        files = self._log_files()
+        self._prune(key for key, _, _ in files)
+        for key, path, size in files:
+            if size == 0:
+                continue
+            try:
+                with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    self._index_for(key, mm, len(mm))
+            except (OSError, ValueError) as e:
+                logger.error(f"Error indexing {path}: {e}")
+
+    def query(self, limit: int = 100, levels: Optional[Iterable[str]] = None,
+              logger_name: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Return matching records newest first, with a cursor for the next page"""
+        limit = max(1, min(limit, LOG_QUERY_SETTINGS["max_limit"]))
+        level_set = {level.strip().upper().encode() for level in levels} if levels else None
+        logger_prefix = logger_name.encode() if logger_name else None
+        since_b = _normalize_time(since)
+        until_b = _normalize_time(until, end_of_day=True)
+
+        files = self._log_files()
+        self._prune(key for key, _, _ in files)
+
+        start_key: Optional[FileKey] = None
+        start_offset: Optional[int] = None
+        if cursor:
+            try:
+                dev, ino, offset = (int(part) for part in cursor.split(":"))
+                start_key, start_offset = (dev, ino), offset
+            except ValueError:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            if not any(key == start_key for key, _, _ in files):
+                # The cursor's file rotated out of retention
+                return {"records": [], "next_cursor": None}
+
+        records: List[Dict[str, Any]] = []
+        next_cursor: Optional[str] = None
+        reached_start = start_key is None
+
+        for position, (key, path, size) in enumerate(files):
+            if not reached_start:
+                if key != start_key:
+                    continue
+                reached_start = True
+            if size == 0:
+                continue
+            try:
+                with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    index = self._index_for(key, mm, len(mm))
+                    end = len(mm)
+                    if key == start_key and start_offset is not None:
+                        end = min(start_offset, end)
+                    if until_b is not None:
+                        bound = index.upper_bound(until_b)
+                        if bound is not None:
+                            end = min(end, bound)
+                    done, offset = self._scan(mm, end, records, limit, level_set,
+                                              logger_prefix, since_b, until_b)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading {path}: {e}")
+                continue
+
+            if done:
+                break
+            if len(records) >= limit:
+                if offset > 0:
+                    next_cursor = f"{key[0]}:{key[1]}:{offset}"
+                elif position + 1 < len(files):
+                    # Page filled exactly at the start of this file, resume in the next one
+                    older_key, _, older_size = files[position + 1]
+                    next_cursor = f"{older_key[0]}:{older_key[1]}:{older_size}"
+                break
+
+        return {"records": records, "next_cursor": next_cursor}
+
+    def _scan(self, mm: mmap.mmap, end: int, records: List[Dict[str, Any]], limit: int,
+              level_set: Optional[set], logger_prefix: Optional[bytes],
+              since_b: Optional[bytes], until_b: Optional[bytes]) -> Tuple[bool, int]:
+        """Walk one file backwards from `end`; returns (older_files_excluded, resume_offset)"""
+        continuation: List[bytes] = []
+        for offset, line in _iter_lines_reverse(mm, end):
+            match = RECORD_RE.match(line)
+            if not match:
+                continuation.append(line)
+                continue
+            ts, level, name, message = match.groups()
+            extra, continuation = continuation, []
+            if since_b is not None and ts < since_b:
+                return True, offset
+            if until_b is not None and ts > until_b:
+                continue
+            if level_set is not None and level not in level_set:
+                continue
+            if logger_prefix is not None and not (
+                name == logger_prefix or name.startswith(logger_prefix + b".")
+            ):
+                continue
+            if extra:
+                message = b"\n".join([message] + extra[::-1])
+            records.append({
+                "timestamp": ts.decode(),
+                "level": level.decode(),
+                "logger": name.decode(errors="replace"),
+                "message": message.decode(errors="replace"),
+            })
+            if len(records) >= limit:
+                return False, offset
+        return False, 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Index footprint, for diagnostics"""
+        with self._lock:
+            return {
+                "files": len(self._indexes),
+                "index_entries": sum(len(i.offsets) for i in self._indexes.values()),
+            }
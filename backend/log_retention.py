@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import os
+import gzip
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from config import RETENTION_SETTINGS, DB_FILE
+
+logger = logging.getLogger("retention")
+
+
+class LogRetentionManager:
+    """Moves aged rows of the logs table into per-month gzip archives"""
+
+    def __init__(self, db_path: str = str(DB_FILE),
+                 archive_dir: str = RETENTION_SETTINGS["archive_directory"]) -> None:
+        self.db_path = db_path
+        self.archive_dir = Path(archive_dir)
+        self.manifest_path = self.archive_dir / "manifest.json"
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"months": {}}
+
+    def _save_manifest(self, manifest: Dict[str, Any]) -> None:
+        partial = self.manifest_path.with_suffix(".json.partial")
+        with open(partial, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, self.manifest_path)
+
+    def run(self, max_age_days: int = RETENTION_SETTINGS["max_age_days"]) -> Dict[str, Any]:
+        """Archive and delete rows older than `max_age_days`, one small batch at a time"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Retention is already running")
+        started = time.monotonic()
+        archived = 0
+        try:
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+            manifest = self.load_manifest()
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            try:
+                self._resume(conn, manifest)
+                while True:
+                    rows = [dict(row) for row in conn.execute(
+                        "SELECT * FROM logs WHERE timestamp < ? ORDER BY id LIMIT ?",
+                        (cutoff, RETENTION_SETTINGS["batch_size"])
+                    )]
+                    if not rows:
+                        break
+
+                    ids = [row["id"] for row in rows]
+                    self._append(rows, manifest)
+                    # Archived but not yet deleted: a resume finishes the delete
+                    manifest["pending"] = {"delete": ids}
+                    self._save_manifest(manifest)
+                    self._delete(conn, ids)
+                    archived += len(rows)
+                    time.sleep(RETENTION_SETTINGS["batch_pause"])
+                if manifest.pop("pending", None) is not None:
+                    self._save_manifest(manifest)
+            finally:
+                conn.close()
+
+            self.last_result = {
+                "archived": archived,
+                "cutoff": cutoff,
+                "duration": round(time.monotonic() - started, 3),
+                "timestamp": datetime.now().isoformat(),
+                "success": True,
+            }
+            if archived:
+                logger.info(f"Archived {archived} log rows older than {cutoff}")
+            return self.last_result
+        except Exception as e:
+            self.last_result = {
+                "archived": archived,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat(),
+                "success": False,
+            }
+            logger.error(f"Log retention failed: {e}")
+            raise
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, ids: List[int]) -> None:
+        with conn:
+            conn.execute(f"DELETE FROM logs WHERE id IN ({','.join('?' * len(ids))})", ids)
+
+    def _resume(self, conn: sqlite3.Connection, manifest: Dict[str, Any]) -> None:
+        """Finish or undo a batch interrupted by a crash.
+
+        "offsets" means the archives may hold a partial append whose rows are
+        still in the table, so the files are cut back to their recorded sizes.
+        "delete" means the rows were archived but maybe not deleted yet.
+        """
+        pending = manifest.get("pending")
+        if not pending:
+            return
+        for filename, offset in pending.get("offsets", {}).items():
+            path = self.archive_dir / filename
+            if path.exists() and path.stat().st_size > offset:
+                logger.warning(f"Truncating interrupted append to {filename}")
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+                    f.flush()
+                    os.fsync(f.fileno())
+        if pending.get("delete"):
+            self._delete(conn, pending["delete"])
+        manifest.pop("pending")
+        self._save_manifest(manifest)
+
+    def _append(self, rows: List[Dict[str, Any]], manifest: Dict[str, Any]) -> None:
+        """Append rows to their month's archive as a new gzip member.
+
+        The archive sizes are saved to the manifest first, so a crash part
+        way through can be undone by truncating back to them.
+        """
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_month.setdefault(row["timestamp"][:7], []).append(row)
+
+        offsets = {}
+        for month in by_month:
+            path = self.archive_dir / f"logs_{month}.jsonl.gz"
+            offsets[path.name] = path.stat().st_size if path.exists() else 0
+        manifest["pending"] = {"offsets": offsets}
+        self._save_manifest(manifest)
+
+        for month, month_rows in by_month.items():
+            filename = f"logs_{month}.jsonl.gz"
+            payload = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in month_rows)
+            with open(self.archive_dir / filename, "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+                    gz.write(payload.encode())
+                raw.flush()
+                os.fsync(raw.fileno())
+
+            entry = manifest["months"].setdefault(
+                month, {"file": filename, "rows": 0, "first": None, "last": None}
+            )
+            entry["rows"] += len(month_rows)
+            timestamps = [row["timestamp"] for row in month_rows]
+            first, last = min(timestamps), max(timestamps)
+            entry["first"] = min(filter(None, (entry["first"], first)))
+            entry["last"] = max(filter(None, (entry["last"], last)))
+
+    def query_archive(self, since: Optional[str] = None, until: Optional[str] = None,
+                      service_id: Optional[int] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Read archived rows in a time range, oldest first"""
+        results: List[Dict[str, Any]] = []
+        manifest = self.load_manifest()
+        for month in sorted(manifest["months"]):
+            entry = manifest["months"][month]
+            if since and entry["last"] and entry["last"] < since:
+                continue
+            if until and entry["first"] and entry["first"] > until:
+                break
+            with gzip.open(self.archive_dir / entry["file"], "rt") as f:
+                for line in f:
+                    row = json.loads(line)
+                    if since and row["timestamp"] < since:
+                        continue
+                    if until and row["timestamp"] > until:
+                        continue
+                    if service_id is not None and row["service_id"] != service_id:
+                        continue
+                    results.append(row)
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._lock.locked(),
+            "last_result": self.last_result,
+            "months": self.load_manifest()["months"],
+        }
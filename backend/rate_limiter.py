@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import time
+import threading
+from typing import Dict, Any, Tuple
+
+from config import ADMISSION_SETTINGS
+
+SERVICE_CONTROL = "service"
+DIAGNOSTIC = "diagnostic"
+
+SERVICE_COMMANDS = ("START_SERVICE", "STOP_SERVICE")
+
+# 8N1 framing: one start and one stop bit per data byte
+BITS_PER_BYTE = 10
+
+# Longest wait reported to a client, also used when a budget has no rate at all
+MAX_RETRY_AFTER = 60.0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.admitted = 0
+        self.rejected = 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, cost: float) -> Tuple[bool, float]:
+        """Take `cost` tokens if available, otherwise report how long until they are"""
+        now = time.monotonic()
+        self._refill(now)
+        if cost <= self.tokens:
+            self.tokens -= cost
+            self.admitted += 1
+            return True, 0.0
+        # A cost above capacity can never fit, treat it as a full bucket's wait
+        shortfall = min(cost, self.capacity) - self.tokens
+        if self.rate <= 0:
+            return False, MAX_RETRY_AFTER
+        return False, min(shortfall / self.rate, MAX_RETRY_AFTER)
+
+    def resize(self, rate: float, capacity: float) -> None:
+        self._refill(time.monotonic())
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = min(self.tokens, capacity)
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill(time.monotonic())
+        return {
+            "rate": round(self.rate, 1),
+            "capacity": round(self.capacity, 1),
+            "available": round(self.tokens, 1),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class CommandAdmission:
+    """Admission control for /api/esp/command sized to the serial link.
+
+    Tokens are bytes on the wire. The link's byte rate is split between
+    service-control and diagnostic commands so a flood of diagnostics cannot
+    delay customer actions, and each budget may burst for a few seconds.
+    """
+
+    def __init__(self, baudrate: int) -> None:
+        self.baudrate = 0
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.set_baudrate(baudrate)
+
+    def set_baudrate(self, baudrate: int, force: bool = False) -> None:
+        """Size the budgets for `baudrate`; force re-reads ADMISSION_SETTINGS at the same rate"""
+        with self._lock:
+            if baudrate == self.baudrate and not force:
+                return
+            self.baudrate = baudrate
+            link_rate = baudrate / BITS_PER_BYTE
+            for budget, share in ((SERVICE_CONTROL, ADMISSION_SETTINGS["service_share"]),
+                                  (DIAGNOSTIC, ADMISSION_SETTINGS["diagnostic_share"])):
+                rate = link_rate * share
+                capacity = rate * ADMISSION_SETTINGS["burst_seconds"]
+                if budget in self.buckets:
+                    self.buckets[budget].resize(rate, capacity)
+                else:
+                    self.buckets[budget] = TokenBucket(rate, capacity)
+
+    @staticmethod
+    def classify(command: str) -> str:
+        return SERVICE_CONTROL if command.strip().startswith(SERVICE_COMMANDS) else DIAGNOSTIC
+
+    def admit(self, command: str) -> Tuple[bool, float]:
+        """Returns (admitted, retry_after_seconds).
+
+        Requests that would fit within max_defer seconds wait for their tokens
+        instead of being rejected.
+        """
+        bucket = self.buckets[self.classify(command)]
+        cost = len(command.strip()) + 1  # trailing newline
+        with self._lock:
+            admitted, wait = bucket.try_acquire(cost)
+        if admitted:
+            return True, 0.0
+        if wait <= ADMISSION_SETTINGS["max_defer"]:
+            time.sleep(wait)
+            with self._lock:
+                admitted, wait = bucket.try_acquire(cost)
+            if admitted:
+                return True, 0.0
+        with self._lock:
+            bucket.rejected += 1
+        return False, wait
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "baudrate": self.baudrate,
+                "budgets": {name: bucket.stats() for name, bucket in self.buckets.items()},
+            }
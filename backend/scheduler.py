@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+from config import SCHEDULER_SETTINGS
+
+logger = logging.getLogger("scheduler")
+
+
+class Job:
+    def __init__(self, name: str, func: Callable[[], Any], interval: float,
+                 jitter: float, threaded: bool, persistent: bool = False) -> None:
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.threaded = threaded
+        self.persistent = persistent
+        self.running = False
+        self.next_run = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_duration: Optional[float] = None
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_run: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "last_duration": self.last_duration,
+            "max_duration": round(self.max_duration, 4),
+            "avg_duration": round(self.total_duration / self.runs, 4) if self.runs else None,
+            "seconds_since_run": round(now - self.last_run, 1) if self.last_run else None,
+            "seconds_until_run": round(max(0.0, self.next_run - now), 1),
+            "last_error": self.last_error,
+        }
+
+
+class PeriodicScheduler:
+    """Runs periodic jobs from a single timer-heap thread"""
+
+    def __init__(self, state_file: str = SCHEDULER_SETTINGS["state_file"]) -> None:
+        self.state_file = state_file
+        self.jobs: Dict[str, Job] = {}
+        self._heap: List[Tuple[float, int, Job]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._last_runs: Dict[str, float] = self._load_state()
+        self._state_lock = threading.Lock()
+
+    def _load_state(self) -> Dict[str, float]:
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, job: Job, started: float) -> None:
+        """Record the wall-clock start of a persistent job's last run"""
+        with self._state_lock:
+            self._last_runs[job.name] = started
+            try:
+                os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+                partial = f"{self.state_file}.partial"
+                with open(partial, "w") as f:
+                    json.dump(self._last_runs, f)
+                os.replace(partial, self.state_file)
+            except OSError as e:
+                logger.error(f"Could not save scheduler state: {e}")
+
+    def _first_delay(self, name: str, interval: float) -> float:
+        """Delay before a persistent job's first run in this process.
+
+        A job that never ran, or is overdue, runs shortly after startup; one
+        that ran recently waits out the rest of its interval. A clock that
+        went backwards never pushes the run further than one interval away.
+        """
+        startup_delay = SCHEDULER_SETTINGS["startup_delay"]
+        last_run = self._last_runs.get(name)
+        if last_run is None:
+            return startup_delay
+        return min(max(last_run + interval - time.time(), startup_delay), interval)
+
+    def add_job(self, name: str, func: Callable[[], Any], interval: float,
+                initial_delay: Optional[float] = None, jitter: Optional[float] = None,
+                threaded: bool = False, persistent: bool = False) -> Job:
+        """Schedule `func` every `interval` seconds.
+
+        Inline jobs run on the scheduler thread and must be quick; long jobs such
+        as backups set `threaded` so they run on their own thread. Either way a
+        job never overlaps itself: an inline job that overruns is rescheduled
+        from its finish time, a threaded job still running at its next slot is
+        skipped.
+
+        The first run normally waits one interval. Persistent jobs remember
+        when they last ran across restarts instead, so a daily job on a kiosk
+        that reboots every night still runs.
+        """
+        if jitter is None:
+            jitter = interval * SCHEDULER_SETTINGS["jitter_ratio"]
+        job = Job(name, func, interval, jitter, threaded, persistent)
+        with self._cond:
+            if name in self.jobs:
+                raise ValueError(f"Job already scheduled: {name}")
+            self.jobs[name] = job
+            if initial_delay is not None:
+                delay = initial_delay
+            elif persistent:
+                delay = self._first_delay(name, interval)
+            else:
+                delay = interval
+            self._push(job, time.monotonic() + delay)
+        return job
+
+    def set_interval(self, name: str, interval: float) -> None:
+        """Change a job's interval; it takes effect after the job's next run"""
+        with self._cond:
+            job = self.jobs.get(name)
+            if job is None or job.interval == interval:
+                return
+            job.interval = interval
+            job.jitter = interval * SCHEDULER_SETTINGS["jitter_ratio"]
+        logger.info(f"Job '{name}' now runs every {interval}s")
+
+    def _push(self, job: Job, when: float) -> None:
+        if job.jitter:
+            when += random.uniform(0, job.jitter)
+        job.next_run = when
+        heapq.heappush(self._heap, (when, next(self._counter), job))
+        self._cond.notify()
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Scheduler started with {len(self.jobs)} jobs")
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while self._running and (
+                    not self._heap or self._heap[0][0] > time.monotonic()
+                ):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                scheduled, _, job = heapq.heappop(self._heap)
+
+            if job.threaded:
+                if job.running:
+                    job.skipped += 1
+                    logger.warning(f"Job '{job.name}' still running, skipping this run")
+                else:
+                    job.running = True
+                    threading.Thread(target=self._run, args=(job,),
+                                     name=f"job-{job.name}", daemon=True).start()
+            else:
+                job.running = True
+                self._run(job)
+
+            with self._cond:
+                # Keep a fixed cadence, but never queue catch-up runs after an overrun
+                next_run = scheduled + job.interval
+                now = time.monotonic()
+                if next_run <= now:
+                    next_run = now + job.interval
+                self._push(job, next_run)
+
+    def _run(self, job: Job) -> None:
+        started = time.monotonic()
+        started_at = time.time()
+        try:
+            job.func()
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"Job '{job.name}' failed: {e}")
+        finally:
+            duration = time.monotonic() - started
+            job.runs += 1
+            job.last_run = started
+            job.last_duration = round(duration, 4)
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+            if duration > job.interval:
+                job.overruns += 1
+                logger.warning(f"Job '{job.name}' took {duration:.2f}s, longer than its {job.interval}s interval")
+            if job.persistent:
+                self._save_state(job, started_at)
+            job.running = False
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        with self._cond:
+            return {name: job.stats(now) for name, job in self.jobs.items()}
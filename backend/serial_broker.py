@@ -0,0 +1,728 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import socket
+import signal
+import select
+import struct
+import logging
+import logging.config
+import itertools
+import threading
+from typing import Optional, Dict, Any, Callable, Tuple, Set, List
+
+from config import (
+    BROKER_SETTINGS, LOG_SETTINGS, CONFIG_RELOAD_SETTINGS, JOURNAL_SETTINGS, APP_SETTINGS,
+    PROBE_SETTINGS
+)
+from config_reload import ConfigWatcher
+from batch_ops import COMMAND
+from command_dispatch import CommandDispatcher, record_service_event
+from command_journal import CommandJournal, JOURNAL_EVENTS
+from latency_probe import LatencyProbe
+from scheduler import PeriodicScheduler
+from serial_events import (
+    EventBus, SerialEvent, parse_message, DROP_OLDEST, BLOCK,
+    SERVICE_STARTED, SERVICE_STOPPED, SERVICE_COMPLETED, PONG
+)
+
+logger = logging.getLogger("broker")
+
+# Requests that can take seconds (baud detection, admission waits, journal
+# fsync) get their own thread so they do not hold up the client's other requests
+SLOW_OPS = ("connect", "disconnect", "commands")
+
+# Frame: 1-byte type, 4-byte big-endian payload length, payload
+HEADER = struct.Struct("!BI")
+
+REQUEST = 1   # client -> broker, compact JSON {"id", "op", ...}
+RESPONSE = 2  # broker -> client, compact JSON {"id", "ok", ...}
+LINE = 3      # broker -> client, one UTF-8 line received from the ESP8266
+STATUS = 4    # broker -> client, compact JSON link state, pushed on change
+SAMPLE = 5    # broker -> client, compact JSON {"port", "rtt_ms"} for each probe reply
+
+
+def send_frame(sock: socket.socket, kind: int, payload: bytes) -> None:
+    sock.sendall(HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock: socket.socket) -> Tuple[int, bytes]:
+    kind, size = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if size > BROKER_SETTINGS["max_frame"]:
+        raise ConnectionError(f"Frame of {size} bytes exceeds limit")
+    return kind, _recv_exact(sock, size)
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode()
+
+
+class _BrokerConnection:
+    """One connected client, as seen from the broker"""
+
+    def __init__(self, broker: "SerialBroker", sock: socket.socket, number: int) -> None:
+        self.broker = broker
+        self.sock = sock
+        self.name = f"client-{number}"
+        self.subscribed = False
+        self.closed = False
+        self._send_lock = threading.Lock()
+
+    def send(self, kind: int, payload: bytes) -> None:
+        if self.closed:
+            return
+        try:
+            with self._send_lock:
+                send_frame(self.sock, kind, payload)
+        except OSError as e:
+            # A client that cannot keep up is dropped rather than stalling the broker
+            logger.warning(f"Dropping {self.name}: {e}")
+            self.close()
+
+    def send_line(self, event: SerialEvent) -> None:
+        self.send(LINE, event.raw.encode())
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.broker.event_bus.unsubscribe(self.name)
+        try:
+            # shutdown() also wakes the thread blocked reading this socket
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def answer(self, request: Dict[str, Any]) -> None:
+        response = self.broker.handle_request(self, request)
+        response["id"] = request.get("id")
+        self.send(RESPONSE, _encode(response))
+
+    def serve(self) -> None:
+        try:
+            while not self.closed:
+                # The socket timeout is for sends and for reads inside a frame;
+                # idle time between frames is waited out here
+                readable, _, _ = select.select([self.sock], [], [], BROKER_SETTINGS["send_timeout"])
+                if not readable:
+                    continue
+                kind, payload = recv_frame(self.sock)
+                if kind != REQUEST:
+                    logger.warning(f"Unexpected frame type {kind} from {self.name}")
+                    continue
+                request = json.loads(payload)
+                if request.get("op") in SLOW_OPS:
+                    threading.Thread(target=self.answer, args=(request,),
+                                     name=f"broker-{self.name}-{request.get('op')}", daemon=True).start()
+                else:
+                    self.answer(request)
+        except socket.timeout:
+            # The bytes read so far are lost, the stream cannot be resynced
+            logger.warning(f"Dropping {self.name}: stalled in the middle of a frame")
+        except (ConnectionError, OSError, ValueError) as e:
+            logger.debug(f"{self.name} disconnected: {e}")
+        finally:
+            self.close()
+            self.broker.forget(self)
+
+
+class SerialBroker:
+    """Single owner of the serial port and USB monitoring.
+
+    Runs as its own process so serial timing does not compete with HTTP
+    workers for the GIL. Clients connect over a Unix domain socket, send
+    requests (send, commands, connect, disconnect, status, dispatch_status,
+    capture_start, capture_stop, subscribe) and, once subscribed, receive
+    every line from the ESP8266, link state changes and probe round trips.
+
+    Whatever must happen once per device rather than once per worker also
+    runs here: command admission, the command journal and its replays,
+    logging bay events to the database, latency probes, status polls and
+    health checks with their reconnects.
+    """
+
+    def __init__(self, socket_path: str = BROKER_SETTINGS["socket_path"],
+                 baudrate: Optional[int] = None) -> None:
+        self.socket_path = socket_path
+        # Rate clients asked for, None to detect it on every connect
+        self.baudrate = baudrate
+        self.manager: Any = None
+        self.event_bus = EventBus()
+        self.connections: Dict[str, _BrokerConnection] = {}
+        self.running = False
+        self._numbers = itertools.count(1)
+        self.dispatcher = CommandDispatcher()
+        self.scheduler = PeriodicScheduler()
+        self.latency_probe = LatencyProbe(on_sample=self._publish_sample)
+        # _lock guards self.manager and is only held briefly; _switch_lock
+        # serialises connects and disconnects, which may detect the baud rate
+        self._lock = threading.RLock()
+        self._switch_lock = threading.Lock()
+        self._server: Optional[socket.socket] = None
+        self._last_status: Optional[Dict[str, Any]] = None
+
+    # Serial side
+
+    def _open(self, port: str, baudrate: Optional[int]) -> Any:
+        """Replace the serial manager with one for `port` (_switch_lock held)"""
+        from serial_manager import SerialManager
+        with self._lock:
+            old = self.manager
+        if old is not None:
+            old.stop()
+        manager = SerialManager(port=port, baudrate=baudrate)
+        manager.set_callback(self._on_line)
+        # Includes the manager's own reconnects, which polling could miss
+        manager.set_connect_callback(self._on_connect)
+        with self._lock:
+            self.manager = manager
+        return manager
+
+    def _on_line(self, line: str) -> None:
+        self.event_bus.publish(parse_message(line))
+
+    def _on_connect(self, manager: Any) -> None:
+        # Probe health is judged afresh for every connection
+        self.latency_probe.reset(manager.port)
+        self.publish_status(force=True)
+        self.dispatcher.replay(manager)
+
+    def _connected_manager(self) -> Any:
+        with self._lock:
+            manager = self.manager
+        return manager if manager and manager.connected else None
+
+    def _replay_pending(self) -> None:
+        manager = self._connected_manager()
+        if manager:
+            self.dispatcher.replay(manager)
+
+    def _poll_status(self) -> None:
+        """Ask the ESP8266 for its service states; every client sees the replies"""
+        manager = self._connected_manager()
+        if manager:
+            manager.send_command("GET_STATUS")
+
+    def _probe(self) -> None:
+        self.latency_probe.probe(self._connected_manager())
+
+    def _health_check(self) -> None:
+        """Reconnect a dropped port, or one whose firmware stopped answering probes"""
+        with self._lock:
+            manager = self.manager
+        if manager is None or not manager.port:
+            return
+        if not manager.connected:
+            logger.warning("Serial connection lost, attempting to reconnect...")
+            self.reconnect()
+        elif self.latency_probe.is_unhealthy(manager.port):
+            logger.warning(f"No probe replies from {manager.port}, reconnecting...")
+            self.latency_probe.reset(manager.port)
+            self.reconnect(force=True)
+
+    def connect(self, port: Optional[str] = None, baudrate: Optional[int] = None) -> bool:
+        # Opening the port happens outside _lock, so send and status keep answering
+        with self._switch_lock:
+            with self._lock:
+                manager = self.manager
+                reopen = manager is None or bool(port and port != manager.port)
+                if baudrate and baudrate != self.baudrate:
+                    self.baudrate = baudrate
+                    reopen = True
+            if reopen:
+                manager = self._open(port or (manager.port if manager else ''), self.baudrate)
+            success = manager.connect()
+        self.publish_status()
+        return success
+
+    def reconnect(self, force: bool = False) -> bool:
+        """Reconnect the current port; force closes it first"""
+        with self._switch_lock:
+            with self._lock:
+                manager = self.manager
+            if manager is None:
+                return False
+            if force:
+                manager.disconnect()
+            success = manager.connect()
+        self.publish_status()
+        return success
+
+    def disconnect(self) -> None:
+        with self._switch_lock:
+            with self._lock:
+                manager = self.manager
+            if manager is not None:
+                manager.disconnect()
+        self.publish_status()
+
+    def handle_usb_event(self, action: str, device_node: str) -> None:
+        if action == 'add':
+            if self.connect(port=device_node):
+                logger.info(f"Connected to new device: {device_node}")
+        elif action == 'remove':
+            with self._lock:
+                current = self.manager.port if self.manager else None
+            if current == device_node:
+                self.disconnect()
+                logger.info(f"Disconnected from removed device: {device_node}")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            manager = self.manager
+            return {
+                "connected": bool(manager and manager.connected),
+                "port": manager.port if manager else None,
+                "baudrate": manager.baudrate if manager and manager.connected else None,
+                "pending_writes": manager.pending_writes() if manager else 0,
+            }
+
+    def publish_status(self, force: bool = False) -> None:
+        """Push link state and write backlog to subscribed clients when they change"""
+        status = self.status()
+        if not force and status == self._last_status:
+            return
+        self._last_status = status
+        payload = _encode(status)
+        for connection in list(self.connections.values()):
+            if connection.subscribed:
+                connection.send(STATUS, payload)
+
+    def _publish_sample(self, port: str, rtt_ms: float) -> None:
+        """Pass probe round trips on to clients, for their telemetry"""
+        payload = _encode({"port": port, "rtt_ms": rtt_ms})
+        for connection in list(self.connections.values()):
+            if connection.subscribed:
+                connection.send(SAMPLE, payload)
+
+    def apply_settings(self, changed: Set[str]) -> None:
+        """Config reload listener: retune the open port and jobs in place"""
+        with self._lock:
+            manager = self.manager
+        if manager and changed & {"SERIAL_SETTINGS", "APP_SETTINGS"}:
+            manager.apply_settings()
+        if "ADMISSION_SETTINGS" in changed:
+            self.dispatcher.apply_settings()
+        if "APP_SETTINGS" in changed:
+            self.scheduler.set_interval("health_check", APP_SETTINGS["health_check_interval"])
+            self.scheduler.set_interval("status_poll", APP_SETTINGS["status_poll_interval"])
+            self.scheduler.set_interval("service_ids", APP_SETTINGS["cache_refresh_interval"])
+        if "PROBE_SETTINGS" in changed:
+            self.latency_probe.apply_settings()
+            self.scheduler.set_interval("latency_probe", PROBE_SETTINGS["interval"])
+
+    def _watch_status(self) -> None:
+        # The serial manager has no disconnect callback, so poll for drops
+        while self.running:
+            time.sleep(BROKER_SETTINGS["status_interval"])
+            self.publish_status()
+
+    # Client side
+
+    def handle_request(self, connection: _BrokerConnection, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        if op == "send":
+            with self._lock:
+                manager = self.manager
+            ok = bool(manager and manager.connected and manager.send_command(request.get("command", "")))
+            return {"ok": ok}
+        elif op == "commands":
+            with self._lock:
+                manager = self.manager
+            items = request.get("items")
+            if not isinstance(items, list):
+                return {"ok": False, "error": "items must be a list"}
+            results = self.dispatcher.submit(manager, items)
+            return {"ok": True, "results": [results[index] for index in sorted(results)]}
+        elif op == "status":
+            return {"ok": True, "status": self.status(), "latency": self.latency_probe.stats()}
+        elif op == "dispatch_status":
+            return {"ok": True, "status": self.dispatcher.status()}
+        elif op == "connect":
+            return {"ok": self.connect(request.get("port"), request.get("baudrate"))}
+        elif op == "disconnect":
+            self.disconnect()
+            return {"ok": True}
+        elif op == "capture_start":
+            with self._lock:
+                path = self.manager.start_capture() if self.manager else None
+            return {"ok": path is not None, "path": path}
+        elif op == "capture_stop":
+            with self._lock:
+                capture = self.manager.stop_capture() if self.manager else None
+            return {"ok": True, "capture": capture}
+        elif op == "subscribe":
+            if not connection.subscribed:
+                connection.subscribed = True
+                self.event_bus.subscribe(connection.name, connection.send_line, policy=DROP_OLDEST)
+            return {"ok": True, "status": self.status()}
+        return {"ok": False, "error": f"Unknown op: {op}"}
+
+    def forget(self, connection: _BrokerConnection) -> None:
+        with self._lock:
+            self.connections.pop(connection.name, None)
+
+    def _accept_loop(self) -> None:
+        while self.running:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                if self.running:
+                    logger.error("Broker socket closed unexpectedly")
+                break
+            sock.settimeout(BROKER_SETTINGS["send_timeout"])
+            connection = _BrokerConnection(self, sock, next(self._numbers))
+            with self._lock:
+                self.connections[connection.name] = connection
+            threading.Thread(target=connection.serve, name=f"broker-{connection.name}",
+                             daemon=True).start()
+
+    def start(self) -> None:
+        self.dispatcher.journal = CommandJournal(JOURNAL_SETTINGS["path"])
+        self.dispatcher.load_services()
+        self.event_bus.subscribe("journal", self.dispatcher.on_event, policy=BLOCK,
+                                 kinds=JOURNAL_EVENTS)
+        self.event_bus.subscribe("db", record_service_event, policy=BLOCK,
+                                 kinds=(SERVICE_STARTED, SERVICE_STOPPED, SERVICE_COMPLETED))
+        self.event_bus.subscribe("probe", self.latency_probe.on_event, policy=BLOCK, kinds=(PONG,))
+        # Threaded: a reconnect may detect the baud rate for several seconds
+        self.scheduler.add_job("health_check", self._health_check,
+                               APP_SETTINGS["health_check_interval"], threaded=True)
+        self.scheduler.add_job("status_poll", self._poll_status, APP_SETTINGS["status_poll_interval"])
+        self.scheduler.add_job("latency_probe", self._probe, PROBE_SETTINGS["interval"])
+        self.scheduler.add_job("journal_replay", self._replay_pending, JOURNAL_SETTINGS["resend_after"])
+        self.scheduler.add_job("journal_compact", self.dispatcher.compact, JOURNAL_SETTINGS["compact_interval"])
+        # Picks up bays added through a worker
+        self.scheduler.add_job("service_ids", self.dispatcher.load_services,
+                               APP_SETTINGS["cache_refresh_interval"])
+        self.scheduler.start()
+
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        try:
+            os.unlink(self.socket_path)  # Left behind by a previous broker
+        except FileNotFoundError:
+            pass
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        self._server.listen()
+        self.running = True
+        threading.Thread(target=self._accept_loop, name="broker-accept", daemon=True).start()
+        threading.Thread(target=self._watch_status, name="broker-status", daemon=True).start()
+        logger.info(f"Serial broker listening on {self.socket_path}")
+
+        from usb_manager import find_serial_devices, monitor_usb_devices
+        threading.Thread(target=monitor_usb_devices, args=(self.handle_usb_event,),
+                         name="broker-usb", daemon=True).start()
+        devices = find_serial_devices()
+        with self._switch_lock:
+            self._open(devices[0] if devices else '', self.baudrate)
+        if devices and self.connect():
+            logger.info(f"Connected to {devices[0]}")
+
+    def stop(self) -> None:
+        self.running = False
+        self.scheduler.stop()
+        if self._server is not None:
+            self._server.close()
+        for connection in list(self.connections.values()):
+            connection.close()
+        with self._lock:
+            manager = self.manager
+        if manager is not None:
+            manager.stop()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+class _Waiter:
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.response: Optional[Dict[str, Any]] = None
+
+
+class BrokerClient:
+    """Stands in for SerialManager inside an HTTP worker, backed by a SerialBroker.
+
+    Link state is pushed by the broker, so `connected`, `port` and
+    `pending_writes()` are answered locally without a round trip.
+    """
+
+    def __init__(self, socket_path: str = BROKER_SETTINGS["socket_path"]) -> None:
+        self.socket_path = socket_path
+        self.callback: Optional[Callable[[str], None]] = None
+        self.connect_callback: Optional[Callable[["BrokerClient"], None]] = None
+        self.sample_callback: Optional[Callable[[str, float], None]] = None
+        self.last_message: Optional[str] = None
+        self.requested_port: Optional[str] = None
+        self.requested_baudrate: Optional[int] = None
+        self.running = True
+        self._status: Dict[str, Any] = {}
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._waiters: Dict[int, _Waiter] = {}
+        self._ids = itertools.count(1)
+        threading.Thread(target=self._run, name="broker-client", daemon=True).start()
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None and bool(self._status.get("connected"))
+
+    @property
+    def port(self) -> Optional[str]:
+        return self._status.get("port")
+
+    @property
+    def baudrate(self) -> int:
+        return self._status.get("baudrate") or self.requested_baudrate or 0
+
+    def pending_writes(self) -> int:
+        return self._status.get("pending_writes", 0)
+
+    def set_callback(self, callback: Callable[[str], None]) -> None:
+        self.callback = callback
+
+    def set_connect_callback(self, callback: Callable[["BrokerClient"], None]) -> None:
+        self.connect_callback = callback
+
+    def set_sample_callback(self, callback: Callable[[str, float], None]) -> None:
+        """Called with (port, rtt_ms) for each probe reply the broker times"""
+        self.sample_callback = callback
+
+    def get_last_message(self) -> Optional[str]:
+        return self.last_message
+
+    def select(self, port: str, baudrate: Optional[int] = None) -> None:
+        """Choose the port the broker should open on the next connect()"""
+        self.requested_port = port
+        self.requested_baudrate = baudrate
+
+    def _request(self, op: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        sock = self._sock
+        if sock is None:
+            logger.warning(f"Serial broker unavailable, dropping '{op}' request")
+            return None
+        request_id = next(self._ids)
+        waiter = self._waiters[request_id] = _Waiter()
+        try:
+            with self._send_lock:
+                send_frame(sock, REQUEST, _encode(dict(fields, id=request_id, op=op)))
+            if not waiter.event.wait(BROKER_SETTINGS["request_timeout"]):
+                logger.warning(f"Serial broker did not answer '{op}' in time")
+            return waiter.response
+        except OSError as e:
+            logger.error(f"Error sending '{op}' to serial broker: {e}")
+            return None
+        finally:
+            self._waiters.pop(request_id, None)
+
+    def connect(self) -> bool:
+        response = self._request("connect", port=self.requested_port,
+                                 baudrate=self.requested_baudrate)
+        return bool(response and response.get("ok"))
+
+    def disconnect(self) -> None:
+        self._request("disconnect")
+
+    def send_command(self, command: str) -> bool:
+        response = self._request("send", command=command)
+        return bool(response and response.get("ok"))
+
+    def start_capture(self) -> Optional[str]:
+        response = self._request("capture_start")
+        return response.get("path") if response else None
+
+    def stop_capture(self) -> Optional[Dict[str, Any]]:
+        response = self._request("capture_stop")
+        return response.get("capture") if response else None
+
+    def submit_commands(self, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Have the broker admit, journal and send commands; None if it did not answer"""
+        response = self._request("commands", items=items)
+        return response.get("results") if response and response.get("ok") else None
+
+    def latency_stats(self) -> Optional[Dict[str, Any]]:
+        response = self._request("status")
+        return response.get("latency") if response else None
+
+    def dispatch_status(self) -> Optional[Dict[str, Any]]:
+        response = self._request("dispatch_status")
+        return response.get("status") if response else None
+
+    def apply_settings(self) -> None:
+        pass  # The broker process watches the config file itself
+
+    def stop(self) -> None:
+        self.running = False
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _update_status(self, status: Dict[str, Any]) -> None:
+        was_connected = self.connected
+        self._status = status
+        if self.connected and not was_connected and self.connect_callback:
+            # Callbacks send requests, which need this reader thread to answer them
+            threading.Thread(target=self._run_connect_callback, daemon=True).start()
+
+    def _run_connect_callback(self) -> None:
+        try:
+            self.connect_callback(self)
+        except Exception as e:
+            logger.error(f"Error in connect callback: {e}")
+
+    def _run(self) -> None:
+        while self.running:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                time.sleep(BROKER_SETTINGS["reconnect_delay"])
+                continue
+
+            logger.info(f"Connected to serial broker at {self.socket_path}")
+            self._sock = sock
+            subscribe_id = next(self._ids)
+            try:
+                with self._send_lock:
+                    send_frame(sock, REQUEST, _encode({"id": subscribe_id, "op": "subscribe"}))
+                while self.running:
+                    kind, payload = recv_frame(sock)
+                    if kind == LINE:
+                        line = payload.decode(errors="replace")
+                        self.last_message = line
+                        if self.callback:
+                            self.callback(line)
+                    elif kind == STATUS:
+                        self._update_status(json.loads(payload))
+                    elif kind == SAMPLE:
+                        sample = json.loads(payload)
+                        if self.sample_callback:
+                            self.sample_callback(sample["port"], sample["rtt_ms"])
+                    elif kind == RESPONSE:
+                        response = json.loads(payload)
+                        if response.get("id") == subscribe_id:
+                            self._update_status(response.get("status", {}))
+                        waiter = self._waiters.get(response.get("id"))
+                        if waiter is not None:
+                            waiter.response = response
+                            waiter.event.set()
+            except (ConnectionError, OSError, ValueError) as e:
+                if self.running:
+                    logger.warning(f"Lost serial broker connection: {e}")
+            finally:
+                self._sock = None
+                self._status = {}
+                sock.close()
+                for waiter in list(self._waiters.values()):
+                    waiter.event.set()
+
+
+class RemoteDispatcher:
+    """Stands in for CommandDispatcher inside an HTTP worker.
+
+    Admission, the journal and replays live in the broker, so every worker
+    shares one budget and one journal for the device.
+    """
+
+    def __init__(self, client: BrokerClient) -> None:
+        self.client = client
+
+    def submit(self, manager: Any, items: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        results = self.client.submit_commands(items)
+        if results is None:
+            return {index: {"index": index, "op": COMMAND, "success": False, "sent": False,
+                            "error": "Serial broker unavailable"}
+                    for index, item in enumerate(items) if item.get("op") == COMMAND}
+        return {result["index"]: result for result in results}
+
+    def set_services(self, services: List[Dict[str, Any]]) -> None:
+        pass  # The broker reads the bay ids from the database itself
+
+    def replay(self, manager: Any) -> List[str]:
+        return []  # The broker replays on its own connects and schedule
+
+    def on_event(self, event: SerialEvent) -> None:
+        pass
+
+    def compact(self) -> None:
+        pass
+
+    def apply_settings(self) -> None:
+        pass  # The broker reloads ADMISSION_SETTINGS itself
+
+    def status(self) -> Dict[str, Any]:
+        return self.client.dispatch_status() or {"admission": {}, "journal": {"pending": []}}
+
+
+class RemoteProbe:
+    """Stands in for LatencyProbe inside an HTTP worker.
+
+    The broker sends the probes and judges link health, so PING sequence
+    numbers and probe traffic do not multiply with the number of workers.
+    """
+
+    def __init__(self, client: BrokerClient) -> None:
+        self.client = client
+
+    def probe(self, manager: Any) -> None:
+        pass
+
+    def on_event(self, event: SerialEvent) -> None:
+        pass
+
+    def is_unhealthy(self, port: str) -> bool:
+        return False  # The broker reconnects unhealthy ports itself
+
+    def reset(self, port: str) -> None:
+        pass
+
+    def apply_settings(self) -> None:
+        pass  # The broker reloads PROBE_SETTINGS itself
+
+    def stats(self, port: Optional[str] = None) -> Dict[str, Any]:
+        stats = self.client.latency_stats() or {}
+        if port is not None:
+            return stats.get(port, {})
+        return stats
+
+
+def main() -> None:
+    logging.config.dictConfig(LOG_SETTINGS)
+    broker = SerialBroker()
+    stopped = threading.Event()
+
+    def shutdown(signum: int, frame: Any) -> None:
+        stopped.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    watcher = ConfigWatcher()
+    watcher.add_listener(broker.apply_settings)
+    watcher.check()
+    broker.start()
+    while not stopped.wait(CONFIG_RELOAD_SETTINGS["poll_interval"]):
+        watcher.check()
+    logger.info("Stopping serial broker")
+    broker.stop()
+
+if __name__ == "__main__":
+    main()
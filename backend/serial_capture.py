@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import os
+import time
+import struct
+import logging
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterator, NamedTuple, BinaryIO, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from config import CAPTURE_SETTINGS
+
+logger = logging.getLogger("serial")
+
+# File: MAGIC, FILE_HEADER (wall clock start in ns, baud rate, port name length),
+# port name, then records of RECORD_HEADER (direction, ns since start, length) + bytes
+MAGIC = b"ESQCAP1\n"
+FILE_HEADER = struct.Struct("!qIH")
+RECORD_HEADER = struct.Struct("!BQH")
+
+RX = 0
+TX = 1
+
+REPLAY_PREFIX = "replay:"
+
+
+class CaptureRecord(NamedTuple):
+    direction: int
+    offset: float  # seconds since the capture started
+    data: bytes
+
+
+class CaptureWriter:
+    """Appends RX/TX bytes with nanosecond timestamps to a capture file"""
+
+    def __init__(self, path: str, port: str, baudrate: int) -> None:
+        self.path = path
+        self.records = 0
+        self.size = 0
+        self.closed = False
+        self._start = time.monotonic_ns()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        name = port.encode()
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(MAGIC + FILE_HEADER.pack(time.time_ns(), baudrate, len(name)) + name)
+        self.size = self._file.tell()
+
+    def record(self, direction: int, data: bytes) -> None:
+        offset = time.monotonic_ns() - self._start
+        with self._lock:
+            if self.closed:
+                return
+            if self.size >= CAPTURE_SETTINGS["max_bytes"]:
+                logger.warning(f"Capture {self.path} reached its size limit, stopping")
+                self._close()
+                return
+            for start in range(0, len(data), 0xFFFF):
+                chunk = data[start:start + 0xFFFF]
+                self._file.write(RECORD_HEADER.pack(direction, offset, len(chunk)) + chunk)
+                self.size += RECORD_HEADER.size + len(chunk)
+            self.records += 1
+            now = time.monotonic()
+            if now - self._last_flush >= CAPTURE_SETTINGS["flush_interval"]:
+                self._file.flush()
+                self._last_flush = now
+
+    def _close(self) -> None:
+        self.closed = True
+        self._file.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self.closed:
+                self._close()
+
+    def status(self) -> Dict[str, Any]:
+        return {"path": self.path, "records": self.records, "bytes": self.size,
+                "active": not self.closed}
+
+
+class CaptureReader:
+    """Reads a capture file; a record cut short by a crash ends the stream"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a serial capture")
+            start_ns, self.baudrate, name_length = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+            self.port = f.read(name_length).decode()
+            self.started = start_ns / 1e9
+            self._data_offset = f.tell()
+
+    def __iter__(self) -> Iterator[CaptureRecord]:
+        with open(self.path, "rb") as f:
+            f.seek(self._data_offset)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                direction, offset, length = RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    return
+                yield CaptureRecord(direction, offset / 1e9, data)
+
+
+def new_capture_path(port: str) -> str:
+    name = os.path.basename(port) or "serial"
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(CAPTURE_SETTINGS["directory"], f"{stamp}_{name}.cap")
+
+
+def list_captures() -> List[Dict[str, Any]]:
+    directory = CAPTURE_SETTINGS["directory"]
+    try:
+        names = sorted(os.listdir(directory), reverse=True)
+    except FileNotFoundError:
+        return []
+    captures = []
+    for name in names:
+        if name.endswith(".cap"):
+            stat = os.stat(os.path.join(directory, name))
+            captures.append({"name": name, "bytes": stat.st_size,
+                             "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()})
+    return captures
+
+
+def parse_replay_port(port: str) -> Tuple[str, float]:
+    """Split "replay:<path>?speed=<n>" into the capture path and speed"""
+    parsed = urlparse(port[len(REPLAY_PREFIX):])
+    speed = float(parse_qs(parsed.query).get("speed", ["1"])[0])
+    return parsed.path, speed
+
+
+class ReplayPort:
+    """Stands in for serial.Serial, playing back the RX side of a capture.
+
+    Lines arrive at their recorded times divided by `speed` (0 plays back
+    as fast as possible), so the whole read path above the port sees the
+    same traffic the site did. Writes are counted and discarded.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, timeout: float = 1.0) -> None:
+        reader = CaptureReader(path)
+        self.baudrate = reader.baudrate
+        self.speed = speed
+        self.timeout = timeout
+        self.is_open = True
+        self.finished = False
+        self.lines_read = 0
+        self.bytes_written = 0
+        self._records = (record for record in reader if record.direction == RX)
+        self._next: Optional[CaptureRecord] = next(self._records, None)
+        self._start: Optional[float] = None
+
+    def readline(self) -> bytes:
+        if self._start is None:
+            self._start = time.monotonic()
+        if self._next is None:
+            self.finished = True
+            time.sleep(self.timeout)  # An idle port: nothing until the read times out
+            return b""
+        if self.speed > 0:
+            wait = self._start + self._next.offset / self.speed - time.monotonic()
+            if wait > self.timeout:
+                time.sleep(self.timeout)
+                return b""
+            if wait > 0:
+                time.sleep(wait)
+        record, self._next = self._next, next(self._records, None)
+        self.lines_read += 1
+        return record.data
+
+    def write(self, data: bytes) -> int:
+        self.bytes_written += len(data)
+        return len(data)
+
+    def close(self) -> None:
+        self.is_open = False
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from queue import Queue, Empty, Full
+from typing import Optional, Dict, Any, Callable, Iterable
+
+from config import EVENT_BUS_SETTINGS
+
+logger = logging.getLogger("events")
+
+# Event kinds
+INITIALIZED = "initialized"
+HEARTBEAT = "heartbeat"
+COIN_INSERTED = "coin_inserted"
+SERVICE_STARTED = "service_started"
+SERVICE_STOPPED = "service_stopped"
+SERVICE_COMPLETED = "service_completed"
+SERVICE_STATUS = "service_status"
+COMMAND_ECHO = "command_echo"
+PONG = "pong"
+BAUD_OK = "baud_ok"
+ERROR = "error"
+UNKNOWN = "unknown"
+
+# Matches the ErrorCode enum in esp8266_firmware.ino
+ERROR_CODES = {
+    0: "ERROR_NONE",
+    1: "ERROR_RELAY_FAILURE",
+    2: "ERROR_COIN_DETECTOR",
+    3: "ERROR_POWER_LOW",
+    4: "ERROR_SYSTEM",
+}
+
+
+@dataclass(frozen=True)
+class SerialEvent:
+    kind: str
+    raw: str
+    service_id: Optional[int] = None
+    value: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+    # For measuring intervals; unlike timestamp it never jumps with the wall clock
+    received: float = field(default_factory=time.monotonic, compare=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "raw": self.raw,
+            "service_id": self.service_id,
+            "value": self.value,
+            "timestamp": self.timestamp,
+        }
+
+
+def _simple(kind: str) -> Callable[[str, str], SerialEvent]:
+    return lambda line, arg: SerialEvent(kind, line)
+
+
+def _with_service_id(kind: str) -> Callable[[str, str], SerialEvent]:
+    def parse(line: str, arg: str) -> SerialEvent:
+        if not arg.isdigit():
+            return SerialEvent(UNKNOWN, line)
+        return SerialEvent(kind, line, service_id=int(arg))
+    return parse
+
+
+def _command_echo(line: str, arg: str) -> SerialEvent:
+    return SerialEvent(COMMAND_ECHO, line, service_id=int(arg) if arg.isdigit() else None,
+                       value=line.partition(":")[0])
+
+
+def _with_value(kind: str) -> Callable[[str, str], SerialEvent]:
+    return lambda line, arg: SerialEvent(kind, line, value=arg)
+
+
+def _error(line: str, arg: str) -> SerialEvent:
+    code = int(arg) if arg.isdigit() else None
+    name = ERROR_CODES.get(code, arg) if code is not None else (arg or line)
+    return SerialEvent(ERROR, line, value=name)
+
+
+# Dispatch on the text before the first ':'
+PARSERS: Dict[str, Callable[[str, str], SerialEvent]] = {
+    "ESP8266_INITIALIZED": _simple(INITIALIZED),
+    "HEARTBEAT": _simple(HEARTBEAT),
+    "COIN_INSERTED": _simple(COIN_INSERTED),
+    "SERVICE_STARTED": _with_service_id(SERVICE_STARTED),
+    "SERVICE_STOPPED": _with_service_id(SERVICE_STOPPED),
+    "SERVICE_COMPLETED": _with_service_id(SERVICE_COMPLETED),
+    "START_SERVICE": _command_echo,
+    "STOP_SERVICE": _command_echo,
+    "GET_STATUS": _command_echo,
+    "PONG": _with_value(PONG),
+    "BAUD_OK": _with_value(BAUD_OK),
+    "INVALID_COMMAND": _error,
+    "ERROR": _error,
+}
+
+
+def parse_message(line: str) -> SerialEvent:
+    """Turn one line of firmware output into a typed event"""
+    line = line.strip()
+    head, _, arg = line.partition(":")
+    parser = PARSERS.get(head)
+    if parser is not None:
+        return parser(line, arg)
+    # GET_STATUS replies, e.g. "SERVICE_3:ACTIVE:120" (seconds left) or "SERVICE_3:INACTIVE"
+    if head.startswith("SERVICE_") and head[8:].isdigit():
+        return SerialEvent(SERVICE_STATUS, line, service_id=int(head[8:]), value=arg)
+    return SerialEvent(UNKNOWN, line)
+
+
+# Backpressure policies for a full subscriber queue
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"  # wait up to block_timeout, then drop the new event
+
+
+class Subscription:
+    def __init__(self, name: str, maxsize: int, policy: str,
+                 kinds: Optional[Iterable[str]]) -> None:
+        if policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.name = name
+        self.policy = policy
+        self.kinds = set(kinds) if kinds else None
+        self.queue: "Queue[SerialEvent]" = Queue(maxsize=maxsize)
+        self.delivered = 0
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, event: SerialEvent) -> None:
+        if self.closed or (self.kinds is not None and event.kind not in self.kinds):
+            return
+        try:
+            if self.policy == BLOCK:
+                self.queue.put(event, timeout=EVENT_BUS_SETTINGS["block_timeout"])
+            else:
+                self.queue.put_nowait(event)
+            return
+        except Full:
+            pass
+        if self.policy == DROP_OLDEST:
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(event)
+            except (Empty, Full):
+                pass
+        self.dropped += 1
+
+    def get(self, timeout: Optional[float] = None) -> Optional[SerialEvent]:
+        try:
+            event = self.queue.get(timeout=timeout)
+        except Empty:
+            return None
+        self.delivered += 1
+        return event
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "depth": self.queue.qsize(),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+class EventBus:
+    """Fans serial events out to subscribers, each behind its own bounded queue.
+
+    publish() only ever enqueues, so a slow subscriber costs the serial reader
+    at most block_timeout (BLOCK policy) and otherwise nothing.
+    """
+
+    def __init__(self) -> None:
+        self.subscriptions: Dict[str, Subscription] = {}
+        self.published = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, name: str, handler: Optional[Callable[[SerialEvent], None]] = None,
+                  maxsize: int = EVENT_BUS_SETTINGS["queue_size"], policy: str = DROP_OLDEST,
+                  kinds: Optional[Iterable[str]] = None) -> Subscription:
+        """Add a subscriber; with a handler it is drained by a dedicated thread,
+        without one the caller reads it with Subscription.get()"""
+        subscription = Subscription(name, maxsize, policy, kinds)
+        with self._lock:
+            if name in self.subscriptions:
+                raise ValueError(f"Subscriber already registered: {name}")
+            self.subscriptions[name] = subscription
+        if handler is not None:
+            threading.Thread(target=self._drain, args=(subscription, handler),
+                             name=f"events-{name}", daemon=True).start()
+        return subscription
+
+    def unsubscribe(self, name: str) -> None:
+        with self._lock:
+            subscription = self.subscriptions.pop(name, None)
+        if subscription is not None:
+            subscription.closed = True
+
+    def publish(self, event: SerialEvent) -> None:
+        with self._lock:
+            subscriptions = list(self.subscriptions.values())
+            self.published += 1
+        for subscription in subscriptions:
+            subscription.offer(event)
+
+    @staticmethod
+    def _drain(subscription: Subscription, handler: Callable[[SerialEvent], None]) -> None:
+        while not subscription.closed:
+            event = subscription.get(timeout=1)
+            if event is None:
+                continue
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Subscriber '{subscription.name}' failed on {event.kind}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "published": self.published,
+                "subscribers": {name: s.stats() for name, s in self.subscriptions.items()},
+            }
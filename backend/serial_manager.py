@@ -9,11 +9,16 @@ import serial
 import serial.tools.list_ports
 from datetime import datetime
 import logging
-from queue import Queue
-from config import SERIAL_SETTINGS, APP_SETTINGS
+from queue import Queue, Empty
+from config import SERIAL_SETTINGS, APP_SETTINGS, DB_FILE
+from baud_detect import open_detected
+from serial_capture import (
+    CaptureWriter, ReplayPort, RX, TX, REPLAY_PREFIX, new_capture_path, parse_replay_port
+)
+from config import CAPTURE_SETTINGS
 
 # Database setup
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "esquima.db")
+DB_PATH = str(DB_FILE)
 
 logger = logging.getLogger("serial")
 
@@ -23,6 +28,9 @@ def setup_database():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    # WAL lets readers such as online backups run alongside kiosk writes
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
     # Create tables if they don't exist
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS services (
@@ -47,6 +55,9 @@ def setup_database():
     )
     ''')
     
+    # Retention and log queries both select by timestamp
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)")
+    
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS settings (
         key TEXT PRIMARY KEY,
@@ -85,53 +96,180 @@ def setup_database():
     conn.close()
 
 class SerialManager:
-    def __init__(self, port, baudrate=SERIAL_SETTINGS["baudrate"]):
+    def __init__(self, port, baudrate=None):
         self.port = port
-        self.baudrate = baudrate
+        # Without an explicit rate it is detected on every (re)connect
+        self.auto_baud = baudrate is None
+        self.baudrate = baudrate or SERIAL_SETTINGS["baudrate"]
         self.serial = None
         self.running = False
         self.message_queue = Queue()
         self.reconnect_attempts = 0
         self.max_reconnect_attempts = APP_SETTINGS["reconnect_attempts"]
         self.reconnect_delay = APP_SETTINGS["reconnect_delay"]
+        self.callback = None
+        self.connect_callback = None
+        self.last_message = None
+        self.capture = None
+        self._threads = []
+        self._reconnect_lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self.running and self.serial is not None and self.serial.is_open
+
+    def set_callback(self, callback):
+        """Register a function called with every received line"""
+        self.callback = callback
+
+    def set_connect_callback(self, callback):
+        """Register a function called with this manager after every (re)connect"""
+        self.connect_callback = callback
+
+    def get_last_message(self):
+        return self.last_message
+
+    def connect(self):
+        if not self.port:
+            logger.warning("Cannot connect: no serial port selected")
+            return False
+        with self._reconnect_lock:
+            # A reconnect from the read or write loop may have just finished
+            if self.connected:
+                return True
+            started = self._start_locked()
+        if started:
+            self._notify_connected()
+        return started
+
+    def disconnect(self):
+        self.stop()
+
+    def send_command(self, command):
+        return self.send(command)
+
+    def pending_writes(self):
+        """Number of queued commands not yet written to the port"""
+        return self.message_queue.qsize()
+
+    def start_capture(self, path=None):
+        """Record RX/TX bytes of this session to a capture file, returns its path"""
+        if self.capture and not self.capture.closed:
+            return self.capture.path
+        self.capture = CaptureWriter(path or new_capture_path(self.port), self.port, self.baudrate)
+        logger.info(f"Capturing serial traffic to {self.capture.path}")
+        return self.capture.path
+
+    def stop_capture(self):
+        capture, self.capture = self.capture, None
+        if capture:
+            capture.close()
+            logger.info(f"Stopped capture {capture.path} after {capture.records} records")
+        return capture.status() if capture else None
+
+    def apply_settings(self):
+        """Pick up reloaded SERIAL_SETTINGS timeouts and reconnect policy without reopening the port"""
+        self.max_reconnect_attempts = APP_SETTINGS["reconnect_attempts"]
+        self.reconnect_delay = APP_SETTINGS["reconnect_delay"]
+        port = self.serial
+        if port is None or not port.is_open:
+            return  # The next open reads SERIAL_SETTINGS anyway
+        try:
+            port.timeout = SERIAL_SETTINGS["timeout"]
+            port.write_timeout = SERIAL_SETTINGS["write_timeout"]
+            port.inter_byte_timeout = SERIAL_SETTINGS["inter_byte_timeout"]
+            logger.info(f"Applied serial timeouts to {self.port}")
+        except (serial.SerialException, ValueError) as e:
+            logger.error(f"Error applying serial settings to {self.port}: {e}")
+
+    def _open_port(self):
+        if self.port.startswith(REPLAY_PREFIX):
+            # "replay:<capture>?speed=<n>" plays a recorded session back through this manager
+            path, speed = parse_replay_port(self.port)
+            port = ReplayPort(path, speed, timeout=SERIAL_SETTINGS["timeout"])
+            self.baudrate = port.baudrate
+            return port
+        if self.auto_baud:
+            port = open_detected(self.port)
+            if port is not None:
+                self.baudrate = port.baudrate
+            return port
+        return serial.Serial(
+            self.port,
+            self.baudrate,
+            timeout=SERIAL_SETTINGS["timeout"],
+            write_timeout=SERIAL_SETTINGS["write_timeout"],
+            inter_byte_timeout=SERIAL_SETTINGS["inter_byte_timeout"]
+        )
 
     def start(self):
+        with self._reconnect_lock:
+            started = self._start_locked()
+        if started:
+            self._notify_connected()
+        return started
+
+    def _start_locked(self):
+        """Open the port and start the loops; the caller holds _reconnect_lock"""
         try:
-            self.serial = serial.Serial(
-                self.port,
-                self.baudrate,
-                timeout=SERIAL_SETTINGS["timeout"],
-                write_timeout=SERIAL_SETTINGS["write_timeout"],
-                inter_byte_timeout=SERIAL_SETTINGS["inter_byte_timeout"]
-            )
+            previous = self.serial
+            if previous is not None and previous.is_open:
+                previous.close()  # Never leave a second descriptor on the same device
+            self.serial = self._open_port()
+            if self.serial is None:
+                return False
+            if CAPTURE_SETTINGS["capture_on_connect"] and not self.port.startswith(REPLAY_PREFIX):
+                self.start_capture()
             self.running = True
             self.reconnect_attempts = 0
             
-            # Start read and write threads
-            threading.Thread(target=self.read_loop, daemon=True).start()
-            threading.Thread(target=self.write_loop, daemon=True).start()
+            # Start read and write threads; reconnects from inside them reuse the same pair
+            if not any(thread.is_alive() for thread in self._threads):
+                self._threads = [
+                    threading.Thread(target=self.read_loop, name=f"serial-read-{self.port}", daemon=True),
+                    threading.Thread(target=self.write_loop, name=f"serial-write-{self.port}", daemon=True),
+                ]
+                for thread in self._threads:
+                    thread.start()
             
             logger.info(f"Connected to {self.port}")
             return True
-        except serial.SerialException as e:
+        except (serial.SerialException, OSError, ValueError) as e:
             logger.error(f"Error opening serial port: {e}")
             return False
 
+    def _notify_connected(self):
+        # Outside the lock: the callback may send, and a slow one must not hold up a reconnect
+        if self.connect_callback:
+            try:
+                self.connect_callback(self)
+            except Exception as e:
+                logger.error(f"Error in connect callback: {e}")
+
     def read_loop(self):
         while self.running:
-            if not self.serial or not self.serial.is_open:
-                if not self._attempt_reconnect():
+            port = self.serial
+            if not port or not port.is_open:
+                if not self._attempt_reconnect(port):
                     break
                 continue
 
             try:
-                line = self.serial.readline().decode().strip()
+                raw = port.readline()
+                capture = self.capture
+                if raw and capture:
+                    capture.record(RX, raw)
+                line = raw.decode().strip()
                 if line:
                     logger.debug(f"RX: {line}")
-                    # Process received data here
+                    self.last_message = line
+                    if self.callback:
+                        self.callback(line)
             except serial.SerialException as e:
+                if not self.running:
+                    break  # Port closed by stop()
                 logger.error(f"Serial read error: {e}")
-                if not self._attempt_reconnect():
+                if not self._attempt_reconnect(port):
                     break
             except Exception as e:
                 logger.error(f"Unexpected read error: {e}")
@@ -139,37 +277,72 @@ class SerialManager:
 
     def write_loop(self):
         while self.running:
+            port = None
             try:
                 message = self.message_queue.get(timeout=1)
-                if self.serial and self.serial.is_open:
-                    self.serial.write(f"{message}\n".encode())
+                if message is None:
+                    continue  # Wake-up from stop()
+                port = self.serial
+                if port and port.is_open:
+                    data = f"{message}\n".encode()
+                    port.write(data)
+                    capture = self.capture
+                    if capture:
+                        capture.record(TX, data)
                     logger.debug(f"TX: {message}")
-            except Queue.Empty:
+            except Empty:
                 continue
             except serial.SerialException as e:
                 logger.error(f"Serial write error: {e}")
-                if not self._attempt_reconnect():
+                if not self._attempt_reconnect(port):
                     break
             except Exception as e:
                 logger.error(f"Unexpected write error: {e}")
 
-    def _attempt_reconnect(self):
-        if self.reconnect_attempts >= self.max_reconnect_attempts:
-            logger.error(f"Max reconnection attempts ({self.max_reconnect_attempts}) reached")
-            self.stop()
-            return False
+    def _reconnected_since(self, failed):
+        """True if someone else already replaced the `failed` port with a working one"""
+        return self.serial is not None and self.serial is not failed and self.serial.is_open
 
-        self.reconnect_attempts += 1
-        logger.warning(f"Attempting to reconnect (attempt {self.reconnect_attempts}/{self.max_reconnect_attempts})")
-        
-        try:
-            if self.serial:
-                self.serial.close()
+    def _attempt_reconnect(self, failed=None):
+        """Reopen the port after `failed` (the port object the caller was using) broke"""
+        # The read and write loops, and a health check calling connect(), can all
+        # hit the same failure; only one of them reopens the port
+        with self._reconnect_lock:
+            if not self.running:
+                return False
+            if self._reconnected_since(failed):
+                return True
+            retry = self.reconnect_attempts < self.max_reconnect_attempts
+            if retry:
+                self.reconnect_attempts += 1
+                logger.warning(f"Attempting to reconnect (attempt {self.reconnect_attempts}/{self.max_reconnect_attempts})")
+                if failed:
+                    try:
+                        failed.close()
+                    except Exception as e:
+                        logger.error(f"Error closing serial port: {e}")
+
+        if retry:
+            # Not holding the lock while waiting, so stop() and connect() are not held up
             time.sleep(self.reconnect_delay)
-            return self.start()
-        except Exception as e:
-            logger.error(f"Reconnection failed: {e}")
-            return False
+            with self._reconnect_lock:
+                if not self.running:
+                    return False
+                if self._reconnected_since(failed):
+                    return True
+                try:
+                    started = self._start_locked()
+                except Exception as e:
+                    logger.error(f"Reconnection failed: {e}")
+                    return False
+            if started:
+                self._notify_connected()
+            return started
+
+        # Outside the lock, stop() waits for the other loop, which may be queued on it
+        logger.error(f"Max reconnection attempts ({self.max_reconnect_attempts}) reached")
+        self.stop()
+        return False
 
     def send(self, message):
         if not self.running:
@@ -184,14 +357,25 @@ class SerialManager:
 
     def stop(self):
         logger.info("Stopping serial manager")
-        self.running = False
-        if self.serial:
-            try:
-                self.serial.close()
-                logger.info(f"Closed connection to {self.port}")
-            except Exception as e:
-                logger.error(f"Error closing serial port: {e}")
-        self.serial = None
+        # Waits for a start() in progress, so it cannot reopen the port after this
+        with self._reconnect_lock:
+            self.running = False
+            self.stop_capture()
+            if self.serial:
+                try:
+                    self.serial.close()
+                    logger.info(f"Closed connection to {self.port}")
+                except Exception as e:
+                    logger.error(f"Error closing serial port: {e}")
+            self.serial = None
+        self.message_queue.put(None)
+        # Wait for the loops to notice, so a replaced manager leaves nothing behind
+        current = threading.current_thread()
+        for thread in self._threads:
+            if thread is not current:
+                thread.join(timeout=SERIAL_SETTINGS["timeout"] + 1)
+                if thread.is_alive():
+                    logger.warning(f"{thread.name} did not stop in time")
 
 def get_services():
     """Get all services from database"""
@@ -1,8 +1,8 @@
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Dict
 import serial
 
 class SerialManager:
-    def __init__(self, port: str, baudrate: int = 115200) -> None: ...
+    def __init__(self, port: str, baudrate: Optional[int] = None) -> None: ...
     @property
     def connected(self) -> bool: ...
     @property
@@ -12,5 +12,10 @@ class SerialManager:
     def connect(self) -> bool: ...
     def disconnect(self) -> None: ...
     def send_command(self, command: str) -> bool: ...
+    def pending_writes(self) -> int: ...
+    def start_capture(self, path: Optional[str] = None) -> str: ...
+    def stop_capture(self) -> Optional[Dict[str, Any]]: ...
+    def apply_settings(self) -> None: ...
     def get_last_message(self) -> Optional[str]: ...
-    def set_callback(self, callback: Callable[[str], None]) -> None: ... 
\ No newline at end of file
+    def set_callback(self, callback: Callable[[str], None]) -> None: ...
+    def set_connect_callback(self, callback: Callable[["SerialManager"], None]) -> None: ... 
\ No newline at end of file
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import time
+import heapq
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+from serial_events import (
+    SerialEvent, SERVICE_STARTED, SERVICE_STOPPED, SERVICE_COMPLETED, SERVICE_STATUS
+)
+
+logger = logging.getLogger("timers")
+
+# Seconds a countdown may differ from a status report before it is corrected
+DRIFT_TOLERANCE = 2.0
+
+
+class _ActiveService:
+    def __init__(self, service_id: int, duration: float, deadline: float,
+                 generation: int, estimated: bool) -> None:
+        self.service_id = service_id
+        self.duration = duration
+        self.deadline = deadline
+        self.generation = generation
+        self.estimated = estimated
+
+
+class ServiceTimerEngine:
+    """Mirrors the firmware's per-bay countdowns on the host.
+
+    State is driven by the commands we send and the lines the ESP8266 prints,
+    so the UI can read every bay's remaining time without a GET_STATUS round
+    trip. Occasional status reports reconcile any drift.
+    """
+
+    def __init__(self) -> None:
+        self.durations: Dict[int, float] = {}
+        self.active: Dict[int, _ActiveService] = {}
+        self.version = 0
+        self._deadlines: List[Tuple[float, int, int]] = []
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def load_durations(self, services: List[Dict[str, Any]]) -> None:
+        """Take bay durations (seconds) from the services table"""
+        with self._lock:
+            self.durations = {int(s["id"]): float(s["duration"]) for s in services}
+
+    def start(self, service_id: int, estimated: bool = False,
+              remaining: Optional[float] = None) -> None:
+        """Start a bay's countdown, from `remaining` seconds when the firmware reported it"""
+        with self._lock:
+            duration = self.durations.get(service_id)
+            if duration is None:
+                logger.warning(f"No duration known for service {service_id}")
+                return
+            self._generation += 1
+            deadline = time.monotonic() + (duration if remaining is None else remaining)
+            self.active[service_id] = _ActiveService(
+                service_id, duration, deadline, self._generation, estimated
+            )
+            heapq.heappush(self._deadlines, (deadline, service_id, self._generation))
+            self.version += 1
+
+    def stop(self, service_id: int) -> None:
+        with self._lock:
+            if self.active.pop(service_id, None) is not None:
+                self.version += 1
+
+    def on_command(self, command: str, replay: bool = False) -> None:
+        """Track a command that was sent to the ESP8266.
+
+        A replayed START for a bay that is already counting down does not
+        restart the firmware's timer, so it must not restart ours either.
+        """
+        name, _, arg = command.strip().partition(":")
+        if not arg.isdigit():
+            return
+        if name == "START_SERVICE":
+            if replay and int(arg) in self.active:
+                return
+            self.start(int(arg))
+        elif name == "STOP_SERVICE":
+            self.stop(int(arg))
+
+    def on_event(self, event: SerialEvent) -> None:
+        """Track an event received from the ESP8266"""
+        if event.service_id is None:
+            return
+        if event.kind == SERVICE_STARTED:
+            # Started from another serial port, or the reply to our own command
+            if event.service_id not in self.active:
+                self.start(event.service_id)
+        elif event.kind in (SERVICE_STOPPED, SERVICE_COMPLETED):
+            self.stop(event.service_id)
+        elif event.kind == SERVICE_STATUS:
+            # "ACTIVE:<seconds left>", or a bare "ACTIVE" from older firmware
+            state, _, remaining = (event.value or "").partition(":")
+            if state == "INACTIVE":
+                self.stop(event.service_id)
+            elif state == "ACTIVE" and remaining.isdigit():
+                entry = self.active.get(event.service_id)
+                # Whole seconds from the firmware; leave small differences alone
+                if entry is None or entry.estimated or \
+                        abs(entry.deadline - time.monotonic() - int(remaining)) > DRIFT_TOLERANCE:
+                    self.start(event.service_id, remaining=float(remaining))
+            elif state == "ACTIVE" and event.service_id not in self.active:
+                self.start(event.service_id, estimated=True)
+
+    def _expire(self, now: float) -> None:
+        """Drop services whose deadline has passed (lock held)"""
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, service_id, generation = heapq.heappop(self._deadlines)
+            entry = self.active.get(service_id)
+            if entry is not None and entry.generation == generation:
+                del self.active[service_id]
+                self.version += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Remaining time for every known bay"""
+        now = time.monotonic()
+        wall = time.time()
+        with self._lock:
+            self._expire(now)
+            bays = []
+            for service_id in sorted(set(self.durations) | set(self.active)):
+                entry = self.active.get(service_id)
+                if entry is None:
+                    bays.append({"service_id": service_id, "active": False, "remaining": 0})
+                    continue
+                remaining = max(0.0, entry.deadline - now)
+                bays.append({
+                    "service_id": service_id,
+                    "active": True,
+                    "remaining": round(remaining, 1),
+                    "duration": entry.duration,
+                    "ends_at": round(wall + remaining, 3),
+                    "estimated": entry.estimated,
+                })
+            return {"version": self.version, "server_time": round(wall, 3), "bays": bays}
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Records how long each startup phase takes, relative to process start"""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.phases: List[Dict[str, Any]] = []
+        self.completed: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        begin = time.monotonic()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            end = time.monotonic()
+            entry = {
+                "phase": name,
+                "start": round(begin - self.started, 4),
+                "duration": round(end - begin, 4),
+            }
+            if error:
+                entry["error"] = error
+            with self._lock:
+                self.phases.append(entry)
+                self.completed[name] = error is None
+            logger.info(f"Startup phase '{name}' took {entry['duration'] * 1000:.1f} ms"
+                        + (f" (failed: {error})" if error else ""))
+
+    def done(self, name: str) -> bool:
+        with self._lock:
+            return self.completed.get(name, False)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "uptime": round(time.monotonic() - self.started, 3),
+                "phases": list(self.phases),
+            }
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import os
+import time
+import struct
+import logging
+import threading
+from array import array
+from typing import Optional, Dict, Any, List, Iterator
+
+from config import TELEMETRY_SETTINGS
+
+logger = logging.getLogger("telemetry")
+
+# Tier name -> bucket width in seconds (0 keeps every sample) and capacity setting
+TIERS = {
+    "raw": (0, "raw_capacity"),
+    "minute": (60, "minute_capacity"),
+    "hour": (3600, "hour_capacity"),
+}
+
+# Snapshot: MAGIC, then per ring a header, the series name and the raw array bytes
+MAGIC = b"ESQTEL1\n"
+RING_HEADER = struct.Struct("!H6sIII")  # name length, tier, capacity, head, size
+
+
+class _Ring:
+    """Fixed-capacity ring of time buckets held in preallocated typed arrays.
+
+    Each slot is 24 bytes: bucket start (uint32 epoch seconds), sample count,
+    sum (double) and min/max (float32).
+    """
+
+    FIELDS = ("start", "count", "total", "low", "high")
+
+    def __init__(self, capacity: int, width: int) -> None:
+        self.capacity = capacity
+        self.width = width
+        self.start = array("I", [0]) * capacity
+        self.count = array("I", [0]) * capacity
+        self.total = array("d", [0.0]) * capacity
+        self.low = array("f", [0.0]) * capacity
+        self.high = array("f", [0.0]) * capacity
+        self.head = 0  # slot of the newest bucket
+        self.size = 0
+
+    def add(self, timestamp: int, value: float) -> None:
+        bucket = timestamp - timestamp % self.width if self.width else timestamp
+        i = self.head
+        if self.width and self.size and self.start[i] == bucket:
+            self.count[i] += 1
+            self.total[i] += value
+            if value < self.low[i]:
+                self.low[i] = value
+            if value > self.high[i]:
+                self.high[i] = value
+            return
+        if self.size:
+            i = self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.start[i] = bucket
+        self.count[i] = 1
+        self.total[i] = value
+        self.low[i] = value
+        self.high[i] = value
+
+    def slots(self) -> Iterator[int]:
+        """Slot indexes, oldest first"""
+        first = (self.head - self.size + 1) % self.capacity
+        for n in range(self.size):
+            yield (first + n) % self.capacity
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).itemsize * self.capacity for name in self.FIELDS)
+
+
+class TelemetryStore:
+    """Compact history of numeric series (heartbeats, bay usage, latency).
+
+    Every sample lands in the raw tier and is folded into its 1-minute and
+    1-hour buckets, so inserts are O(1) and memory is fixed once a series
+    exists.
+    """
+
+    def __init__(self) -> None:
+        self.series: Dict[str, Dict[str, _Ring]] = {}
+        self._lock = threading.Lock()
+
+    def _rings(self, name: str) -> Dict[str, _Ring]:
+        rings = self.series.get(name)
+        if rings is None:
+            rings = self.series[name] = {
+                tier: _Ring(TELEMETRY_SETTINGS[capacity], width)
+                for tier, (width, capacity) in TIERS.items()
+            }
+        return rings
+
+    def record(self, name: str, value: float = 1.0, timestamp: Optional[float] = None) -> None:
+        ts = int(timestamp if timestamp is not None else time.time())
+        with self._lock:
+            for ring in self._rings(name).values():
+                ring.add(ts, value)
+
+    def query(self, name: str, tier: str = "minute", since: Optional[float] = None,
+              until: Optional[float] = None) -> List[Dict[str, Any]]:
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier: {tier}")
+        with self._lock:
+            rings = self.series.get(name)
+            if rings is None:
+                raise KeyError(name)
+            ring = rings[tier]
+            rows = []
+            for i in ring.slots():
+                start = ring.start[i]
+                if (since is not None and start < since) or (until is not None and start >= until):
+                    continue
+                if tier == "raw":
+                    rows.append({"t": start, "value": round(ring.total[i], 3)})
+                else:
+                    rows.append({
+                        "t": start,
+                        "count": ring.count[i],
+                        "avg": round(ring.total[i] / ring.count[i], 3),
+                        "min": round(ring.low[i], 3),
+                        "max": round(ring.high[i], 3),
+                    })
+            return rows
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "bytes": sum(ring.nbytes() for rings in self.series.values()
+                             for ring in rings.values()),
+                "series": {name: {tier: ring.size for tier, ring in rings.items()}
+                           for name, rings in self.series.items()},
+            }
+
+    def save(self, path: str = TELEMETRY_SETTINGS["snapshot_file"]) -> None:
+        """Write all rings to disk (native byte order, for this machine's next start)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.partial"
+        with self._lock, open(partial, "wb") as f:
+            f.write(MAGIC)
+            for name, rings in self.series.items():
+                encoded = name.encode()
+                for tier, ring in rings.items():
+                    f.write(RING_HEADER.pack(len(encoded), tier.encode(), ring.capacity,
+                                             ring.head, ring.size) + encoded)
+                    for field in _Ring.FIELDS:
+                        getattr(ring, field).tofile(f)
+        os.replace(partial, path)
+
+    def load(self, path: str = TELEMETRY_SETTINGS["snapshot_file"]) -> None:
+        """Restore rings saved by save(); rings whose capacity changed start empty"""
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f, self._lock:
+            if f.read(len(MAGIC)) != MAGIC:
+                logger.warning(f"Ignoring unrecognised telemetry snapshot {path}")
+                return
+            while True:
+                header = f.read(RING_HEADER.size)
+                if len(header) < RING_HEADER.size:
+                    break
+                name_length, tier, capacity, head, size = RING_HEADER.unpack(header)
+                name = f.read(name_length).decode(errors="replace")
+                tier = tier.rstrip(b"\0").decode(errors="replace")
+                loaded = _Ring(capacity, TIERS.get(tier, (0, ""))[0])
+                try:
+                    for field in _Ring.FIELDS:
+                        values = array(getattr(loaded, field).typecode)
+                        values.fromfile(f, capacity)
+                        setattr(loaded, field, values)
+                except EOFError:
+                    logger.warning(f"Telemetry snapshot {path} is truncated")
+                    break
+                loaded.head, loaded.size = head, size
+                current = self._rings(name).get(tier)
+                if current is not None and current.capacity == capacity:
+                    self.series[name][tier] = loaded
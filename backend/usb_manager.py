@@ -122,6 +122,17 @@ class USBManager:
         self.running = False
         logger.info("USB Manager stopped")
 
+def find_serial_devices() -> List[str]:
+    """Enumerate already-attached serial ports that match a supported board"""
+    supported = set(USB_SETTINGS["vendor_ids"].values())
+    devices = []
+    for port in serial.tools.list_ports.comports():
+        if port.vid is None or port.pid is None:
+            continue
+        if f"{port.vid:04x}:{port.pid:04x}" in supported:
+            devices.append(port.device)
+    return devices
+
 def monitor_usb_devices(callback: Callable[[str, str], None]) -> None:
     """Wrapper function to maintain backward compatibility"""
     manager = USBManager()
@@ -5,7 +5,11 @@ import subprocess
 from datetime import datetime
 from pathlib import Path
 import logging
+
+# The backup engine and logging config live in the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
 from logging_config import get_logger
+from backup_manager import BackupManager
 
 logger = get_logger('backup')
 
@@ -23,33 +27,34 @@ def get_backup_filename():
 def backup_database():
     """Create a backup of the database."""
     try:
-        backup_dir = create_backup_dir()
-        backup_file = backup_dir / get_backup_filename()
-        
         # Get database URL from environment
-        db_url = os.getenv("DATABASE_URL", "sqlite:///app.db")
-        
-        if db_url.startswith("sqlite"):
-            # SQLite backup
-            db_path = db_url.replace("sqlite:///", "")
-            subprocess.run(["sqlite3", db_path, f".backup '{backup_file}'"], check=True)
+        db_url = os.getenv("DATABASE_URL")
+
+        if not db_url or db_url.startswith("sqlite"):
+            # SQLite online backup, compressed, verified and rotated by the backend engine
+            if db_url:
+                manager = BackupManager(db_path=db_url.replace("sqlite:///", ""))
+            else:
+                manager = BackupManager()
+            manager.create_backup()
         elif db_url.startswith("postgresql"):
             # PostgreSQL backup
+            backup_dir = create_backup_dir()
+            backup_file = backup_dir / get_backup_filename()
             subprocess.run([
                 "pg_dump",
                 "-F", "c",  # Custom format
                 "-f", str(backup_file),
                 db_url
             ], check=True)
+            logger.info(f"Backup created successfully: {backup_file}")
+
+            # Clean up old backups (keep last 7 days)
+            cleanup_old_backups(backup_dir)
         else:
             logger.error(f"Unsupported database type: {db_url}")
             sys.exit(1)
-            
-        logger.info(f"Backup created successfully: {backup_file}")
-        
-        # Clean up old backups (keep last 7 days)
-        cleanup_old_backups(backup_dir)
-        
+
     except subprocess.CalledProcessError as e:
         logger.error(f"Backup failed: {e}")
         sys.exit(1)
@@ -64,7 +69,7 @@ def cleanup_old_backups(backup_dir, days_to_keep=7):
         for backup_file in backup_dir.glob("backup_*.sql"):
             file_time = datetime.fromtimestamp(backup_file.stat().st_mtime)
             age_days = (current_time - file_time).days
-            
+
             if age_days > days_to_keep:
                 backup_file.unlink()
                 logger.info(f"Removed old backup: {backup_file}")
@@ -72,4 +77,4 @@ def cleanup_old_backups(backup_dir, days_to_keep=7):
         logger.error(f"Error cleaning up old backups: {e}")
 
 if __name__ == "__main__":
-    backup_database() 
\ No newline at end of file
+    backup_database()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from pathlib import Path
+
+# The capture format and serial stack live in the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from serial_capture import CaptureReader, REPLAY_PREFIX, RX
+from serial_events import parse_message
+from serial_manager import SerialManager
+
+def dump(path):
+    """Print every record with its offset and direction."""
+    reader = CaptureReader(path)
+    print(f"# {reader.port} at {reader.baudrate} baud, started {time.ctime(reader.started)}")
+    for record in reader:
+        direction = "RX" if record.direction == RX else "TX"
+        print(f"{record.offset:12.6f} {direction} {record.data!r}")
+
+def replay(path, speed):
+    """Feed a capture through SerialManager and the event parser, return a summary."""
+    kinds = Counter()
+    manager = SerialManager(port=f"{REPLAY_PREFIX}{path}?speed={speed}")
+    manager.set_callback(lambda line: kinds.update([parse_message(line).kind]))
+
+    recorded = max((record.offset for record in CaptureReader(path)), default=0.0)
+    started = time.monotonic()
+    if not manager.connect():
+        raise SystemExit(f"Could not replay {path}")
+    port = manager.serial
+    while not port.finished:
+        time.sleep(0.05)
+    elapsed = time.monotonic() - started
+    manager.stop()
+
+    return {
+        "capture": str(path),
+        "speed": speed,
+        "lines": port.lines_read,
+        "events": dict(sorted(kinds.items())),
+        "recorded_seconds": round(recorded, 3),
+        "replay_seconds": round(elapsed, 3),
+        "lines_per_second": round(port.lines_read / elapsed, 1) if elapsed > 0 else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded serial session")
+    parser.add_argument("capture", help="capture file written by SerialManager.start_capture()")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback speed multiplier, 0 for as fast as possible")
+    parser.add_argument("--dump", action="store_true", help="print the records instead")
+    args = parser.parse_args()
+
+    if args.dump:
+        dump(args.capture)
+    else:
+        print(json.dumps(replay(args.capture, args.speed), indent=2))
+
+if __name__ == "__main__":
+    main()
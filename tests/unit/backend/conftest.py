@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The backend modules import each other by their plain names
+BACKEND_DIR = Path(__file__).resolve().parents[3] / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Keep default paths in config.py away from a real kiosk's data directory
+os.environ.setdefault("ESQUIMA_DATA_DIR", tempfile.mkdtemp(prefix="esquima-tests-"))
@@ -0,0 +1,165 @@
+import sqlite3
+
+import pytest
+
+import change_feed
+
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+    CREATE TABLE services (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT,
+        price REAL NOT NULL,
+        duration INTEGER NOT NULL,
+        type TEXT NOT NULL
+    );
+    CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    INSERT INTO services VALUES (1, 'CARWASH 1', 'Premium Wash', 150.0, 180, 'carwash');
+    INSERT INTO settings VALUES ('maintenance_mode', 'false');
+    ''')
+    conn.commit()
+    conn.close()
+    change_feed.ensure_change_log(path)
+    return path
+
+
+@pytest.fixture
+def kiosk_a(tmp_path):
+    return make_db(str(tmp_path / "a.db"))
+
+
+@pytest.fixture
+def kiosk_b(tmp_path):
+    return make_db(str(tmp_path / "b.db"))
+
+
+def execute(db, sql, params=()):
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute(sql, params)
+    conn.close()
+
+
+def price(db, service_id=1):
+    conn = sqlite3.connect(db)
+    row = conn.execute("SELECT price FROM services WHERE id = ?", (service_id,)).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+def pull(source, target, since=0):
+    page = change_feed.changes_since(since, db_path=source)
+    return change_feed.apply_changes(page["changes"], target), page
+
+
+def log_size(db):
+    return len(change_feed.changes_since(0, limit=10000, db_path=db)["changes"])
+
+
+def test_local_changes_are_logged_with_a_stamp(kiosk_a):
+    execute(kiosk_a, "UPDATE services SET price = 175 WHERE id = 1")
+
+    change = change_feed.changes_since(0, db_path=kiosk_a)["changes"][-1]
+
+    assert change["op"] == change_feed.UPSERT
+    assert change["data"]["price"] == 175
+    assert change["changed_at"] > 0
+    assert change["origin"] == change_feed.ensure_change_log(kiosk_a)
+
+
+def test_peer_change_is_applied_but_not_logged_again(kiosk_a, kiosk_b):
+    execute(kiosk_a, "UPDATE services SET price = 175 WHERE id = 1")
+    before = log_size(kiosk_b)
+
+    written, _ = pull(kiosk_a, kiosk_b)
+
+    assert written["services"] == 1
+    assert price(kiosk_b) == 175
+    assert log_size(kiosk_b) == before
+
+
+def test_conflicting_edits_converge_on_the_last_writer(kiosk_a, kiosk_b):
+    execute(kiosk_a, "UPDATE services SET price = 160 WHERE id = 1")
+    execute(kiosk_b, "UPDATE services SET price = 170 WHERE id = 1")  # later
+
+    # Several rounds in both directions must not swap the values back and forth
+    for _ in range(3):
+        pull(kiosk_a, kiosk_b)
+        pull(kiosk_b, kiosk_a)
+
+    assert price(kiosk_a) == price(kiosk_b) == 170
+
+
+def test_equal_timestamps_are_broken_by_origin(kiosk_a, kiosk_b):
+    change = {"table": "settings", "key": "maintenance_mode", "op": change_feed.UPSERT,
+              "changed_at": 1000.0}
+    first = dict(change, origin="aaaa", data={"value": "from aaaa"})
+    second = dict(change, origin="bbbb", data={"value": "from bbbb"})
+
+    # The two kiosks see the same pair of changes in opposite orders
+    for change_set in ([first], [second]):
+        change_feed.apply_changes(change_set, kiosk_a)
+    for change_set in ([second], [first]):
+        change_feed.apply_changes(change_set, kiosk_b)
+
+    query = "SELECT value FROM settings WHERE key = 'maintenance_mode'"
+    for db in (kiosk_a, kiosk_b):
+        conn = sqlite3.connect(db)
+        assert conn.execute(query).fetchone() == ("from bbbb",)
+        conn.close()
+
+
+def test_older_peer_change_does_not_overwrite_a_newer_local_one(kiosk_a, kiosk_b):
+    stale = {"table": "services", "key": 1, "op": change_feed.UPSERT, "changed_at": 1.0,
+             "origin": "elsewhere", "data": {"name": "OLD", "description": None, "price": 1.0,
+                                             "duration": 1, "type": "carwash"}}
+    execute(kiosk_a, "UPDATE services SET price = 175 WHERE id = 1")
+
+    written = change_feed.apply_changes([stale], kiosk_a)
+
+    assert written["services"] == 0
+    assert price(kiosk_a) == 175
+
+
+def test_delete_wins_over_an_older_update(kiosk_a, kiosk_b):
+    execute(kiosk_a, "UPDATE services SET price = 175 WHERE id = 1")
+    execute(kiosk_b, "DELETE FROM services WHERE id = 1")  # later
+
+    pull(kiosk_b, kiosk_a)
+    pull(kiosk_a, kiosk_b)
+
+    assert price(kiosk_a) is None
+    assert price(kiosk_b) is None
+
+
+def test_local_edit_after_a_peer_change_with_a_fast_clock_still_wins(kiosk_a, kiosk_b):
+    future = {"table": "services", "key": 1, "op": change_feed.UPSERT,
+              "changed_at": 4102444800.0, "origin": "fast-clock",
+              "data": {"name": "CARWASH 1", "description": "Premium Wash", "price": 200.0,
+                       "duration": 180, "type": "carwash"}}
+    change_feed.apply_changes([future], kiosk_a)
+    execute(kiosk_a, "UPDATE services SET price = 210 WHERE id = 1")
+
+    pull(kiosk_a, kiosk_b)
+    change_feed.apply_changes([future], kiosk_b)
+
+    assert price(kiosk_a) == price(kiosk_b) == 210
+
+
+def test_pruned_log_falls_back_to_a_full_copy_with_deletes(kiosk_a, kiosk_b):
+    execute(kiosk_a, "INSERT INTO services VALUES (2, 'SHAMPOO', NULL, 50, 120, 'shampoo')")
+    pull(kiosk_a, kiosk_b)
+    assert price(kiosk_b, 2) == 50
+    execute(kiosk_a, "DELETE FROM services WHERE id = 2")
+    for n in range(5):
+        execute(kiosk_a, "UPDATE settings SET value = ? WHERE key = 'maintenance_mode'", (str(n),))
+    change_feed.prune(keep=1, db_path=kiosk_a)
+
+    written, page = pull(kiosk_a, kiosk_b, since=1)
+
+    assert page["reset"]
+    assert price(kiosk_b, 2) is None
+    assert written["services"] == 1
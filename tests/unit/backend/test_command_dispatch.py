@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+
+import command_dispatch
+from command_dispatch import CommandDispatcher
+from command_journal import CommandJournal
+
+
+class FakeManager:
+    port = "/dev/ttyUSB0"
+    baudrate = 115200
+    connected = True
+
+    def __init__(self):
+        self.sent = []
+
+    def pending_writes(self):
+        return 0
+
+    def send_command(self, command):
+        self.sent.append(command)
+        return True
+
+
+@pytest.fixture
+def dispatcher(tmp_path, monkeypatch):
+    monkeypatch.setitem(command_dispatch.ADMISSION_SETTINGS, "max_queue_depth", 100)
+    dispatcher = CommandDispatcher(CommandJournal(str(tmp_path / "journal.log")))
+    dispatcher.set_services([{"id": 1}, {"id": 2}])
+    return dispatcher
+
+
+def test_unknown_bay_is_refused_before_journaling(dispatcher):
+    manager = FakeManager()
+
+    results = dispatcher.submit(manager, [{"op": "command", "command": "START_SERVICE:99"},
+                                          {"op": "command", "command": "START_SERVICE:2"}])
+
+    assert results[0]["invalid"] and results[0]["error"] == "Unknown service: 99"
+    assert results[1]["success"]
+    assert manager.sent == ["START_SERVICE:2"]
+    assert [entry["command"] for entry in dispatcher.journal.status()["pending"]] == ["START_SERVICE:2"]
+
+
+def test_other_commands_are_not_checked_against_the_catalog(dispatcher):
+    manager = FakeManager()
+
+    results = dispatcher.submit(manager, [{"op": "command", "command": "GET_STATUS"}])
+
+    assert results[0]["success"]
+
+
+def test_unknown_catalog_lets_commands_through(tmp_path):
+    dispatcher = CommandDispatcher(CommandJournal(str(tmp_path / "journal.log")))
+
+    results = dispatcher.submit(FakeManager(), [{"op": "command", "command": "START_SERVICE:99"}])
+
+    assert results[0]["success"]
+
+
+def test_service_ids_are_read_from_the_database(tmp_path):
+    db = str(tmp_path / "esquima.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE services (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO services (id, name) VALUES (?, ?)", [(1, "Wash"), (3, "Vacuum")])
+    conn.commit()
+    conn.close()
+    dispatcher = CommandDispatcher()
+
+    dispatcher.load_services(db)
+
+    assert dispatcher.service_ids == {1, 3}
@@ -0,0 +1,133 @@
+import json
+import threading
+
+import pytest
+
+import command_journal as journal_module
+from command_journal import CommandJournal
+from serial_events import SerialEvent, SERVICE_STARTED, parse_message
+
+
+@pytest.fixture(autouse=True)
+def fast_fsync(monkeypatch):
+    monkeypatch.setitem(journal_module.JOURNAL_SETTINGS, "fsync_interval", 0)
+    monkeypatch.setitem(journal_module.JOURNAL_SETTINGS, "compact_threshold", 0)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "command_journal.log")
+
+
+def read_records(path):
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_torn_tail_is_truncated_before_appending(path):
+    with open(path, "wb") as f:
+        f.write(b'{"op":"cmd","key":"k1","command":"START_SERVICE:1","ts":1}\n')
+        f.write(b'{"op":"cmd","key":"k2","comm')  # crash mid-write
+
+    journal = CommandJournal(path)
+    assert list(journal.pending) == ["k1"]
+    journal.append("START_SERVICE:2", "k3")
+
+    # Every line parses and the new record was not glued onto the torn one
+    assert [record["key"] for record in read_records(path)] == ["k1", "k3"]
+    assert list(CommandJournal(path).pending) == ["k1", "k3"]
+
+
+def test_complete_record_without_newline_counts_as_torn(path):
+    with open(path, "wb") as f:
+        f.write(b'{"op":"cmd","key":"k1","command":"START_SERVICE:1","ts":1}\n')
+        f.write(b'{"op":"ack","key":"k1"}')
+
+    journal = CommandJournal(path)
+    journal.append("STOP_SERVICE:1", "k2")
+
+    assert [record["key"] for record in read_records(path)] == ["k1", "k2"]
+
+
+def test_ack_clears_the_oldest_matching_command(path):
+    journal = CommandJournal(path)
+    journal.append("START_SERVICE:1", "a")
+    journal.append("START_SERVICE:1", "b")
+
+    journal.on_event(SerialEvent(SERVICE_STARTED, "SERVICE_STARTED:1", service_id=1))
+
+    assert list(journal.pending) == ["b"]
+    assert list(CommandJournal(path).pending) == ["b"]
+
+
+def test_refused_command_is_settled_and_not_replayed(path):
+    journal = CommandJournal(path)
+    journal.append("START_SERVICE:99", "bad")
+    journal.append("START_SERVICE:2", "good")
+
+    # The firmware echoes each command, then refuses the unknown bay
+    for line in ("START_SERVICE:99", "INVALID_COMMAND", "START_SERVICE:2", "SERVICE_STARTED:2"):
+        journal.on_event(parse_message(line))
+
+    assert list(journal.pending) == []
+    assert journal.completed == {"bad": "rejected", "good": "ack"}
+    assert list(CommandJournal(path).pending) == []
+    assert CommandJournal(path).completed["bad"] == "rejected"
+
+
+def test_error_without_an_echoed_command_settles_nothing(path):
+    journal = CommandJournal(path)
+    journal.append("START_SERVICE:1", "k1")
+
+    for line in ("START_SERVICE:1", "SERVICE_STARTED:1", "ERROR:2"):
+        journal.on_event(parse_message(line))
+    journal.append("START_SERVICE:1", "k2")
+    journal.on_event(parse_message("ERROR:2"))
+
+    assert list(journal.pending) == ["k2"]
+
+
+def test_concurrent_replay_hands_out_each_command_once(path):
+    journal = CommandJournal(path)
+    for bay in range(1, 6):
+        journal.append(f"START_SERVICE:{bay}", f"k{bay}")
+
+    claimed = []
+    barrier = threading.Barrier(4)
+
+    def replay():
+        barrier.wait()
+        claimed.extend(entry.key for entry in journal.replayable())
+
+    threads = [threading.Thread(target=replay) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == ["k1", "k2", "k3", "k4", "k5"]
+    assert journal.replayable() == []
+
+
+def test_compaction_during_appends_keeps_every_record(path):
+    journal = CommandJournal(path)
+    errors = []
+
+    def append(worker):
+        try:
+            for n in range(50):
+                journal.append(f"START_SERVICE:{worker}", f"w{worker}-{n}")
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=append, args=(worker,)) for worker in range(1, 5)]
+    for thread in threads:
+        thread.start()
+    for _ in range(20):
+        journal.compact()
+    for thread in threads:
+        thread.join()
+    journal.compact()
+
+    assert errors == []
+    assert len(CommandJournal(path).pending) == 200
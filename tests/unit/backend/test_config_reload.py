@@ -0,0 +1,95 @@
+import json
+import logging
+
+import pytest
+
+import config
+from config_reload import ConfigWatcher
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    watcher = ConfigWatcher(str(tmp_path / "config.json"))
+    yield watcher
+    # Put the shared settings dicts and loggers back for the next test
+    watcher._apply(watcher.validate({}))
+
+
+def write(watcher, overrides):
+    with open(watcher.path, "w") as f:
+        json.dump(overrides, f)
+
+
+def test_valid_override_is_applied_and_reported(watcher):
+    changed = []
+    watcher.add_listener(changed.append)
+    write(watcher, {"SERIAL_SETTINGS": {"timeout": 2}, "log_levels": {"serial": "INFO"}})
+
+    assert watcher.check()
+    assert config.SERIAL_SETTINGS["timeout"] == 2
+    assert logging.getLogger("serial").level == logging.INFO
+    assert changed == [{"SERIAL_SETTINGS", "log_levels"}]
+
+
+def test_dropping_a_key_restores_the_default(watcher):
+    default = config.SERIAL_SETTINGS["timeout"]
+    write(watcher, {"SERIAL_SETTINGS": {"timeout": default + 3}})
+    watcher.check()
+    write(watcher, {"log_levels": {}})
+
+    watcher.check()
+
+    assert config.SERIAL_SETTINGS["timeout"] == default
+
+
+@pytest.mark.parametrize("overrides", [
+    {"ADMISSION_SETTINGS": {"service_share": 0}},
+    {"ADMISSION_SETTINGS": {"diagnostic_share": 0.0}},
+    {"ADMISSION_SETTINGS": {"service_share": 1.5}},
+    {"ADMISSION_SETTINGS": {"service_share": 0.8}},  # with the default 0.3 diagnostic share
+    {"ADMISSION_SETTINGS": {"service_share": 1, "diagnostic_share": 0.05}},
+    {"ADMISSION_SETTINGS": {"burst_seconds": 0}},
+    {"PROBE_SETTINGS": {"window": 0}},
+    {"PROBE_SETTINGS": {"unhealthy_after": 0}},
+    {"SERIAL_SETTINGS": {"baudrate": 0}},
+    {"SERIAL_SETTINGS": {"timeout": 0}},
+    {"SERIAL_SETTINGS": {"timeout": "2"}},
+    {"PROBE_SETTINGS": {"window": 10.5}},
+    {"USB_SETTINGS": {"subsystem": "usb"}},
+    {"USB_SETTINGS": {"vendor_ids": {"CH340": "not-an-id"}}},
+    {"SERIAL_SETTINGS": {"parity": "N"}},
+    {"BACKUP_SETTINGS": {"interval": 60}},
+    {"log_levels": {"serial": "LOUD"}},
+])
+def test_invalid_file_is_rejected_as_a_whole(watcher, overrides):
+    before = {name: dict(getattr(config, name)) for name in ("SERIAL_SETTINGS", "ADMISSION_SETTINGS",
+                                                              "PROBE_SETTINGS", "USB_SETTINGS")}
+    write(watcher, dict(overrides, APP_SETTINGS={"reconnect_delay": 9}))
+
+    assert not watcher.check()
+    assert watcher.error
+    assert config.APP_SETTINGS["reconnect_delay"] != 9
+    for name, values in before.items():
+        assert getattr(config, name) == values
+
+
+@pytest.mark.parametrize("overrides", [
+    {"ADMISSION_SETTINGS": {"service_share": 0.9, "diagnostic_share": 0.1}},
+    {"ADMISSION_SETTINGS": {"service_share": 1, "diagnostic_share": 1e-12}},
+    {"ADMISSION_SETTINGS": {"burst_seconds": 0.5}},
+    {"PROBE_SETTINGS": {"window": 1, "unhealthy_after": 1}},
+])
+def test_values_at_the_edge_of_their_range_are_accepted(watcher, overrides):
+    write(watcher, overrides)
+
+    assert watcher.check()
+    assert watcher.error is None
+
+
+def test_unchanged_invalid_file_is_not_reread(watcher, caplog):
+    write(watcher, {"ADMISSION_SETTINGS": {"service_share": 0}})
+    watcher.check()
+    caplog.clear()
+
+    assert not watcher.check()
+    assert not caplog.records
@@ -0,0 +1,82 @@
+import pytest
+
+import latency_probe as probe_module
+from latency_probe import LatencyProbe
+from serial_events import parse_message
+
+
+class FakeManager:
+    port = "/dev/ttyUSB0"
+    connected = True
+
+    def __init__(self):
+        self.sent = []
+
+    def send_command(self, command):
+        self.sent.append(command)
+        return True
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setitem(probe_module.PROBE_SETTINGS, "timeout", 0)
+    monkeypatch.setitem(probe_module.PROBE_SETTINGS, "unhealthy_after", 3)
+
+
+def lose(probe, manager, count):
+    for _ in range(count):
+        probe.probe(manager)
+    probe.stats()  # expires the unanswered probes
+
+
+def answer_last(probe, manager):
+    probe.on_event(parse_message("PONG:" + manager.sent[-1].partition(":")[2]))
+
+
+def test_firmware_that_never_answers_is_not_unhealthy():
+    probe, manager = LatencyProbe(), FakeManager()
+
+    lose(probe, manager, 10)
+
+    assert probe.stats(manager.port)["consecutive_losses"] == 10
+    assert not probe.is_unhealthy(manager.port)
+
+
+def test_firmware_that_stops_answering_is_unhealthy():
+    probe, manager = LatencyProbe(), FakeManager()
+    probe.probe(manager)
+    answer_last(probe, manager)
+
+    lose(probe, manager, 3)
+
+    assert probe.is_unhealthy(manager.port)
+
+
+def test_reset_waits_for_a_reply_on_the_new_connection():
+    probe, manager = LatencyProbe(), FakeManager()
+    probe.probe(manager)
+    answer_last(probe, manager)
+    lose(probe, manager, 3)
+
+    probe.reset(manager.port)
+    lose(probe, manager, 5)
+
+    assert not probe.is_unhealthy(manager.port)
+
+
+def test_reloaded_window_resizes_existing_devices(monkeypatch):
+    probe, manager = LatencyProbe(), FakeManager()
+    for _ in range(5):
+        probe.probe(manager)
+        answer_last(probe, manager)
+
+    monkeypatch.setitem(probe_module.PROBE_SETTINGS, "window", 3)
+    probe.apply_settings()
+    assert probe.stats(manager.port)["probes"] == 3
+
+    monkeypatch.setitem(probe_module.PROBE_SETTINGS, "window", 10)
+    probe.apply_settings()
+    for _ in range(5):
+        probe.probe(manager)
+        answer_last(probe, manager)
+    assert probe.stats(manager.port)["probes"] == 8
@@ -0,0 +1,54 @@
+import pytest
+
+from log_query import LogQueryService
+
+
+@pytest.fixture
+def service(tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text(
+        "2024-01-30 23:59:59,999 [INFO] app: before\n"
+        "2024-01-31 00:00:00,000 [INFO] app: midnight\n"
+        "2024-01-31 12:00:00,500 [WARNING] serial: noon\n"
+        "2024-01-31 23:59:59,999 [INFO] app: last\n"
+        "2024-02-01 00:00:00,000 [INFO] app: next day\n"
+    )
+    return LogQueryService(log_path=str(log), backup_count=0, index_stride=16)
+
+
+def messages(result):
+    return [record["message"] for record in result["records"]]
+
+
+def test_date_only_until_covers_the_whole_day(service):
+    result = service.query(since="2024-01-31", until="2024-01-31")
+
+    assert messages(result) == ["last", "noon", "midnight"]
+
+
+def test_iso_timestamps_with_t_fraction_and_z(service, monkeypatch):
+    monkeypatch.setenv("TZ", "UTC")
+    import time
+    time.tzset()
+    try:
+        result = service.query(since="2024-01-31T12:00:00.500Z", until="2024-01-31T12:00:00Z")
+        assert messages(result) == []
+        result = service.query(since="2024-01-31T12:00:00.500Z", until="2024-01-31T12:00:01Z")
+        assert messages(result) == ["noon"]
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_log_style_timestamps_are_accepted(service):
+    result = service.query(since="2024-01-31 12:00:00,500", until="2024-01-31 12:00:00,500")
+
+    assert messages(result) == ["noon"]
+
+
+@pytest.mark.parametrize("value", ["yesterday", "2024-13-01", "12:00"])
+def test_unparseable_bounds_are_rejected(service, value):
+    with pytest.raises(ValueError):
+        service.query(since=value)
+    with pytest.raises(ValueError):
+        service.query(until=value)
@@ -0,0 +1,133 @@
+import gzip
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import log_retention
+from log_retention import LogRetentionManager
+
+
+@pytest.fixture(autouse=True)
+def no_pause(monkeypatch):
+    monkeypatch.setitem(log_retention.RETENTION_SETTINGS, "batch_pause", 0)
+    monkeypatch.setitem(log_retention.RETENTION_SETTINGS, "batch_size", 2)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "esquima.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        service_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        status TEXT NOT NULL,
+        amount REAL
+    )
+    ''')
+    conn.commit()
+    conn.close()
+    return path
+
+
+def add_rows(db_path, *ages_days):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for age in ages_days:
+            timestamp = (datetime.now() - timedelta(days=age)).isoformat()
+            conn.execute(
+                "INSERT INTO logs (timestamp, service_id, action, status) VALUES (?, 1, 'START', 'OK')",
+                (timestamp,)
+            )
+    conn.close()
+
+
+def remaining_ids(db_path):
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute("SELECT id FROM logs ORDER BY id")]
+    conn.close()
+    return ids
+
+
+def archived_ids(manager):
+    ids = []
+    for path in sorted(manager.archive_dir.glob("logs_*.jsonl.gz")):
+        with gzip.open(path, "rt") as f:
+            ids.extend(json.loads(line)["id"] for line in f)
+    return sorted(ids)
+
+
+def test_archives_and_deletes_old_rows(db_path, tmp_path):
+    add_rows(db_path, 100, 100, 100, 1)
+    manager = LogRetentionManager(db_path, str(tmp_path / "archive"))
+
+    result = manager.run(max_age_days=90)
+
+    assert result["archived"] == 3
+    assert archived_ids(manager) == [1, 2, 3]
+    assert remaining_ids(db_path) == [4]
+    assert "pending" not in manager.load_manifest()
+
+
+def test_crash_after_append_is_truncated_on_resume(db_path, tmp_path, monkeypatch):
+    add_rows(db_path, 100, 100, 100)
+    manager = LogRetentionManager(db_path, str(tmp_path / "archive"))
+    real_save = manager._save_manifest
+    saves = []
+
+    def crash_after_append(manifest):
+        # First save records the offsets, the second would mark the batch archived
+        saves.append(manifest.get("pending"))
+        if len(saves) == 2:
+            raise OSError("power lost")
+        real_save(manifest)
+
+    monkeypatch.setattr(manager, "_save_manifest", crash_after_append)
+    with pytest.raises(OSError):
+        manager.run(max_age_days=90)
+    assert archived_ids(manager) == [1, 2]  # written to the archive, not yet recorded
+    assert remaining_ids(db_path) == [1, 2, 3]
+
+    monkeypatch.setattr(manager, "_save_manifest", real_save)
+    manager.run(max_age_days=90)
+
+    assert archived_ids(manager) == [1, 2, 3]
+    assert remaining_ids(db_path) == []
+    months = manager.load_manifest()["months"]
+    assert sum(entry["rows"] for entry in months.values()) == 3
+
+
+def test_crash_before_delete_is_finished_on_resume(db_path, tmp_path, monkeypatch):
+    add_rows(db_path, 100, 100, 100)
+    manager = LogRetentionManager(db_path, str(tmp_path / "archive"))
+
+    def crash(conn, ids):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(manager, "_delete", crash)
+    with pytest.raises(sqlite3.OperationalError):
+        manager.run(max_age_days=90)
+    assert manager.load_manifest()["pending"] == {"delete": [1, 2]}
+
+    monkeypatch.delattr(manager, "_delete")
+    manager.run(max_age_days=90)
+
+    assert archived_ids(manager) == [1, 2, 3]
+    assert remaining_ids(db_path) == []
+
+
+def test_older_id_crossing_the_cutoff_later_is_archived(db_path, tmp_path):
+    add_rows(db_path, 10, 100)  # id 1 is newer than id 2
+    manager = LogRetentionManager(db_path, str(tmp_path / "archive"))
+
+    manager.run(max_age_days=90)
+    assert archived_ids(manager) == [2]
+
+    manager.run(max_age_days=5)
+
+    assert archived_ids(manager) == [1, 2]
+    assert remaining_ids(db_path) == []
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import scheduler as scheduler_module
+from scheduler import PeriodicScheduler
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    monkeypatch.setitem(scheduler_module.SCHEDULER_SETTINGS, "startup_delay", 0.05)
+    sched = PeriodicScheduler(state_file=str(tmp_path / "scheduler_state.json"))
+    yield sched
+    sched.stop()
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_plain_job_waits_one_interval(scheduler):
+    job = scheduler.add_job("poll", lambda: None, 3600, jitter=0)
+    assert job.next_run - time.monotonic() == pytest.approx(3600, abs=1)
+
+
+def test_persistent_job_that_never_ran_runs_soon_after_startup(scheduler):
+    ran = threading.Event()
+    scheduler.add_job("backup", ran.set, 86400, jitter=0, threaded=True, persistent=True)
+    scheduler.start()
+
+    assert ran.wait(2)
+    state_file = Path(scheduler.state_file)
+    assert wait_for(state_file.exists)
+    assert "backup" in json.loads(state_file.read_text())
+
+
+def test_persistent_job_resumes_from_its_last_run(tmp_path, monkeypatch):
+    monkeypatch.setitem(scheduler_module.SCHEDULER_SETTINGS, "startup_delay", 0.05)
+    state_file = tmp_path / "scheduler_state.json"
+    state_file.write_text(json.dumps({"recent": time.time() - 600, "overdue": time.time() - 90000}))
+    sched = PeriodicScheduler(state_file=str(state_file))
+
+    recent = sched.add_job("recent", lambda: None, 3600, jitter=0, persistent=True)
+    overdue = sched.add_job("overdue", lambda: None, 86400, jitter=0, persistent=True)
+
+    now = time.monotonic()
+    assert recent.next_run - now == pytest.approx(3000, abs=5)
+    assert overdue.next_run - now == pytest.approx(0.05, abs=0.5)
+
+
+def test_clock_going_backwards_waits_at_most_one_interval(tmp_path):
+    state_file = tmp_path / "scheduler_state.json"
+    state_file.write_text(json.dumps({"backup": time.time() + 10 * 86400}))
+    sched = PeriodicScheduler(state_file=str(state_file))
+
+    job = sched.add_job("backup", lambda: None, 86400, jitter=0, persistent=True)
+
+    assert job.next_run - time.monotonic() <= 86400 + 1
+
+
+def test_threaded_job_never_overlaps_itself(scheduler):
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow():
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.25)
+        with lock:
+            active.pop()
+
+    job = scheduler.add_job("slow", slow, 0.05, initial_delay=0, jitter=0, threaded=True)
+    scheduler.start()
+
+    assert wait_for(lambda: job.runs >= 2)
+    assert max(peak) == 1
+    assert job.skipped > 0
+
+
+def test_inline_overrun_is_rescheduled_from_its_finish(scheduler):
+    finished = []
+
+    def slow():
+        time.sleep(0.2)
+        finished.append(time.monotonic())
+
+    job = scheduler.add_job("slow", slow, 0.05, initial_delay=0, jitter=0)
+    scheduler.start()
+
+    assert wait_for(lambda: len(finished) >= 3)
+    # No catch-up burst: runs are spaced by at least the job's own duration
+    gaps = [b - a for a, b in zip(finished, finished[1:])]
+    assert min(gaps) >= 0.2
+    assert job.overruns >= 2
@@ -0,0 +1,56 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import serial_broker
+from serial_broker import SerialBroker, _BrokerConnection, HEADER, REQUEST, RESPONSE, recv_frame
+
+
+@pytest.fixture
+def connection(tmp_path, monkeypatch):
+    monkeypatch.setitem(serial_broker.BROKER_SETTINGS, "send_timeout", 0.1)
+    broker = SerialBroker(socket_path=str(tmp_path / "broker.sock"))
+    server_side, client_side = socket.socketpair()
+    server_side.settimeout(0.1)
+    client_side.settimeout(2)
+    connection = _BrokerConnection(broker, server_side, 1)
+    thread = threading.Thread(target=connection.serve, daemon=True)
+    thread.start()
+    yield connection, client_side
+    connection.close()
+    client_side.close()
+    thread.join(timeout=2)
+
+
+def request_frame(request_id):
+    payload = json.dumps({"id": request_id, "op": "status"}).encode()
+    return HEADER.pack(REQUEST, len(payload)) + payload
+
+
+def test_idle_client_is_answered_after_the_timeout(connection):
+    _, client = connection
+    time.sleep(0.3)  # several idle timeouts
+
+    client.sendall(request_frame(7))
+
+    kind, payload = recv_frame(client)
+    assert kind == RESPONSE and json.loads(payload)["id"] == 7
+
+
+def test_client_stalling_mid_frame_is_dropped(connection, caplog):
+    broker_connection, client = connection
+    frame = request_frame(1)
+    client.sendall(frame[:HEADER.size + 3])
+    time.sleep(0.3)
+    try:
+        client.sendall(frame[HEADER.size + 3:])
+    except OSError:
+        pass
+
+    # The rest of the frame is never read as a new header; the connection is closed instead
+    assert client.recv(1) == b""
+    assert broker_connection.closed
+    assert "stalled in the middle of a frame" in caplog.text